@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# scripts/benchmark_rate_limiter.py
+
+#benchmark_rate_limiter.py
+#
+#Compares the GCRA rate limiter in src/core/monitoring/rate_limiter.py with the
+#previous timestamp-list implementation (reproduced below) on many keys: time
+#per is_rate_limited/get_remaining_quota call and memory held by limiter state.
+#
+#Usage:
+#    python scripts/benchmark_rate_limiter.py --keys 100000 --requests 20
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core.monitoring.rate_limiter import RateLimitConfig, SlidingWindowRateLimiter  # noqa: E402
+
+
+class ListWindowRateLimiter:
+    """The previous implementation: one list of request timestamps per key."""
+
+    def __init__(self):
+        self._windows = defaultdict(lambda: defaultdict(list))
+        self._backoff_times = defaultdict(lambda: defaultdict(lambda: (0, 0)))
+        self._lock = threading.Lock()
+
+    def is_rate_limited(self, key, endpoint, config):
+        with self._lock:
+            current_time = time.time()
+            window = self._windows[key][endpoint]
+            cutoff = current_time - config.window_seconds
+            window[:] = [ts for ts in window if ts > cutoff]
+            backoff_until, violations = self._backoff_times[key][endpoint]
+            if current_time < backoff_until:
+                return True
+            if len(window) >= config.max_requests:
+                violations += 1
+                backoff_duration = config.window_seconds * (config.backoff_multiplier ** violations)
+                self._backoff_times[key][endpoint] = (current_time + backoff_duration, violations)
+                return True
+            window.append(current_time)
+            return False
+
+    def get_remaining_quota(self, key, endpoint, config):
+        with self._lock:
+            current_time = time.time()
+            window = self._windows[key][endpoint]
+            cutoff = current_time - config.window_seconds
+            window[:] = [ts for ts in window if ts > cutoff]
+            backoff_until, _ = self._backoff_times[key][endpoint]
+            if current_time < backoff_until:
+                return 0, backoff_until - current_time
+            remaining = max(0, config.max_requests - len(window))
+            return remaining, config.window_seconds
+
+
+def run(limiter, keys, requests_per_key, config, seed=0):
+    rng = random.Random(seed)
+    calls = [keys[rng.randrange(len(keys))] for _ in range(len(keys) * requests_per_key)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    for key in calls:
+        if limiter.is_rate_limited(key, "metrics", config):
+            limiter.get_remaining_quota(key, "metrics", config)
+    elapsed = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Steady-state cost for a key that already holds a full window of history.
+    hot = keys[0]
+    for _ in range(config.max_requests):
+        limiter.is_rate_limited(hot, "hot", config)
+    hot_start = time.perf_counter()
+    for _ in range(10000):
+        limiter.get_remaining_quota(hot, "hot", config)
+    hot_elapsed = time.perf_counter() - hot_start
+    return elapsed / len(calls), memory, hot_elapsed / 10000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API rate limiter on many keys.")
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=20, help="average requests per key")
+    parser.add_argument("--limit", type=int, default=600, help="max requests per window")
+    parser.add_argument("--window", type=int, default=3600)
+    args = parser.parse_args(argv)
+
+    config = RateLimitConfig(max_requests=args.limit, window_seconds=args.window)
+    keys = [f"token-{i}" for i in range(args.keys)]
+    print(f"{args.keys} keys, {args.keys * args.requests} calls, limit {args.limit}/{args.window}s")
+    for name, limiter in (("list (previous)", ListWindowRateLimiter()), ("gcra", SlidingWindowRateLimiter())):
+        per_call, memory, full_window = run(limiter, keys, args.requests, config)
+        print(
+            f"{name:16s} {per_call * 1e6:8.2f} us/call  {memory / 2**20:8.1f} MiB state  "
+            f"{full_window * 1e6:8.2f} us/quota check at a full window"
+        )
+
+
+if __name__ == "__main__":
+    main()
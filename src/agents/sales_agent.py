@@ -1,4 +1,5 @@
 from .base import BaseAgent
+from ..core.tracing import mark_error, span
 import logging
 import asyncio
 from typing import List, Dict, Optional, Any
@@ -95,42 +96,44 @@ class SalesAgent(BaseAgent):
             logger.warning("circuit_breaker_open", agent_name=self.name)
             return {"lead_id": lead.get("lead_id", "unknown"), "status": "circuit_breaker_open"}
 
-        start_time = datetime.now()
-        try:
-            self.leads_processed += 1
-            logger.info("processing_lead", 
-                agent_name=self.name,
-                lead_id=lead.get("lead_id", "unknown")
-            )
+        with span("sales.process_lead", **{"agent.name": self.name, "lead.id": str(lead.get("lead_id", "unknown"))}) as current:
+            start_time = datetime.now()
+            try:
+                self.leads_processed += 1
+                logger.info("processing_lead", 
+                    agent_name=self.name,
+                    lead_id=lead.get("lead_id", "unknown")
+                )
             
-            # Lead qualification logic would go here
-            result = {
-                "lead_id": lead.get("lead_id", "unknown"),
-                "status": "qualified",
-                "score": 0.0,  # Placeholder for actual scoring logic
-                "next_action": "nurture"
-            }
+                # Lead qualification logic would go here
+                result = {
+                    "lead_id": lead.get("lead_id", "unknown"),
+                    "status": "qualified",
+                    "score": 0.0,  # Placeholder for actual scoring logic
+                    "next_action": "nurture"
+                }
             
-            # Update metrics on success
-            self._update_metrics(start_time, success=True)
-            self.circuit_breaker.record_success()
+                # Update metrics on success
+                self._update_metrics(start_time, success=True)
+                self.circuit_breaker.record_success()
             
-            return result
-        except Exception as e:
-            # Update metrics and circuit breaker on failure
-            self._update_metrics(start_time, success=False)
-            self.circuit_breaker.record_failure()
+                return result
+            except Exception as e:
+                mark_error(current, e)
+                # Update metrics and circuit breaker on failure
+                self._update_metrics(start_time, success=False)
+                self.circuit_breaker.record_failure()
             
-            logger.error("lead_processing_failed",
-                agent_name=self.name,
-                lead_id=lead.get("lead_id", "unknown"),
-                error=str(e)
-            )
+                logger.error("lead_processing_failed",
+                    agent_name=self.name,
+                    lead_id=lead.get("lead_id", "unknown"),
+                    error=str(e)
+                )
             
-            if self.circuit_breaker.is_open:
-                await self._handle_failure("process_lead")
+                if self.circuit_breaker.is_open:
+                    await self._handle_failure("process_lead")
             
-            return {"lead_id": lead.get("lead_id", "unknown"), "status": "error"}
+                return {"lead_id": lead.get("lead_id", "unknown"), "status": "error"}
 
     async def _handle_failure(self, operation: str):
         """Handle failures with progressive recovery strategies."""
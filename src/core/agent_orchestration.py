@@ -75,6 +75,11 @@ import aiohttp
 import structlog
 import nodemailer
 
+from .llm_ledger import llm_call_context
+from .agent_resources import agent_resource_tracker
+from ..utils.monitoring import agent_metrics, queue_depth
+from .tracing import mark_error, span
+
 # Configure structured logging
 logger = structlog.get_logger(__name__)
 
@@ -153,6 +158,16 @@ class BaseAgent(ABC):
             logger.error("health_check_failed", agent_name=self.name, error=str(e))
             return False
 
+def agent_snapshot(agent: BaseAgent) -> Dict[str, Any]:
+    """JSON-ready copy of an agent's state and health."""
+    return {
+        "name": agent.name,
+        "state": getattr(agent.state, "value", agent.state),
+        "last_active": agent.last_active.isoformat() if agent.last_active else None,
+        "health": dict(agent.health_metrics),
+        "circuit_open": agent.circuit_breaker.is_open,
+    }
+
 class AgentOrchestrator:
     """Manages and coordinates AI agents with enhanced resilience features."""
     
@@ -180,39 +195,58 @@ class AgentOrchestrator:
             logger.error("agent_registration_failed", agent_name=agent.name, error=str(e))
             return False
 
+    def list_agents(self) -> List[Dict[str, Any]]:
+        """
+        Snapshots of all registered agents. Call from the orchestrator's loop;
+        other threads read OrchestratorHost.snapshot() instead.
+        """
+        return [{"id": name, **agent_snapshot(agent)} for name, agent in list(self.agents.items())]
+
     async def run_agent(self, agent: BaseAgent) -> Any:
         """Execute an agent with circuit breaker and monitoring."""
+        metrics = agent_metrics(agent.name)
         if not agent.circuit_breaker.should_allow_request():
             logger.warning("circuit_breaker_open", agent_name=agent.name)
+            metrics.rejected.inc()
             return None
 
-        start_time = datetime.now()
-        try:
-            agent.state = AgentState.RUNNING
-            agent.last_active = datetime.now()
-            
-            result = await agent.run()
-            
-            # Update metrics on success
-            agent.circuit_breaker.record_success()
-            self._update_health_metrics(agent, start_time, success=True)
-            
-            return result
-        except Exception as e:
-            # Update metrics on failure
-            agent.circuit_breaker.record_failure()
-            self._update_health_metrics(agent, start_time, success=False)
-            
-            logger.error("agent_execution_failed", 
-                agent_name=agent.name,
-                error=str(e),
-                failure_count=agent.circuit_breaker.failure_count
-            )
-            
-            if agent.circuit_breaker.is_open:
-                await self._handle_agent_failure(agent.name)
-            
-            return None
+        with span("agent.run", **{"agent.name": agent.name}) as current:
+            start_time = datetime.now()
+            run_started = metrics.started()
+            try:
+                agent.state = AgentState.RUNNING
+                agent.last_active = datetime.now()
+
+                with llm_call_context(agent.name, "run"):
+                    # Per-step CPU/allocation attribution; a plain await when disabled.
+                    result = await agent_resource_tracker.track(agent.name, agent.run())
+
+                # Update metrics on success
+                agent.circuit_breaker.record_success()
+                self._update_health_metrics(agent, start_time, success=True)
+                metrics.finished(run_started, success=True)
+
+                return result
+            except asyncio.CancelledError:
+                metrics.finished(run_started, success=False)
+                raise
+            except Exception as e:
+                mark_error(current, e)
+                # Update metrics on failure
+                agent.circuit_breaker.record_failure()
+                self._update_health_metrics(agent, start_time, success=False)
+                metrics.finished(run_started, success=False)
+
+                logger.error("agent_execution_failed", 
+                    agent_name=agent.name,
+                    error=str(e),
+                    failure_count=agent.circuit_breaker.failure_count
+                )
+
+                if agent.circuit_breaker.is_open:
+                    await self._handle_agent_failure(agent.name)
+
+                return None
 
     async def _monitor_agent_health(self, agent_name: str):
         """Continuously monitor agent health and trigger recovery if needed."""
@@ -319,16 +353,27 @@ class AgentOrchestrator:
         if not success:
             agent.health_metrics['error_count'] += 1
 
+    async def _run_queued(self, agent: BaseAgent, pending) -> Any:
+        """Run one scheduled agent and take it off the queue-depth gauge when done."""
+        try:
+            return await self.run_agent(agent)
+        finally:
+            pending.dec()
+
     async def schedule_agents(self, interval: int = 60):
         """Schedule and execute agents with resilience features."""
+        pending = queue_depth("schedule")
         while True:
             tasks = []
             for agent in self.agents.values():
                 if agent.state not in [AgentState.FAILED, AgentState.STOPPED]:
-                    tasks.append(self.run_agent(agent))
+                    tasks.append(self._run_queued(agent, pending))
             
             if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+                pending.inc(len(tasks))
+                # Spans of every run_agent task in this cycle are children of this one.
+                with span("orchestrator.schedule_cycle", **{"agents.count": len(tasks)}):
+                    await asyncio.gather(*tasks, return_exceptions=True)
             
             await asyncio.sleep(interval)
 
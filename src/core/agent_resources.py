@@ -0,0 +1,255 @@
+# src/core/agent_resources.py
+
+#agent_resources.py
+#
+#Per-agent resource attribution for orchestrator runs. Agents share one event
+#loop thread, so timing a whole run would charge each agent for everything that
+#ran while it was awaiting I/O. Instead the run's coroutine is wrapped and the
+#thread CPU time (and, in sampled runs, tracemalloc's traced-memory delta) is
+#measured around every individual step the event loop drives, which only
+#covers code executing on behalf of that agent. Wall time is measured per run.
+#
+#Tracking is opt-in (AGENT_RESOURCE_TRACKING=1 or ``enabled = True``) and costs
+#two ``thread_time()`` calls per coroutine step. Allocation tracking is much
+#more expensive, so it only runs for a sampled fraction of runs
+#(AGENT_RESOURCE_ALLOC_SAMPLE_RATE, default 0.05) and tracemalloc is stopped
+#again when no sampled run is active, unless something else had started it.
+#
+#Memory is bounded: one fixed-size entry per agent (at most MAX_AGENTS, later
+#names share an overflow entry) with a short deque of recent runs.
+#
+#Usage Example:
+#    from src.core.agent_resources import agent_resource_tracker
+#
+#    result = await agent_resource_tracker.track("SalesAgent", agent.run())
+#    agent_resource_tracker.snapshot()["agents"]["SalesAgent"]["cpu_seconds"]
+
+import os
+import random
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Awaitable, Dict, Optional
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+MAX_AGENTS = 256
+OVERFLOW_AGENT = "_other"
+RECENT_RUNS = 32
+
+
+class _AgentUsage:
+    """Aggregated resource usage of one agent."""
+    __slots__ = (
+        "runs", "errors", "steps", "cpu_seconds", "wall_seconds", "max_cpu_seconds",
+        "sampled_runs", "alloc_bytes", "net_alloc_bytes", "recent",
+    )
+
+    def __init__(self):
+        self.runs = 0
+        self.errors = 0
+        self.steps = 0
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.max_cpu_seconds = 0.0
+        self.sampled_runs = 0
+        self.alloc_bytes = 0
+        self.net_alloc_bytes = 0
+        self.recent = deque(maxlen=RECENT_RUNS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "steps": self.steps,
+            "cpu_seconds": self.cpu_seconds,
+            "wall_seconds": self.wall_seconds,
+            "avg_cpu_seconds": self.cpu_seconds / self.runs if self.runs else 0.0,
+            "max_cpu_seconds": self.max_cpu_seconds,
+            "cpu_to_wall": self.cpu_seconds / self.wall_seconds if self.wall_seconds else 0.0,
+            "sampled_runs": self.sampled_runs,
+            "avg_alloc_bytes": self.alloc_bytes / self.sampled_runs if self.sampled_runs else None,
+            "avg_net_alloc_bytes": self.net_alloc_bytes / self.sampled_runs if self.sampled_runs else None,
+            "recent": [
+                {"timestamp": ts, "cpu_seconds": cpu, "wall_seconds": wall, "alloc_bytes": alloc}
+                for ts, cpu, wall, alloc in self.recent
+            ],
+        }
+
+
+class _RunMeter:
+    """Resource counters for a single run."""
+    __slots__ = ("cpu", "steps", "alloc", "net_alloc", "trace_alloc")
+
+    def __init__(self, trace_alloc: bool):
+        self.cpu = 0.0
+        self.steps = 0
+        self.alloc = 0
+        self.net_alloc = 0
+        self.trace_alloc = trace_alloc
+
+
+class _MeteredCoroutine:
+    """
+    Awaitable that drives ``coro`` itself, timing every ``send``/``throw``.
+
+    Awaiting it delegates each event-loop resumption to ``send``, so CPU time
+    spent while other tasks run is never attributed to this one.
+    """
+
+    def __init__(self, coro, meter: _RunMeter):
+        self._coro = coro
+        self._meter = meter
+
+    def __await__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+    def _step(self, method, *args):
+        meter = self._meter
+        traced = meter.trace_alloc and tracemalloc.is_tracing()
+        before = tracemalloc.get_traced_memory()[0] if traced else 0
+        start = time.thread_time()
+        try:
+            return method(*args)
+        finally:
+            meter.cpu += time.thread_time() - start
+            meter.steps += 1
+            if traced:
+                delta = tracemalloc.get_traced_memory()[0] - before
+                meter.net_alloc += delta
+                if delta > 0:
+                    meter.alloc += delta
+
+    def send(self, value):
+        return self._step(self._coro.send, value)
+
+    def throw(self, *args):
+        return self._step(self._coro.throw, *args)
+
+    def close(self):
+        self._coro.close()
+
+
+class AgentResourceTracker:
+    """Attributes CPU time, wall time and sampled allocations to agents."""
+
+    def __init__(self, enabled: Optional[bool] = None, alloc_sample_rate: Optional[float] = None):
+        """
+        Args:
+            enabled (bool): Track runs at all; defaults to AGENT_RESOURCE_TRACKING.
+            alloc_sample_rate (float): Fraction of runs that trace allocations.
+        """
+        if enabled is None:
+            enabled = os.getenv("AGENT_RESOURCE_TRACKING", "0").lower() in ("1", "true", "yes")
+        if alloc_sample_rate is None:
+            alloc_sample_rate = float(os.getenv("AGENT_RESOURCE_ALLOC_SAMPLE_RATE", "0.05"))
+        self.enabled = enabled
+        self.alloc_sample_rate = alloc_sample_rate
+        self._usage: Dict[str, _AgentUsage] = {}
+        self._lock = threading.Lock()
+        self._tracing_runs = 0
+        self._owns_tracemalloc = False
+        self._started = time.time()
+
+    def _entry(self, agent: str) -> _AgentUsage:
+        entry = self._usage.get(agent)
+        if entry is None:
+            if len(self._usage) >= MAX_AGENTS:
+                agent = OVERFLOW_AGENT
+                entry = self._usage.get(agent)
+            if entry is None:
+                entry = self._usage[agent] = _AgentUsage()
+        return entry
+
+    def _start_tracing(self):
+        with self._lock:
+            if self._tracing_runs == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+            self._tracing_runs += 1
+
+    def _stop_tracing(self):
+        with self._lock:
+            self._tracing_runs -= 1
+            if self._tracing_runs == 0 and self._owns_tracemalloc:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+
+    async def track(self, agent: str, coro: Awaitable, trace_alloc: Optional[bool] = None) -> Any:
+        """
+        Await ``coro`` and charge its resource usage to ``agent``.
+
+        ``trace_alloc`` forces allocation tracing on or off for this run;
+        by default a run is traced with probability ``alloc_sample_rate``.
+        """
+        if not self.enabled:
+            return await coro
+        if trace_alloc is None:
+            trace_alloc = self.alloc_sample_rate > 0 and random.random() < self.alloc_sample_rate
+        if trace_alloc:
+            self._start_tracing()
+        meter = _RunMeter(trace_alloc)
+        wall_start = time.perf_counter()
+        failed = False
+        try:
+            return await _MeteredCoroutine(coro.__await__(), meter)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            wall = time.perf_counter() - wall_start
+            if trace_alloc:
+                self._stop_tracing()
+            self._record(agent, meter, wall, failed)
+
+    def _record(self, agent: str, meter: _RunMeter, wall: float, failed: bool):
+        with self._lock:
+            entry = self._entry(agent)
+            entry.runs += 1
+            entry.errors += failed
+            entry.steps += meter.steps
+            entry.cpu_seconds += meter.cpu
+            entry.wall_seconds += wall
+            entry.max_cpu_seconds = max(entry.max_cpu_seconds, meter.cpu)
+            if meter.trace_alloc:
+                entry.sampled_runs += 1
+                entry.alloc_bytes += meter.alloc
+                entry.net_alloc_bytes += meter.net_alloc
+            entry.recent.append((time.time(), meter.cpu, wall, meter.alloc if meter.trace_alloc else None))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-agent usage, heaviest CPU consumer first, with each agent's CPU share."""
+        with self._lock:
+            agents = {name: entry.to_dict() for name, entry in self._usage.items()}
+        total_cpu = sum(a["cpu_seconds"] for a in agents.values())
+        for usage in agents.values():
+            usage["cpu_share"] = usage["cpu_seconds"] / total_cpu if total_cpu else 0.0
+        ordered = dict(sorted(agents.items(), key=lambda item: item[1]["cpu_seconds"], reverse=True))
+        return {
+            "enabled": self.enabled,
+            "since": self._started,
+            "alloc_sample_rate": self.alloc_sample_rate,
+            "total_cpu_seconds": total_cpu,
+            "agents": ordered,
+        }
+
+    def top(self, n: int = 3) -> list:
+        """Names of the ``n`` agents with the most attributed CPU time."""
+        return list(self.snapshot()["agents"])[:n]
+
+    def reset(self):
+        with self._lock:
+            self._usage.clear()
+            self._started = time.time()
+
+
+agent_resource_tracker = AgentResourceTracker()
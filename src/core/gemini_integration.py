@@ -11,26 +11,83 @@
 #3. Store API credentials securely using environment variables or secrets management.
 #4. Return structured data to be consumed by other modules.
 #
+#5. Serialize payloads with orjson when it is installed, gzip large request bodies
+#   and only format debug log payloads when debug logging is enabled.
+#6. Tag every call with the calling agent/workflow and account for it in the
+#   per-agent LLM ledger (src/core/llm_ledger.py). Failures are logged as one
+#   event name plus key=value fields (lazily formatted), e.g.
+#   "gemini_request_failed endpoint=... status=...".
+#7. Cache the authentication result and refresh it in the background before it
+#   expires, so agent cycles do not pay an extra /auth round trip. The shared
+#   instance is used from several event loops (the orchestrator host's, the
+#   API server's), so asyncio primitives are kept per loop, never shared.
+#
 #Usage Example:
-#    from gemini_integration import GeminiIntegration
+#    from gemini_integration import get_gemini_integration
 #    
-#    integration = GeminiIntegration(api_key="YOUR_KEY")
-#    await integration.authenticate()
+#    integration = get_gemini_integration()  # one instance shared by all agents
+#    await integration.authenticate()        # network call only when the cache is cold
 #    result = await integration.perform_request("endpoint", data={...})
 
 import os
+import gzip
+import json
+import time
 import logging
 import aiohttp
 import asyncio
+import weakref
 from typing import Any, Optional
 
+from .llm_ledger import llm_ledger, current_llm_tags
+from ..utils.monitoring import gemini_metrics, track_gemini_auth
+from .tracing import mark_error, span
+
+try:
+    import orjson  # optional fast JSON codec
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# Default lifetime of a successful authentication when the service does not
+# return an explicit expiry, and how early before expiry we refresh it.
+DEFAULT_AUTH_TTL = 300.0
+DEFAULT_AUTH_REFRESH_MARGIN = 30.0
+# Shortest wait before a background refresh, so a lifetime at or below the
+# margin cannot turn the refresh into a busy loop against /auth.
+MIN_AUTH_REFRESH_DELAY = 1.0
+# Delay before retrying a failed background refresh.
+AUTH_REFRESH_RETRY_DELAY = 5.0
+# Request bodies at least this large (bytes) are sent gzip-compressed.
+DEFAULT_GZIP_THRESHOLD = 16 * 1024
+GZIP_LEVEL = 5  # favours speed; agent payloads are highly repetitive JSON
+
+
+def dumps_json(data: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads_json(raw: bytes) -> Any:
+    """Parse a JSON document, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 class GeminiIntegration:
     """
     Handles communication with the Google Gemini 2.0 API, 
     including authentication, request processing, and error handling.
     """
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        auth_ttl: Optional[float] = None,
+        auth_refresh_margin: Optional[float] = None,
+        gzip_threshold: Optional[int] = None,
+    ):
         """
         Initialize with an API key, typically sourced from environment variables 
         or a secrets manager.
@@ -38,6 +95,13 @@ class GeminiIntegration:
         Args:
             api_key (str, optional): The key used for authenticating 
                                      with the Gemini API.
+            auth_ttl (float, optional): Seconds a successful authentication stays
+                                        cached when the service returns no expiry.
+            auth_refresh_margin (float, optional): Seconds before expiry at which the
+                                                   cached authentication is refreshed
+                                                   in the background.
+            gzip_threshold (int, optional): Minimum serialized body size in bytes
+                                            that is gzip-compressed; 0 disables.
         """
         self.logger = logging.getLogger(self.__class__.__name__)
         if not api_key:
@@ -46,18 +110,86 @@ class GeminiIntegration:
         self.api_key = api_key.strip()
         self.base_url = os.getenv("GEMINI_BASE_URL", "https://api.google.com/gemini/v2")
 
-    async def authenticate(self) -> bool:
+        if auth_ttl is None:
+            auth_ttl = float(os.getenv("GEMINI_AUTH_TTL", DEFAULT_AUTH_TTL))
+        if auth_refresh_margin is None:
+            auth_refresh_margin = float(
+                os.getenv("GEMINI_AUTH_REFRESH_MARGIN", DEFAULT_AUTH_REFRESH_MARGIN)
+            )
+        self.auth_ttl = auth_ttl
+        self.auth_refresh_margin = auth_refresh_margin
+        if gzip_threshold is None:
+            gzip_threshold = int(os.getenv("GEMINI_GZIP_THRESHOLD", DEFAULT_GZIP_THRESHOLD))
+        self.gzip_threshold = gzip_threshold
+
+        # Cached authentication state, shared by every caller of this instance.
+        self._auth_token: Optional[str] = None
+        self._auth_expires_at = 0.0  # time.monotonic() deadline
+        # An asyncio.Lock is bound to the loop it is first contended on.
+        self._auth_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._refresh_task: Optional[asyncio.Task] = None  # on the loop of the last /auth
+
+    @property
+    def is_authenticated(self) -> bool:
+        """True while a cached, unexpired authentication is available."""
+        return time.monotonic() < self._auth_expires_at
+
+    def _auth_lock(self) -> asyncio.Lock:
+        """The lock that coalesces cold-cache callers on the running loop."""
+        loop = asyncio.get_running_loop()
+        lock = self._auth_locks.get(loop)
+        if lock is None:
+            lock = self._auth_locks[loop] = asyncio.Lock()
+        return lock
+
+    def _auth_headers(self) -> dict:
+        """Authorization header using the cached token when the service issued one."""
+        if self._auth_token is not None and not self.is_authenticated:
+            self._auth_token = None  # expired; fall back to the API key
+        return {"Authorization": f"Bearer {self._auth_token or self.api_key}"}
+
+    async def authenticate(
+        self,
+        force_refresh: bool = False,
+        agent: Optional[str] = None,
+        workflow: Optional[str] = None,
+    ) -> bool:
         """
         Validate the API key with the Gemini service, 
         ensuring the client can access advanced AI capabilities.
 
+        A successful result is cached until it expires and refreshed in the
+        background shortly before that, so repeated calls are normally free.
+        Concurrent callers on a cold cache share a single /auth round trip.
+
+        Args:
+            force_refresh (bool): Ignore the cached result and re-authenticate.
+            agent (str, optional): Calling agent for the LLM ledger; defaults to
+                                   the one set with llm_call_context.
+            workflow (str, optional): Calling workflow for the LLM ledger.
+
         Returns:
             bool: True if authentication succeeded, False otherwise.
         """
         if not self.api_key:
-            self.logger.error("No API key provided for Google Gemini 2.0.")
+            self.logger.error("gemini_auth_failed reason=missing_api_key")
             return False
 
+        if not force_refresh and self.is_authenticated:
+            llm_ledger.record_cache_hit(*current_llm_tags(agent, workflow))
+            track_gemini_auth("cache_hit")
+            return True
+
+        async with self._auth_lock():
+            # Another caller may have refreshed while we waited for the lock.
+            if not force_refresh and self.is_authenticated:
+                return True
+            return await self._fetch_auth()
+
+    async def _fetch_auth(self) -> bool:
+        """Perform the /auth round trip and update the cached state."""
         url = f"{self.base_url}/auth"
         headers = {"Authorization": f"Bearer {self.api_key}"}
 
@@ -67,54 +199,197 @@ class GeminiIntegration:
             async with aiohttp.ClientSession() as session:
                 async with session.get(url, headers=headers) as response:
                     if response.status == 200:
+                        body = await self._read_auth_body(response)
+                        ttl = float(body.get("expires_in") or self.auth_ttl)
+                        self._auth_token = body.get("token") or body.get("access_token")
+                        self._auth_expires_at = time.monotonic() + ttl
+                        self._schedule_refresh(ttl)
                         self.logger.info("Authentication with Gemini successful.")
+                        track_gemini_auth("success")
                         return True
                     else:
                         self.logger.error(
-                            f"Auth failed with status {response.status}: {await response.text()}"
+                            "gemini_auth_failed status=%s response=%r",
+                            response.status, await response.text()
                         )
+                        if response.status in (401, 403):
+                            self.invalidate_auth()
+                        track_gemini_auth("failure")
                         return False
         except Exception as e:
-            self.logger.error(f"Exception during Gemini authentication: {e}", exc_info=True)
+            self.logger.error("gemini_auth_failed error=%r", e, exc_info=True)
+            track_gemini_auth("failure")
             return False
 
-    async def perform_request(self, endpoint: str, data: dict = None) -> Any:
+    @staticmethod
+    async def _read_auth_body(response) -> dict:
+        """Parse an optional JSON auth body ({"token": ..., "expires_in": ...})."""
+        try:
+            body = await response.json(content_type=None)
+        except Exception:
+            return {}
+        return body if isinstance(body, dict) else {}
+
+    def _schedule_refresh(self, ttl: float):
+        """Start (or restart) the background task that refreshes auth before expiry."""
+        # Short lifetimes (expires_in at or below the margin) refresh halfway through.
+        delay = max(ttl * 0.5, ttl - self.auth_refresh_margin, MIN_AUTH_REFRESH_DELAY)
+        if self._refresh_task is not asyncio.current_task():
+            self._cancel_refresh()
+        self._refresh_task = asyncio.create_task(self._refresh_after(delay))
+
+    def _cancel_refresh(self) -> Optional[asyncio.Task]:
+        """Cancel the refresh task from any loop; returns it when it belongs to the running one."""
+        task, self._refresh_task = self._refresh_task, None
+        if task is None or task.done():
+            return None
+        loop = task.get_loop()
+        if loop is asyncio.get_running_loop():
+            task.cancel()
+            return task
+        try:
+            loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            pass  # that loop is closed; the task will never run again
+        return None
+
+    async def _refresh_after(self, delay: float):
+        """Sleep until the refresh point, then re-authenticate, retrying until expiry."""
+        await asyncio.sleep(delay)
+        while True:
+            if await self.authenticate(force_refresh=True):
+                return  # a new refresh task was scheduled by _fetch_auth
+            if not self.is_authenticated:
+                self.logger.warning("gemini_auth_refresh_failed reason=cache_expired")
+                self.invalidate_auth()
+                return
+            await asyncio.sleep(AUTH_REFRESH_RETRY_DELAY)
+
+    def invalidate_auth(self):
+        """Drop the cached authentication, e.g. after the service returns 401."""
+        self._auth_token = None
+        self._auth_expires_at = 0.0
+
+    async def close(self):
+        """Cancel the background refresh task."""
+        task = self._cancel_refresh()
+        if task is not None:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def perform_request(
+        self,
+        endpoint: str,
+        data: dict = None,
+        agent: Optional[str] = None,
+        workflow: Optional[str] = None,
+    ) -> Any:
         """
         Make a POST request to a Gemini API endpoint with JSON data.
 
         Args:
             endpoint (str): The specific endpoint path under base_url.
             data (dict, optional): Payload for the request.
+            agent (str, optional): Calling agent for the LLM ledger; defaults to
+                                   the one set with llm_call_context.
+            workflow (str, optional): Calling workflow for the LLM ledger.
 
         Returns:
             Any: Parsed JSON response or an error message if the request fails.
         """
         if not self.api_key:
-            self.logger.error("Cannot perform Gemini request: missing API key.")
+            self.logger.error("gemini_request_failed endpoint=%s reason=missing_api_key", endpoint)
             return None
 
         url = f"{self.base_url}/{endpoint}"
-        headers = {"Authorization": f"Bearer {self.api_key}"}
+        headers = self._auth_headers()
 
-        self.logger.debug(f"Sending request to {url} with data: {data}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Sending request to %s with data: %s", url, data)
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=data or {}, headers=headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        self.logger.info(f"Request to {endpoint} succeeded.")
-                        return result
-                    else:
-                        err_text = await response.text()
-                        self.logger.error(
-                            f"Request to {endpoint} failed with status {response.status}. "
-                            f"Response: {err_text}"
-                        )
-                        return None
-        except Exception as e:
-            self.logger.error(f"Error performing request to {endpoint}: {e}", exc_info=True)
-            return None
+        agent, workflow = current_llm_tags(agent, workflow)
+        body = b""
+        raw = b""
+        result = None
+        status = "error"
+        metrics = gemini_metrics(endpoint)
+        metrics.in_flight.inc()
+        with span("gemini.request", **{"gemini.endpoint": metrics.endpoint, "llm.agent": agent}) as current:
+            start = time.perf_counter()
+            try:
+                body, headers = self._encode_body(data or {}, headers)
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(url, data=body, headers=headers) as response:
+                        raw = await response.read()
+                        status = response.status
+                        if response.status == 200:
+                            result = loads_json(raw)
+                            self.logger.info("Request to %s succeeded.", endpoint)
+                            return result
+                        else:
+                            mark_error(current, f"HTTP {response.status}")
+                            if response.status == 401:
+                                self.invalidate_auth()
+                            self.logger.error(
+                                "gemini_request_failed endpoint=%s status=%s response=%r",
+                                endpoint, response.status, raw.decode("utf-8", "replace")
+                            )
+                            return None
+            except Exception as e:
+                mark_error(current, e)
+                self.logger.error("gemini_request_failed endpoint=%s error=%r", endpoint, e, exc_info=True)
+                return None
+            finally:
+                elapsed = time.perf_counter() - start
+                metrics.in_flight.dec()
+                metrics.observe(elapsed, status, len(body), len(raw))
+                if current is not None:
+                    current.set_attributes({
+                        "http.response.status_code": status if isinstance(status, int) else 0,
+                        "gemini.bytes_sent": len(body),
+                        "gemini.bytes_received": len(raw),
+                    })
+                usage = result.get("usageMetadata") if isinstance(result, dict) else None
+                llm_ledger.record_request(
+                    agent,
+                    workflow,
+                    elapsed,
+                    bytes_sent=len(body),
+                    bytes_received=len(raw),
+                    usage=usage,
+                    success=result is not None,
+                )
+
+    def _encode_body(self, data: Any, headers: dict) -> tuple:
+        """
+        Serialize a payload to JSON bytes, gzip-compressing it when it is at
+        least ``gzip_threshold`` bytes long.
+
+        Returns:
+            tuple: (body bytes, headers including Content-Type/Content-Encoding)
+        """
+        body = dumps_json(data)
+        headers = dict(headers, **{"Content-Type": "application/json"})
+        if self.gzip_threshold and len(body) >= self.gzip_threshold:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
+
+
+_shared_integration: Optional[GeminiIntegration] = None
+
+
+def get_gemini_integration() -> GeminiIntegration:
+    """
+    Return the process-wide GeminiIntegration instance so that every agent
+    shares one cached authentication and one background refresh task.
+    """
+    global _shared_integration
+    if _shared_integration is None:
+        _shared_integration = GeminiIntegration()
+    return _shared_integration
 
 
 async def demo():
@@ -122,10 +397,11 @@ async def demo():
     A small demonstration of how GeminiIntegration might be used.
     """
     logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
-    gemini = GeminiIntegration()
+    gemini = get_gemini_integration()
     if await gemini.authenticate():
         result = await gemini.perform_request("sample_endpoint", data={"hello": "world"})
         print("Gemini response:", result)
+    await gemini.close()
 
 if __name__ == "__main__":
     asyncio.run(demo())
@@ -0,0 +1,193 @@
+# src/core/gemini_load_test.py
+
+#gemini_load_test.py
+#
+#Open-loop load-testing harness for the LLM path. It drives GeminiIntegration at
+#a target request rate against a Gemini endpoint (by default an in-process
+#MockGeminiServer) and reports throughput, latency percentiles, failures and the
+#number of TCP connections the server saw, so client-side optimizations can be
+#measured offline.
+#
+#Requests are launched on a fixed schedule regardless of how long earlier ones
+#take (open loop), so queueing in the client shows up in the latency numbers
+#instead of silently lowering the offered load.
+#
+#Usage Example:
+#    python -m src.core.gemini_load_test --qps 200 --duration 10 --latency-ms 40
+#    python -m src.core.gemini_load_test --base-url http://127.0.0.1:8089 --qps 50
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from .gemini_integration import GeminiIntegration
+from .gemini_mock_server import MockGeminiServer, MockGeminiConfig, LATENCY_DISTRIBUTIONS
+
+
+@dataclass
+class LoadTestReport:
+    """Summary of one load-test run."""
+    target_qps: float
+    duration_s: float
+    sent: int
+    succeeded: int
+    failed: int
+    throughput_qps: float
+    latency_ms: Dict[str, float]
+    connections: Optional[int] = None
+    server_status_counts: Optional[Dict[str, int]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0.0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+async def _fetch_server_stats(base_url: str) -> Optional[Dict[str, Any]]:
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{base_url}/__stats") as response:
+                if response.status == 200:
+                    return await response.json()
+    except aiohttp.ClientError:
+        pass
+    return None
+
+
+async def run_load_test(
+    integration: GeminiIntegration,
+    qps: float,
+    duration: float,
+    endpoint: str = "models/gemini-2.0:generateContent",
+    payload: Optional[dict] = None,
+) -> LoadTestReport:
+    """
+    Drive ``integration.perform_request`` at ``qps`` requests per second for
+    ``duration`` seconds and summarise the results.
+
+    Args:
+        integration (GeminiIntegration): Client under test, already pointed at the server.
+        qps (float): Target request rate.
+        duration (float): Seconds to keep launching requests.
+        endpoint (str): Endpoint path passed to perform_request.
+        payload (dict, optional): Request body sent with every call.
+
+    Returns:
+        LoadTestReport: Throughput, latency percentiles and connection counts.
+    """
+    if qps <= 0:
+        raise ValueError("qps must be positive")
+    payload = payload if payload is not None else {"contents": [{"parts": [{"text": "ping"}]}]}
+    before = await _fetch_server_stats(integration.base_url)
+
+    latencies: List[float] = []
+    failures = 0
+
+    async def one_request():
+        nonlocal failures
+        start = time.perf_counter()
+        result = await integration.perform_request(endpoint, data=payload)
+        elapsed = time.perf_counter() - start
+        if result is None:
+            failures += 1
+        else:
+            latencies.append(elapsed * 1000.0)
+
+    interval = 1.0 / qps
+    total = int(qps * duration)
+    tasks = []
+    started = time.perf_counter()
+    for index in range(total):
+        delay = started + index * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one_request()))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    after = await _fetch_server_stats(integration.base_url)
+    latencies.sort()
+    connections = None
+    status_counts = None
+    if after is not None:
+        connections = after["connections"] - (before["connections"] if before else 0)
+        status_counts = after["status_counts"]
+
+    return LoadTestReport(
+        target_qps=qps,
+        duration_s=round(elapsed, 3),
+        sent=total,
+        succeeded=len(latencies),
+        failed=failures,
+        throughput_qps=round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        latency_ms={
+            "p50": round(percentile(latencies, 50), 3),
+            "p90": round(percentile(latencies, 90), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+        connections=connections,
+        server_status_counts=status_counts,
+    )
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load-test GeminiIntegration")
+    parser.add_argument("--base-url", default=None,
+                        help="Existing Gemini-compatible server; defaults to an in-process mock")
+    parser.add_argument("--qps", type=float, default=100.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--latency-stddev-ms", type=float, default=15.0)
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> LoadTestReport:
+    args = _parse_args(argv)
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = MockGeminiServer(MockGeminiConfig(
+            latency_ms=args.latency_ms,
+            latency_stddev_ms=args.latency_stddev_ms,
+            distribution=args.distribution,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+        ))
+        base_url = await server.start()
+
+    integration = GeminiIntegration(api_key=os.getenv("GEMINI_API_KEY") or "load-test-key")
+    integration.base_url = base_url
+    try:
+        await integration.authenticate()
+        payload = {"contents": [{"parts": [{"text": "x" * args.payload_bytes}]}]}
+        report = await run_load_test(integration, args.qps, args.duration, payload=payload)
+    finally:
+        await integration.close()
+        if server is not None:
+            await server.stop()
+
+    print(json.dumps(report.to_dict(), indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+    asyncio.run(main())
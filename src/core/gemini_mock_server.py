@@ -0,0 +1,273 @@
+# src/core/gemini_mock_server.py
+
+#gemini_mock_server.py
+#
+#A local stand-in for the Google Gemini 2.0 API, used to load-test the LLM path
+#without touching the real service. It implements the endpoint shapes that
+#GeminiIntegration relies on:
+#  - GET  /auth          -> {"token": ..., "expires_in": ...}
+#  - POST /<endpoint>    -> a generateContent-style JSON body with usage metadata
+#  - POST /<endpoint> with {"stream": true}, ?alt=sse or a ":streamGenerateContent"
+#    suffix            -> a chunked NDJSON stream of partial responses
+#  - GET  /__stats       -> request, status and connection counters
+#
+#Latency is drawn from a configurable distribution, and a share of requests can
+#be answered with injected 5xx errors or 429 rate-limit responses.
+#
+#Usage Example:
+#    server = MockGeminiServer(MockGeminiConfig(latency_ms=40, rate_limit_rate=0.05))
+#    base_url = await server.start()
+#    os.environ["GEMINI_BASE_URL"] = base_url
+#    ...
+#    await server.stop()
+#
+#Or from the command line:
+#    python -m src.core.gemini_mock_server --port 8089 --latency-ms 50 --distribution lognormal
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+@dataclass
+class MockGeminiConfig:
+    """Behaviour knobs for the mock server."""
+    latency_ms: float = 50.0
+    latency_stddev_ms: float = 15.0
+    distribution: str = "lognormal"
+    error_rate: float = 0.0          # share of POSTs answered with error_status
+    error_status: int = 500
+    rate_limit_rate: float = 0.0     # share of POSTs answered with 429
+    retry_after: float = 1.0         # Retry-After header for injected 429s
+    stream_chunks: int = 5
+    chunk_delay_ms: float = 10.0
+    auth_expires_in: float = 3600.0
+    api_key: Optional[str] = None    # when set, only this key authenticates
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        if self.distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown latency distribution '{self.distribution}', "
+                f"expected one of {LATENCY_DISTRIBUTIONS}"
+            )
+
+
+@dataclass
+class MockGeminiStats:
+    """Counters collected by the mock server."""
+    requests: int = 0
+    auth_requests: int = 0
+    streamed_requests: int = 0
+    bytes_received: int = 0          # on-the-wire request body bytes
+    status_counts: Counter = field(default_factory=Counter)
+    connections: set = field(default_factory=set)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "auth_requests": self.auth_requests,
+            "streamed_requests": self.streamed_requests,
+            "bytes_received": self.bytes_received,
+            "status_counts": {str(k): v for k, v in self.status_counts.items()},
+            "connections": len(self.connections),
+        }
+
+
+class MockGeminiServer:
+    """
+    aiohttp application imitating the Gemini endpoints used by GeminiIntegration.
+    """
+
+    def __init__(self, config: Optional[MockGeminiConfig] = None):
+        self.config = config or MockGeminiConfig()
+        self.stats = MockGeminiStats()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._rng = random.Random(self.config.seed)
+        self._runner: Optional[web.AppRunner] = None
+        self.app = web.Application()
+        self.app.router.add_get("/auth", self._handle_auth)
+        self.app.router.add_get("/__stats", self._handle_stats)
+        self.app.router.add_post("/{endpoint:.+}", self._handle_post)
+
+    def sample_latency(self) -> float:
+        """Draw one response latency, in seconds, from the configured distribution."""
+        cfg = self.config
+        mean, stddev = cfg.latency_ms, cfg.latency_stddev_ms
+        if cfg.distribution == "fixed":
+            value = mean
+        elif cfg.distribution == "uniform":
+            value = self._rng.uniform(max(0.0, mean - stddev), mean + stddev)
+        elif cfg.distribution == "normal":
+            value = self._rng.gauss(mean, stddev)
+        elif cfg.distribution == "exponential":
+            value = self._rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+        else:
+            # Parameterise the lognormal so that its mean/stddev match the config.
+            if mean <= 0:
+                value = 0.0
+            else:
+                variance = stddev ** 2
+                sigma2 = math.log(1 + variance / mean ** 2)
+                mu = math.log(mean) - sigma2 / 2
+                value = self._rng.lognormvariate(mu, sigma2 ** 0.5)
+        return max(0.0, value) / 1000.0
+
+    def _track_connection(self, request: web.Request):
+        transport = request.transport
+        if transport is not None:
+            self.stats.connections.add(transport.get_extra_info("peername"))
+
+    async def _handle_auth(self, request: web.Request) -> web.Response:
+        self._track_connection(request)
+        self.stats.auth_requests += 1
+        auth = request.headers.get("Authorization", "")
+        key = auth[len("Bearer "):] if auth.startswith("Bearer ") else ""
+        if not key or (self.config.api_key is not None and key != self.config.api_key):
+            self.stats.status_counts[401] += 1
+            return web.Response(status=401, text="Unauthorized")
+        self.stats.status_counts[200] += 1
+        return web.json_response({
+            "token": f"mock-{int(time.time() * 1000)}",
+            "expires_in": self.config.auth_expires_in,
+        })
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats.to_dict())
+
+    async def _handle_post(self, request: web.Request) -> web.StreamResponse:
+        self._track_connection(request)
+        self.stats.requests += 1
+        body = await request.read()  # transparently gunzipped by aiohttp
+        self.stats.bytes_received += request.content_length or len(body)
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            self.stats.status_counts[400] += 1
+            return web.Response(status=400, text="Invalid JSON payload")
+
+        await asyncio.sleep(self.sample_latency())
+
+        roll = self._rng.random()
+        if roll < self.config.rate_limit_rate:
+            self.stats.status_counts[429] += 1
+            return web.json_response(
+                {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}},
+                status=429,
+                headers={"Retry-After": str(self.config.retry_after)},
+            )
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            status = self.config.error_status
+            self.stats.status_counts[status] += 1
+            return web.json_response({"error": {"code": status, "status": "INTERNAL"}}, status=status)
+
+        endpoint = request.match_info["endpoint"]
+        wants_stream = (
+            endpoint.endswith(":streamGenerateContent")
+            or request.query.get("alt") == "sse"
+            or (isinstance(payload, dict) and payload.get("stream") is True)
+        )
+        prompt_tokens = max(1, len(body) // 4)
+        if wants_stream:
+            return await self._stream_response(request, endpoint, prompt_tokens)
+
+        self.stats.status_counts[200] += 1
+        return web.json_response(self._build_response(endpoint, prompt_tokens, "mock response"))
+
+    async def _stream_response(self, request: web.Request, endpoint: str,
+                               prompt_tokens: int) -> web.StreamResponse:
+        self.stats.streamed_requests += 1
+        self.stats.status_counts[200] += 1
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        for index in range(self.config.stream_chunks):
+            chunk = self._build_response(endpoint, prompt_tokens, f"chunk {index}")
+            await response.write(json.dumps(chunk).encode() + b"\n")
+            await asyncio.sleep(self.config.chunk_delay_ms / 1000.0)
+        await response.write_eof()
+        return response
+
+    @staticmethod
+    def _build_response(endpoint: str, prompt_tokens: int, text: str) -> Dict[str, Any]:
+        completion_tokens = max(1, len(text) // 4)
+        return {
+            "endpoint": endpoint,
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": completion_tokens,
+                "totalTokenCount": prompt_tokens + completion_tokens,
+            },
+        }
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start serving and return the base URL to use as GEMINI_BASE_URL.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind; 0 picks a free port.
+        """
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        base_url = f"http://{host}:{bound_port}"
+        self.logger.info(f"Mock Gemini server listening on {base_url}")
+        return base_url
+
+    async def stop(self):
+        """Stop serving and release the port."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local Gemini API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--latency-stddev-ms", type=float, default=15.0)
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+async def _serve_forever(args: argparse.Namespace):
+    server = MockGeminiServer(MockGeminiConfig(
+        latency_ms=args.latency_ms,
+        latency_stddev_ms=args.latency_stddev_ms,
+        distribution=args.distribution,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    ))
+    await server.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve_forever(_parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,216 @@
+# src/core/llm_ledger.py
+
+#llm_ledger.py
+#
+#Per-agent accounting of LLM usage. Every GeminiIntegration call is tagged with
+#the calling agent and workflow (explicitly, or implicitly through a context
+#variable set by the orchestrator) and aggregated in a small in-memory ledger:
+#request and error counts, bytes on the wire, tokens reported by the service,
+#a fixed-bucket latency histogram and cache hits.
+#
+#Recording is a dictionary lookup plus a handful of integer additions under a
+#lock, so it is cheap enough for every request. A background thread publishes a
+#consistent snapshot at a fixed interval; the monitoring API and the Prometheus
+#collector in src/utils/monitoring.py read that published snapshot.
+#
+#Usage Example:
+#    from src.core.llm_ledger import llm_call_context, llm_ledger
+#
+#    with llm_call_context("SalesAgent", "process_lead"):
+#        await gemini.perform_request("models/gemini-2.0:generateContent", data=...)
+#    llm_ledger.snapshot()
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+UNKNOWN_AGENT = "unknown"
+DEFAULT_WORKFLOW = "default"
+# Upper bounds (seconds) of the latency histogram buckets; the last one is +Inf.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+DEFAULT_FLUSH_INTERVAL = 15.0
+
+_current_agent: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "llm_agent", default=UNKNOWN_AGENT
+)
+_current_workflow: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "llm_workflow", default=DEFAULT_WORKFLOW
+)
+
+
+@contextmanager
+def llm_call_context(agent: str, workflow: str = DEFAULT_WORKFLOW):
+    """
+    Tag every LLM call made inside the block (including in tasks it spawns)
+    with ``agent`` and ``workflow``.
+    """
+    agent_token = _current_agent.set(agent)
+    workflow_token = _current_workflow.set(workflow)
+    try:
+        yield
+    finally:
+        _current_workflow.reset(workflow_token)
+        _current_agent.reset(agent_token)
+
+
+def current_llm_tags(agent: Optional[str] = None, workflow: Optional[str] = None) -> Tuple[str, str]:
+    """Resolve explicit tags, falling back to the ones set by llm_call_context."""
+    return agent or _current_agent.get(), workflow or _current_workflow.get()
+
+
+class _LedgerEntry:
+    """Aggregated usage for one (agent, workflow) pair."""
+    __slots__ = (
+        "requests", "errors", "bytes_sent", "bytes_received",
+        "prompt_tokens", "completion_tokens", "total_tokens",
+        "cache_hits", "latency_sum", "latency_buckets",
+    )
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.cache_hits = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cache_hits": self.cache_hits,
+            "latency_sum": self.latency_sum,
+            "avg_latency": self.latency_sum / self.requests if self.requests else 0.0,
+            # Non-cumulative counts per bucket, keyed by upper bound.
+            "latency_buckets": {
+                ("+Inf" if bound == float("inf") else str(bound)): count
+                for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets)
+            },
+        }
+
+
+class LLMLedger:
+    """Thread-safe, in-memory aggregation of LLM usage per agent and workflow."""
+
+    def __init__(self, flush_interval: Optional[float] = None):
+        if flush_interval is None:
+            flush_interval = float(os.getenv("LLM_LEDGER_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+        self.flush_interval = flush_interval
+        self._entries: Dict[Tuple[str, str], _LedgerEntry] = {}
+        self._lock = threading.Lock()
+        self._published: Dict[str, Any] = {"timestamp": None, "agents": {}}
+        self._flusher: Optional[threading.Thread] = None
+
+    def _entry(self, agent: str, workflow: str) -> _LedgerEntry:
+        key = (agent, workflow)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _LedgerEntry()
+        return entry
+
+    def record_request(
+        self,
+        agent: str,
+        workflow: str,
+        latency: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+        usage: Optional[Dict[str, Any]] = None,
+        success: bool = True,
+    ):
+        """
+        Record one completed LLM request.
+
+        Args:
+            agent (str): Calling agent.
+            workflow (str): Workflow or operation within the agent.
+            latency (float): Wall time of the request in seconds.
+            bytes_sent (int): Request body bytes on the wire.
+            bytes_received (int): Response body bytes.
+            usage (dict, optional): The service's ``usageMetadata`` block, if any.
+            success (bool): False for transport errors and non-200 responses.
+        """
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, latency)
+        with self._lock:
+            entry = self._entry(agent, workflow)
+            entry.requests += 1
+            if not success:
+                entry.errors += 1
+            entry.bytes_sent += bytes_sent
+            entry.bytes_received += bytes_received
+            entry.latency_sum += latency
+            entry.latency_buckets[bucket] += 1
+            if usage:
+                entry.prompt_tokens += usage.get("promptTokenCount", 0) or 0
+                entry.completion_tokens += usage.get("candidatesTokenCount", 0) or 0
+                entry.total_tokens += usage.get("totalTokenCount", 0) or 0
+        self._ensure_flusher()
+
+    def record_cache_hit(self, agent: str, workflow: str):
+        """Record a call that was answered from a cache instead of the network."""
+        with self._lock:
+            self._entry(agent, workflow).cache_hits += 1
+        self._ensure_flusher()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current aggregates as ``{"agents": {agent: {workflow: {...}}}}``."""
+        with self._lock:
+            items = [(key, entry.to_dict()) for key, entry in self._entries.items()]
+        agents: Dict[str, Dict[str, Any]] = {}
+        for (agent, workflow), data in items:
+            agents.setdefault(agent, {})[workflow] = data
+        return {"timestamp": time.time(), "agents": agents}
+
+    def flush(self) -> Dict[str, Any]:
+        """Publish the current aggregates for readers of ``published``."""
+        self._published = self.snapshot()
+        return self._published
+
+    @property
+    def published(self) -> Dict[str, Any]:
+        """The most recently flushed snapshot."""
+        return self._published
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+        self._published = {"timestamp": None, "agents": {}}
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="llm-ledger-flusher", daemon=True
+            )
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("llm_ledger_flush_failed", error=str(e))
+
+
+llm_ledger = LLMLedger()
@@ -8,9 +8,27 @@ import threading
 from dataclasses import dataclass
 from datetime import datetime
 import numpy as np
-from scipy import stats
 import signal
 import subprocess
+import atexit
+import os
+
+from .ring_buffer import MetricsRingBuffer
+from .forecasting import MetricForecaster
+from .sampler import SystemSampler
+from .tsdb import TimeSeriesStore
+from ..agent_resources import agent_resource_tracker
+
+HISTORY_CAPACITY = 1000
+DISK_COLUMN_PREFIX = "disk:"
+PREDICTION_COLUMN_PREFIX = "predicted:"
+SCALAR_METRICS = ('cpu_percent', 'memory_percent', 'open_files', 'connections')
+FORECAST_METRICS = ('cpu_percent', 'memory_percent')
+FORECAST_WINDOW = 60  # samples (one hour at the default interval)
+FORECAST_HORIZONS = {'1h': 60}
+SAMPLE_INTERVAL = 1.0    # seconds between sampler ticks (cheap tier cadence)
+RECORD_INTERVAL = 60.0   # seconds between history samples / anomaly checks
+METRICS_STORE_DIR = os.getenv("METRICS_STORE_DIR", "")  # e.g. /var/lib/3ai/metrics; unset: no persistence
 
 @dataclass
 class SystemMetrics:
@@ -23,10 +41,22 @@ class SystemMetrics:
     prediction_window: Optional[Dict[str, float]] = None
 
 class MonitoringService:
-    def __init__(self):
+    def __init__(self, start_collection: bool = True, sampler: Optional[SystemSampler] = None,
+                 store: Optional[TimeSeriesStore] = None):
         self.logger = structlog.get_logger(__name__)
-        self._metrics_history: list[SystemMetrics] = []
+        self.sampler = sampler or SystemSampler()
+        # Persistent, compressed history with 1m/5m/1h rollups (optional).
+        self.store = store
+        # Columnar history: one preallocated array per metric plus timestamps.
+        self._history = MetricsRingBuffer(HISTORY_CAPACITY, columns=SCALAR_METRICS)
+        self._latest: Optional[SystemMetrics] = None
+        self._forecaster = MetricForecaster(
+            FORECAST_METRICS, window=FORECAST_WINDOW, horizons=FORECAST_HORIZONS
+        )
         self._metrics_lock = threading.Lock()
+        # Bumped with every recorded sample; lets response caches tell whether
+        # the history they rendered is still current.
+        self.history_version = 0
         self._anomaly_thresholds = {
             'cpu_percent': 80.0,
             'memory_percent': 85.0,
@@ -37,57 +67,72 @@ class MonitoringService:
             'memory_percent': self._handle_high_memory,
             'disk_usage': self._handle_high_disk
         }
-        self._start_metrics_collection()
+        if start_collection:
+            self._start_metrics_collection()
 
     def _start_metrics_collection(self):
         def collect_metrics():
+            next_record = time.monotonic()
             while True:
                 try:
+                    # Cheap gauges refresh every tick; expensive tiers only when due.
                     metrics = self._collect_system_metrics()
-                    self._detect_and_handle_anomalies(metrics)
-                    with self._metrics_lock:
-                        self._metrics_history.append(metrics)
-                        if len(self._metrics_history) > 1000:
-                            self._metrics_history.pop(0)
+                    if time.monotonic() >= next_record:
+                        next_record += RECORD_INTERVAL
+                        self._detect_and_handle_anomalies(metrics)
+                        self._record_metrics(metrics)
+                    else:
+                        self._latest = metrics
                 except Exception as e:
                     self.logger.error("metrics_collection_error", error=str(e))
-                time.sleep(60)
+                time.sleep(SAMPLE_INTERVAL)
 
         thread = threading.Thread(target=collect_metrics, daemon=True)
         thread.start()
 
     def _collect_system_metrics(self) -> SystemMetrics:
+        values = self.sampler.sample()
         metrics = SystemMetrics(
-            cpu_percent=psutil.cpu_percent(),
-            memory_percent=psutil.virtual_memory().percent,
-            disk_usage={path: psutil.disk_usage(path).percent for path in psutil.disk_partitions()},
-            open_files=len(psutil.Process().open_files()),
-            connections=len(psutil.Process().connections()),
+            cpu_percent=values.get('cpu_percent', 0.0),
+            memory_percent=values.get('memory_percent', 0.0),
+            disk_usage=values.get('disk_usage', {}),
+            open_files=values.get('open_files', 0),
+            connections=values.get('connections', 0),
             timestamp=datetime.now(),
             prediction_window=self._predict_metrics()
         )
         return metrics
 
-    def _predict_metrics(self) -> Dict[str, float]:
-        """Predict metrics for the next hour using simple linear regression."""
-        if len(self._metrics_history) < 60:  # Need at least 60 data points
-            return None
-
-        predictions = {}
-        recent_metrics = self._metrics_history[-60:]  # Last hour of metrics
-        x = np.arange(len(recent_metrics))
+    def _record_metrics(self, metrics: SystemMetrics):
+        """Append a sample to the columnar history and publish it as the latest."""
+        values = {name: getattr(metrics, name) for name in SCALAR_METRICS}
+        for path, usage in metrics.disk_usage.items():
+            values[DISK_COLUMN_PREFIX + path] = usage
+        for name, value in (metrics.prediction_window or {}).items():
+            values[PREDICTION_COLUMN_PREFIX + name] = value
+        with self._metrics_lock:
+            self._history.append(metrics.timestamp.timestamp(), values)
+            self._forecaster.update(values)
+            self._latest = metrics
+            self.history_version += 1
+        if self.store is not None:
+            try:
+                self.store.append(metrics.timestamp.timestamp(), values)
+            except OSError as e:
+                self.logger.error("metrics_store_write_error", error=str(e))
 
-        for metric in ['cpu_percent', 'memory_percent']:
-            y = [getattr(m, metric) for m in recent_metrics]
-            slope, intercept, _, _, _ = stats.linregress(x, y)
-            predictions[metric] = max(0, min(100, intercept + slope * (len(x) + 60)))  # Predict 60 minutes ahead
+    def _predict_metrics(self) -> Dict[str, float]:
+        """Predict metrics for the next hour from the streaming linear regression.
 
-        return predictions
+        Returns None until a full window (60 samples) has been collected.
+        """
+        with self._metrics_lock:
+            return self._forecaster.predictions()
 
     def _detect_and_handle_anomalies(self, metrics: SystemMetrics):
         """Detect anomalies and trigger auto-recovery if needed."""
         for metric_name, threshold in self._anomaly_thresholds.items():
-            current_value = getattr(metrics, metric_name) if metric_name != 'disk_usage' else max(metrics.disk_usage.values())
+            current_value = getattr(metrics, metric_name) if metric_name != 'disk_usage' else max(metrics.disk_usage.values(), default=0.0)
             if current_value > threshold:
                 self.logger.warning(f"anomaly_detected",
                     metric=metric_name,
@@ -107,6 +152,12 @@ class MonitoringService:
                 reverse=True
             )[:5]  # Top 5 CPU-intensive processes
 
+            if agent_resource_tracker.enabled:
+                agents = agent_resource_tracker.snapshot()["agents"]
+                self.logger.warning("high_cpu_agents", top_agents={
+                    name: round(usage["cpu_share"], 3) for name, usage in list(agents.items())[:3]
+                })
+
             for proc, cpu_usage in processes:
                 if cpu_usage > 80:  # If process using >80% CPU
                     self.logger.warning("high_cpu_process",
@@ -144,9 +195,9 @@ class MonitoringService:
     def _handle_high_disk(self):
         """Handle high disk usage by identifying large files and old logs."""
         try:
-            # Log directories with high usage
-            for path, usage in psutil.disk_partitions():
-                if psutil.disk_usage(path).percent > 90:
+            # Log mounts with high usage, from the sampler's cached (timeout-guarded) values
+            for path, usage in self.sampler.latest().get('disk_usage', {}).items():
+                if usage > 90:
                     self.logger.warning("high_disk_usage",
                         path=path,
                         usage=usage
@@ -156,13 +207,46 @@ class MonitoringService:
             self.logger.error("disk_recovery_error", error=str(e))
 
     def get_current_metrics(self) -> SystemMetrics:
+        return self._latest
+
+    def get_sampler_stats(self) -> Dict[str, Any]:
+        """Collection overhead of the system sampler, per tier."""
+        return self.sampler.stats()
+
+    def get_metrics_window(self, minutes: int = 60) -> Dict[str, np.ndarray]:
+        """Columns of the last ``minutes`` samples, oldest first.
+
+        Copied under the metrics lock: the ring buffer's views would be
+        overwritten in place by the collector's next appends.
+        """
         with self._metrics_lock:
-            return self._metrics_history[-1] if self._metrics_history else None
+            return {name: view.copy() for name, view in self._history.window(minutes).items()}
+
+    def get_metrics_aggregates(self, minutes: int = 60) -> Dict[str, Dict[str, float]]:
+        """Vectorized min/max/mean/last per metric over the last ``minutes`` samples."""
+        with self._metrics_lock:
+            return self._history.aggregate(minutes)
 
     def get_metrics_history(self, minutes: int = 60) -> List[SystemMetrics]:
         """Get metrics history for the specified duration."""
-        with self._metrics_lock:
-            return self._metrics_history[-minutes:]
+        return [
+            SystemMetrics(**sample)
+            for sample in iter_window_samples(self.get_metrics_window(minutes))
+        ]
+
+    def query_stored_metrics(self, start: float, end: float, resolution: str = "auto",
+                             max_points: int = 2000) -> Optional[Dict[str, Any]]:
+        """
+        Range query against the persistent store (None when it is disabled).
+
+        ``resolution`` is "raw", a rollup tier ("1m", "5m", "1h") or "auto",
+        which picks the finest tier that answers with at most ``max_points``.
+        """
+        if self.store is None:
+            return None
+        series = list(dict.fromkeys([*SCALAR_METRICS, *self.store.series_names]))
+        return self.store.query(start, end, series=series, resolution=resolution,
+                                max_points=max_points)
 
     def log_user_action(self, user_id: str, action: str, context: Optional[Dict[str, Any]] = None):
         self.logger.info(
@@ -182,4 +266,91 @@ class MonitoringService:
             timestamp=datetime.now().isoformat()
         )
 
-monitoring_service = MonitoringService() 
\ No newline at end of file
+def iter_window_samples(window: Dict[str, np.ndarray]):
+    """
+    Yield SystemMetrics keyword arguments for each row of a history window,
+    converting columns to Python lists once instead of per sample.
+    """
+    timestamps = window["timestamp"].tolist()
+    scalars = {name: window[name].tolist() for name in SCALAR_METRICS}
+    disks = {
+        name[len(DISK_COLUMN_PREFIX):]: window[name].tolist()
+        for name in window if name.startswith(DISK_COLUMN_PREFIX)
+    }
+    predictions = {
+        name[len(PREDICTION_COLUMN_PREFIX):]: window[name].tolist()
+        for name in window if name.startswith(PREDICTION_COLUMN_PREFIX)
+    }
+    for i, ts in enumerate(timestamps):
+        predicted = {name: col[i] for name, col in predictions.items() if col[i] == col[i]}
+        yield {
+            "cpu_percent": scalars["cpu_percent"][i],
+            "memory_percent": scalars["memory_percent"][i],
+            "open_files": int(scalars["open_files"][i]),
+            "connections": int(scalars["connections"][i]),
+            "disk_usage": {path: col[i] for path, col in disks.items() if col[i] == col[i]},
+            "timestamp": datetime.fromtimestamp(ts),
+            "prediction_window": predicted or None,
+        }
+
+def iter_rollup_samples(result: Dict[str, Any]):
+    """
+    Yield one dict per rollup bucket of a ``query_stored_metrics`` result, with
+    ``avg``/``min``/``max`` maps shaped like the raw history's system metrics.
+    """
+    timestamps = result["timestamps"].tolist()
+    columns = {
+        (name, stat): values.tolist()
+        for name, stats in result["series"].items()
+        for stat, values in stats.items()
+    }
+    for i, ts in enumerate(timestamps):
+        row = {"timestamp": datetime.fromtimestamp(ts)}
+        for stat in ("avg", "min", "max"):
+            scalars = {}
+            disks = {}
+            for (name, column_stat), column in columns.items():
+                value = column[i]
+                if column_stat != stat or name.startswith(PREDICTION_COLUMN_PREFIX):
+                    continue
+                if name.startswith(DISK_COLUMN_PREFIX):
+                    if value == value:
+                        disks[name[len(DISK_COLUMN_PREFIX):]] = value
+                else:
+                    scalars[name] = value if value == value else None
+            scalars["disk_usage"] = disks
+            row[stat] = scalars
+        yield row
+
+def raw_result_window(result: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Shape a raw ``query_stored_metrics`` result like ``get_metrics_window``."""
+    window = {"timestamp": result["timestamps"]}
+    for name, stats in result["series"].items():
+        window[name] = stats["value"]
+    return window
+
+_monitoring_service: Optional[MonitoringService] = None
+_monitoring_service_lock = threading.Lock()
+
+def get_monitoring_service() -> MonitoringService:
+    """
+    The process-wide MonitoringService, created (and its collector started)
+    on first use, so that importing this package (e.g. for the rate limiter)
+    starts no psutil loop in processes that do not serve the monitoring API.
+    """
+    global _monitoring_service
+    with _monitoring_service_lock:
+        if _monitoring_service is None:
+            service = MonitoringService(
+                store=TimeSeriesStore(METRICS_STORE_DIR) if METRICS_STORE_DIR else None
+            )
+            if service.store is not None:
+                atexit.register(service.store.close)
+            _monitoring_service = service
+        return _monitoring_service
+
+def __getattr__(name: str):
+    # `from src.core.monitoring import monitoring_service` still works, lazily.
+    if name == "monitoring_service":
+        return get_monitoring_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,15 +1,21 @@
 """API endpoints for accessing monitoring data."""
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import structlog
 from datetime import datetime, timedelta
 import asyncio
 
 from .rate_limiter import rate_limiter, RateLimitConfig
-from . import monitoring_service
+from . import get_monitoring_service, iter_window_samples, iter_rollup_samples, raw_result_window
+from .tsdb import RAW_TIER
+from .profiler import ProfilerBusyError, run_profile
 from .interaction_tracker import interaction_tracker
+from .http_cache import ResponseCache
+from ..llm_ledger import llm_ledger
+from ..agent_resources import agent_resource_tracker
 
 router = APIRouter(prefix="/api/monitoring", tags=["monitoring"])
 security = HTTPBearer()
@@ -18,6 +24,18 @@ logger = structlog.get_logger(__name__)
 # Rate limit configuration for monitoring endpoints
 METRICS_RATE_LIMIT = RateLimitConfig(max_requests=60, window_seconds=60)  # 1 request per second
 ADMIN_RATE_LIMIT = RateLimitConfig(max_requests=600, window_seconds=3600)  # 600 requests per hour
+PROFILE_RATE_LIMIT = RateLimitConfig(max_requests=10, window_seconds=3600)  # 10 profiles per hour
+INGEST_RATE_LIMIT = RateLimitConfig(max_requests=1200, window_seconds=60)  # 20 batches per second per client
+MAX_PROFILE_SECONDS = 60.0
+MAX_INGEST_BATCH = 1000
+MAX_PROFILE_RATE = 1000.0
+
+# The monitoring API owns the metrics collector; importing the package alone
+# (the dashboard's rate limiter) does not start it.
+monitoring_service = get_monitoring_service()
+
+# Rendered /metrics/history payloads, rebuilt when a new sample is recorded
+response_cache = ResponseCache()
 
 def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     # In production, replace with proper token verification
@@ -27,8 +45,8 @@ def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends(secur
 
 @router.get("/metrics")
 async def get_metrics(request: Request, token: str = Depends(verify_admin_token)) -> Dict[str, Any]:
-    if rate_limiter.is_rate_limited(token, "metrics", METRICS_RATE_LIMIT):
-        remaining, reset_in = rate_limiter.get_remaining_quota(token, "metrics", METRICS_RATE_LIMIT)
+    limited, remaining, reset_in = await rate_limiter.acheck(token, "metrics", METRICS_RATE_LIMIT)
+    if limited:
         raise HTTPException(
             status_code=429,
             detail={
@@ -51,17 +69,32 @@ async def get_metrics(request: Request, token: str = Depends(verify_admin_token)
             "open_files": metrics.open_files,
             "connections": metrics.connections
         },
-        "predictions": metrics.prediction_window
+        "predictions": metrics.prediction_window,
+        "collector": monitoring_service.get_sampler_stats()
     }
 
 @router.get("/metrics/history")
 async def get_metrics_history(
+    request: Request,
     minutes: int = 60,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resolution: str = "auto",
+    max_points: int = 2000,
     token: str = Depends(verify_admin_token)
-) -> List[Dict[str, Any]]:
-    """Get historical metrics for the specified duration."""
-    if rate_limiter.is_rate_limited(token, "metrics_history", ADMIN_RATE_LIMIT):
-        remaining, reset_in = rate_limiter.get_remaining_quota(token, "metrics_history", ADMIN_RATE_LIMIT)
+) -> Response:
+    """
+    Get historical metrics for the last ``minutes`` or the epoch range ``start``..``end``.
+
+    With the persistent store enabled, ``resolution`` selects raw samples or a
+    1m/5m/1h rollup ("auto" picks the finest one within ``max_points``); rollup
+    rows carry avg/min/max instead of single values.
+
+    The rendered list is cached until the next recorded sample and served
+    with an ETag (304 on If-None-Match) and gzip/br compression.
+    """
+    limited, remaining, reset_in = await rate_limiter.acheck(token, "metrics_history", ADMIN_RATE_LIMIT)
+    if limited:
         raise HTTPException(
             status_code=429,
             detail={
@@ -71,18 +104,130 @@ async def get_metrics_history(
             }
         )
 
-    history = monitoring_service.get_metrics_history(minutes)
+    try:
+        status, body, headers = response_cache.respond(
+            ("metrics_history", minutes, start, end, resolution, max_points),
+            lambda: _render_metrics_history(minutes, start, end, resolution, max_points),
+            request.headers,
+            version=monitoring_service.history_version,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=body, status_code=status, headers=headers)
+
+def _render_metrics_history(minutes: int, start: Optional[float], end: Optional[float],
+                            resolution: str, max_points: int) -> List[Dict[str, Any]]:
+    end = end if end is not None else datetime.now().timestamp()
+    start = start if start is not None else end - minutes * 60
+    result = monitoring_service.query_stored_metrics(start, end, resolution, max_points)
+
+    if result is None:
+        window = monitoring_service.get_metrics_window(minutes)
+    elif result["resolution"] == RAW_TIER:
+        window = raw_result_window(result)
+    else:
+        return [{
+            "timestamp": row["timestamp"].isoformat(),
+            "resolution": result["resolution"],
+            "system": row["avg"],
+            "min": row["min"],
+            "max": row["max"]
+        } for row in iter_rollup_samples(result)]
+
     return [{
-        "timestamp": m.timestamp.isoformat(),
+        "timestamp": m["timestamp"].isoformat(),
         "system": {
-            "cpu_percent": m.cpu_percent,
-            "memory_percent": m.memory_percent,
-            "disk_usage": m.disk_usage,
-            "open_files": m.open_files,
-            "connections": m.connections
+            "cpu_percent": m["cpu_percent"],
+            "memory_percent": m["memory_percent"],
+            "disk_usage": m["disk_usage"],
+            "open_files": m["open_files"],
+            "connections": m["connections"]
         },
-        "predictions": m.prediction_window
-    } for m in history]
+        "predictions": m["prediction_window"]
+    } for m in iter_window_samples(window)]
+
+@router.get("/llm-usage")
+async def get_llm_usage(token: str = Depends(verify_admin_token)) -> Dict[str, Any]:
+    """Per-agent LLM usage from the most recent ledger flush."""
+    limited, remaining, reset_in = await rate_limiter.acheck(token, "llm_usage", ADMIN_RATE_LIMIT)
+    if limited:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": "Rate limit exceeded",
+                "remaining": remaining,
+                "reset_in": reset_in
+            }
+        )
+
+    published = llm_ledger.published
+    return {
+        "timestamp": datetime.fromtimestamp(published["timestamp"]).isoformat()
+        if published["timestamp"] else None,
+        "flush_interval": llm_ledger.flush_interval,
+        "agents": published["agents"]
+    }
+
+@router.get("/agent-resources")
+async def get_agent_resources(token: str = Depends(verify_admin_token)) -> Dict[str, Any]:
+    """CPU time, wall time and sampled allocations attributed to each agent."""
+    limited, remaining, reset_in = await rate_limiter.acheck(token, "agent_resources", ADMIN_RATE_LIMIT)
+    if limited:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": "Rate limit exceeded",
+                "remaining": remaining,
+                "reset_in": reset_in
+            }
+        )
+
+    snapshot = agent_resource_tracker.snapshot()
+    snapshot["since"] = datetime.fromtimestamp(snapshot["since"]).isoformat()
+    return snapshot
+
+@router.get("/profile")
+async def get_profile(
+    seconds: float = 10.0,
+    rate: float = 100.0,
+    format: str = "collapsed",
+    include_idle: bool = False,
+    token: str = Depends(verify_admin_token)
+):
+    """
+    Sample every thread's stack (and suspended event-loop tasks) for ``seconds``.
+
+    ``format`` is "collapsed" (text, one ``frame;frame;... count`` line per stack)
+    or "speedscope" (JSON for https://www.speedscope.app).
+    """
+    limited, remaining, reset_in = await rate_limiter.acheck(token, "profile", PROFILE_RATE_LIMIT)
+    if limited:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": "Rate limit exceeded",
+                "remaining": remaining,
+                "reset_in": reset_in
+            }
+        )
+    if format not in ("collapsed", "speedscope"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'speedscope'")
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0 < rate <= MAX_PROFILE_RATE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS}] and rate in (0, {MAX_PROFILE_RATE}]"
+        )
+
+    try:
+        profiler = await run_profile(seconds, rate=rate, include_idle=include_idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "speedscope":
+        profile = profiler.speedscope()
+        profile["stats"] = profiler.stats()
+        return profile
+    return PlainTextResponse(profiler.collapsed())
 
 @router.get("/health")
 async def health_check(background_tasks: BackgroundTasks) -> Dict[str, Any]:
@@ -152,14 +297,62 @@ async def trigger_recovery_actions():
     except Exception as e:
         logger.error("recovery_action_failed", error=str(e))
 
+@router.post("/interactions/batch", status_code=202)
+async def ingest_interactions(request: Request) -> Dict[str, Any]:
+    """
+    Queue a batch of front-end interaction events (see InteractionTracker.ingest).
+
+    Body: ``{"events": [{"type": "click", "session_id": ..., "user_id": ...,
+    "element_id": ..., "x": ..., "y": ...}, ...]}``. Answers 503 with
+    Retry-After when the ingestion backlog is full.
+    """
+    client = request.client.host if request.client else "unknown"
+    limited, remaining, reset_in = await rate_limiter.acheck(client, "interactions", INGEST_RATE_LIMIT)
+    if limited:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": "Rate limit exceeded",
+                "remaining": remaining,
+                "reset_in": reset_in
+            }
+        )
+
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+    events = body.get("events") if isinstance(body, dict) else None
+    if not isinstance(events, list):
+        raise HTTPException(status_code=400, detail="Expected an 'events' list")
+    if len(events) > MAX_INGEST_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_INGEST_BATCH} events per batch")
+
+    result = interaction_tracker.ingest(events)
+    if result.backpressure:
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": str(max(1, round(result.retry_after)))},
+            content={
+                "message": "Ingestion backlog full",
+                "queue_depth": result.queue_depth,
+                "retry_after": result.retry_after
+            }
+        )
+    return {
+        "accepted": result.accepted,
+        "invalid": result.invalid,
+        "queue_depth": result.queue_depth
+    }
+
 @router.get("/user-activity/{user_id}")
 async def get_user_activity(
     user_id: str,
     request: Request,
     token: str = Depends(verify_admin_token)
 ) -> Dict[str, Any]:
-    if rate_limiter.is_rate_limited(token, "user_activity", ADMIN_RATE_LIMIT):
-        remaining, reset_in = rate_limiter.get_remaining_quota(token, "user_activity", ADMIN_RATE_LIMIT)
+    limited, remaining, reset_in = await rate_limiter.acheck(token, "user_activity", ADMIN_RATE_LIMIT)
+    if limited:
         raise HTTPException(
             status_code=429,
             detail={
@@ -170,10 +363,7 @@ async def get_user_activity(
         )
 
     # Get all sessions for the user
-    user_sessions = [
-        session for session in interaction_tracker._sessions.values()
-        if session.user_id == user_id
-    ]
+    user_sessions = interaction_tracker.get_user_sessions(user_id)
 
     if not user_sessions:
         return {
@@ -187,8 +377,9 @@ async def get_user_activity(
             "session_id": session.session_id,
             "start_time": datetime.fromtimestamp(session.start_time).isoformat(),
             "last_activity": datetime.fromtimestamp(session.last_activity).isoformat(),
-            "page_views": len(session.page_views),
-            "total_clicks": len(session.clicks),
-            "total_actions": len(session.actions)
+            "page_views": session.page_views.total,
+            "total_clicks": session.clicks.total,
+            "total_actions": session.actions.total,
+            "rage_clicks": session.rage_clicks
         } for session in user_sessions]
     } 
\ No newline at end of file
@@ -0,0 +1,319 @@
+"""Columnar, day-partitioned append log of interaction events for analytics.
+
+Layout under ``root``::
+
+    cev/YYYYMMDD.cev                 struct-packed columnar blocks, appended
+    arrow/YYYYMMDD/<part>.arrow      Arrow IPC files (when pyarrow is installed)
+
+Each ``append`` writes one block per UTC day it touches. Every block holds
+the columns of EVENT_COLUMNS; the string columns (session, user, target and
+context) are dictionary-encoded against one string table per block, so a scan
+reads small integer codes and aggregates with ``np.bincount`` instead of
+touching Python strings per event.
+
+A fallback block is::
+
+    header   <4sIIIdd  magic, total length, rows, strings, min ts, max ts
+    strings  uint32[strings + 1] offsets, then the UTF-8 blob (index 0 is "")
+    columns  one little-endian array per column, each padded to 8 bytes
+
+Scans skip whole days and, in the fallback format, whole blocks outside the
+queried time range using the header, and decode only the requested columns.
+"""
+
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+import structlog
+
+from .tsdb import _day, _day_start
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+logger = structlog.get_logger(__name__)
+
+# Event kinds
+CLICK, PAGE_VIEW, ACTION, RAGE_CLICK = 0, 1, 2, 3
+KIND_NAMES = ("click", "page_view", "action", "rage_click")
+
+EVENT_COLUMNS = ("ts", "kind", "session", "user", "target", "x", "y", "context")
+STRING_COLUMNS = ("session", "user", "target", "context")
+COLUMN_DTYPES = {
+    "ts": np.dtype("<f8"), "kind": np.dtype("u1"),
+    "session": np.dtype("<u4"), "user": np.dtype("<u4"), "target": np.dtype("<u4"),
+    "x": np.dtype("<i4"), "y": np.dtype("<i4"), "context": np.dtype("<u4"),
+}
+DEFAULT_RETENTION_DAYS = 90
+
+_MAGIC = b"CEV1"
+_HEADER = struct.Struct("<4sIIIdd")
+
+# A row as passed to ``append``: (ts, kind, session, user, target, x, y, context)
+EventRow = Tuple[float, int, str, str, str, int, int, str]
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+def _dictionary(values: Sequence[str], table: Optional[List[str]] = None) -> Tuple[np.ndarray, List[str]]:
+    """Codes of ``values`` in ``table`` (extended in place; "" is always code 0)."""
+    table = [""] if table is None else table
+    lookup = {v: i for i, v in enumerate(table)}
+    # Only distinct values (deduplicated by dict.fromkeys) go through Python code;
+    # mapping every value to its code is a C-level map over the lookup.
+    for value in dict.fromkeys(values):
+        if value not in lookup:
+            lookup[value] = len(table)
+            table.append(value)
+    codes = np.fromiter(map(lookup.__getitem__, values), dtype="<u4", count=len(values))
+    return codes, table
+
+
+def encode_event_block(columns: Dict[str, Sequence]) -> bytes:
+    """Pack one block; ``columns`` maps every name of EVENT_COLUMNS to a sequence."""
+    rows = len(columns["ts"])
+    table: List[str] = [""]
+    arrays = {}
+    for name in EVENT_COLUMNS:
+        if name in STRING_COLUMNS:
+            arrays[name], table = _dictionary(columns[name], table)
+        else:
+            arrays[name] = np.asarray(columns[name], dtype=COLUMN_DTYPES[name])
+    blobs = [s.encode() for s in table]
+    offsets = np.zeros(len(blobs) + 1, dtype="<u4")
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    parts = [offsets.tobytes(), b"".join(blobs)]
+    parts.append(b"\0" * _pad(sum(len(p) for p in parts)))
+    for name in EVENT_COLUMNS:
+        data = arrays[name].tobytes()
+        parts += [data, b"\0" * _pad(len(data))]
+    body = b"".join(parts)
+    ts = arrays["ts"]
+    header = _HEADER.pack(_MAGIC, _HEADER.size + len(body), rows, len(blobs),
+                          float(ts.min()) if rows else 0.0, float(ts.max()) if rows else 0.0)
+    return header + body
+
+
+def decode_event_block(buf, offset: int = 0, columns: Iterable[str] = EVENT_COLUMNS) -> Dict[str, Any]:
+    """
+    Decode the requested columns of the block at ``offset`` (copies, so ``buf``
+    may be closed afterwards). String columns decode to ``(codes, table)``
+    where ``table`` is an object array and ``table[codes]`` gives the values.
+    """
+    _, _, rows, strings, _, _ = _HEADER.unpack_from(buf, offset)
+    wanted = set(columns)
+    pos = offset + _HEADER.size
+    offsets = np.frombuffer(buf, dtype="<u4", count=strings + 1, offset=pos)
+    pos += offsets.nbytes
+    table = None
+    if wanted & set(STRING_COLUMNS):
+        blob = bytes(buf[pos:pos + int(offsets[-1])])
+        table = np.array([blob[offsets[i]:offsets[i + 1]].decode() for i in range(strings)], dtype=object)
+    pos += int(offsets[-1])
+    pos += _pad(pos - offset)
+    out: Dict[str, Any] = {}
+    for name in EVENT_COLUMNS:
+        dtype = COLUMN_DTYPES[name]
+        size = rows * dtype.itemsize
+        if name in wanted:
+            values = np.frombuffer(buf, dtype=dtype, count=rows, offset=pos).copy()
+            out[name] = (values, table) if name in STRING_COLUMNS else values
+        pos += size + _pad(size)
+    return out
+
+
+class EventLog:
+    """Append-only columnar event store partitioned by UTC day."""
+
+    def __init__(self, root: str, fmt: str = "auto", retention_days: int = DEFAULT_RETENTION_DAYS):
+        """
+        Args:
+            root (str): Directory holding the log; created on first write.
+            fmt (str): "arrow", "packed" or "auto" (Arrow when pyarrow is installed).
+            retention_days (int): Whole days older than this are deleted on write.
+        """
+        if fmt == "auto":
+            fmt = "arrow" if pa is not None else "packed"
+        if fmt == "arrow" and pa is None:
+            raise RuntimeError("pyarrow is required for the arrow event log format")
+        if fmt not in ("arrow", "packed"):
+            raise ValueError(f"Unknown event log format '{fmt}'")
+        self.root = root
+        self.fmt = fmt
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._last_retention_day: Optional[str] = None
+        self._parts = 0
+
+    # -- writes ---------------------------------------------------------------
+    def append(self, rows: Iterable[EventRow]) -> int:
+        """Write ``rows`` (see EventRow) as one block per day; returns the row count."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        columns: Dict[str, Any] = dict(zip(EVENT_COLUMNS, zip(*rows)))
+        day_numbers = (np.asarray(columns["ts"], dtype=np.float64) // 86400).astype(np.int64)
+        parts = np.unique(day_numbers)
+        if len(parts) > 1:
+            columns = {name: np.array(values, dtype=object if name in STRING_COLUMNS else COLUMN_DTYPES[name])
+                       for name, values in columns.items()}
+        with self._lock:
+            for day_number in parts:
+                day = _day(int(day_number) * 86400)
+                if len(parts) > 1:
+                    mask = day_numbers == day_number
+                    day_columns = {name: values[mask] for name, values in columns.items()}
+                else:
+                    day_columns = columns
+                if self.fmt == "arrow":
+                    self._write_arrow(day, day_columns)
+                else:
+                    path = os.path.join(self.root, "cev", f"{day}.cev")
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, "ab") as f:
+                        f.write(encode_event_block(day_columns))
+            today = _day(time.time())
+            if today != self._last_retention_day:
+                self._last_retention_day = today
+                self.enforce_retention()
+        return len(rows)
+
+    def _write_arrow(self, day: str, columns: Dict[str, Sequence]):
+        arrays = []
+        for name in EVENT_COLUMNS:
+            if name in STRING_COLUMNS:
+                codes, table = _dictionary(columns[name])
+                arrays.append(pa.DictionaryArray.from_arrays(pa.array(codes, pa.uint32()), pa.array(table)))
+            else:
+                arrays.append(pa.array(np.asarray(columns[name], dtype=COLUMN_DTYPES[name])))
+        batch = pa.RecordBatch.from_arrays(arrays, names=list(EVENT_COLUMNS))
+        directory = os.path.join(self.root, "arrow", day)
+        os.makedirs(directory, exist_ok=True)
+        self._parts += 1
+        name = f"{time.time_ns()}-{os.getpid()}-{self._parts}.arrow"
+        tmp = os.path.join(directory, name + ".tmp")
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        os.replace(tmp, os.path.join(directory, name))
+
+    def enforce_retention(self, now: Optional[float] = None):
+        """Delete day partitions older than ``retention_days``."""
+        cutoff = (time.time() if now is None else now) - self.retention_days * 86400
+        for layout in ("cev", "arrow"):
+            directory = os.path.join(self.root, layout)
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.listdir(directory):
+                day = entry.split(".", 1)[0]
+                if len(day) != 8 or not day.isdigit() or _day_start(day) + 86400 > cutoff:
+                    continue
+                path = os.path.join(directory, entry)
+                if os.path.isdir(path):
+                    for part in os.listdir(path):
+                        os.remove(os.path.join(path, part))
+                    os.rmdir(path)
+                else:
+                    os.remove(path)
+                logger.info("event_log_partition_expired", day=day)
+
+    # -- reads ----------------------------------------------------------------
+    def days(self) -> List[str]:
+        found = set()
+        for layout in ("cev", "arrow"):
+            directory = os.path.join(self.root, layout)
+            if os.path.isdir(directory):
+                found.update(e.split(".", 1)[0] for e in os.listdir(directory))
+        return sorted(d for d in found if len(d) == 8 and d.isdigit())
+
+    def _scan_packed(self, path: str, start: float, end: float, columns) -> Iterator[Dict[str, Any]]:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                offset = 0
+                while offset + _HEADER.size <= len(buf):
+                    magic, length, _, _, min_ts, max_ts = _HEADER.unpack_from(buf, offset)
+                    if magic != _MAGIC or offset + length > len(buf):
+                        logger.warning("event_log_truncated_block", path=path, offset=offset)
+                        return
+                    if max_ts >= start and min_ts <= end:
+                        yield decode_event_block(buf, offset, columns)
+                    offset += length
+
+    @staticmethod
+    def _scan_arrow(path: str, columns) -> Iterator[Dict[str, Any]]:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                chunk = {}
+                for name in columns:
+                    column = batch.column(batch.schema.get_field_index(name))
+                    if name in STRING_COLUMNS:
+                        chunk[name] = (column.indices.to_numpy(zero_copy_only=False).astype("<u4"),
+                                       np.array(column.dictionary.to_pylist(), dtype=object))
+                    else:
+                        chunk[name] = column.to_numpy(zero_copy_only=False).copy()
+                yield chunk
+
+    def scan(self, start: float = 0.0, end: float = float("inf"),
+             columns: Iterable[str] = EVENT_COLUMNS) -> Iterator[Dict[str, Any]]:
+        """
+        Yield column chunks with events in ``start``..``end`` (inclusive).
+
+        Numeric columns are arrays; string columns are ``(codes, table)``
+        pairs. "ts" is always included and rows are already range-filtered.
+        """
+        columns = tuple(dict.fromkeys(("ts", *columns)))
+        first = _day(start) if start > 0 else "00000000"
+        last = _day(end) if end != float("inf") else "99999999"
+        for day in self.days():
+            if not first <= day <= last:
+                continue
+            chunks: List[Iterator[Dict[str, Any]]] = []
+            path = os.path.join(self.root, "cev", f"{day}.cev")
+            if os.path.exists(path):
+                chunks.append(self._scan_packed(path, start, end, columns))
+            directory = os.path.join(self.root, "arrow", day)
+            if pa is not None and os.path.isdir(directory):
+                chunks += [self._scan_arrow(os.path.join(directory, part), columns)
+                           for part in sorted(os.listdir(directory)) if part.endswith(".arrow")]
+            for chunk_iter in chunks:
+                for chunk in chunk_iter:
+                    ts = chunk["ts"]
+                    mask = (ts >= start) & (ts <= end)
+                    if mask.all():
+                        yield chunk
+                    elif mask.any():
+                        yield {name: (value[0][mask], value[1]) if isinstance(value, tuple) else value[mask]
+                               for name, value in chunk.items()}
+
+    def count_by(self, column: str, kind: Optional[int] = None,
+                 start: float = 0.0, end: float = float("inf")) -> Counter:
+        """Number of events per value of string ``column``, optionally of one ``kind``."""
+        counts: Counter = Counter()
+        for chunk in self.scan(start, end, columns=(column, "kind")):
+            codes, table = chunk[column]
+            if kind is not None:
+                codes = codes[chunk["kind"] == kind]
+            tally = np.bincount(codes, minlength=len(table))
+            for code in np.flatnonzero(tally):
+                counts[table[code]] += int(tally[code])
+        return counts
+
+    def rage_clicks_by_element(self, start: float = 0.0, end: float = float("inf")) -> Counter:
+        return self.count_by("target", RAGE_CLICK, start, end)
+
+    def page_views_per_user(self, start: float = 0.0, end: float = float("inf")) -> Counter:
+        return self.count_by("user", PAGE_VIEW, start, end)
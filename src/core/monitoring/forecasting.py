@@ -0,0 +1,136 @@
+"""Streaming linear-trend forecasts for system metrics."""
+
+from typing import Dict, Iterable, Mapping, Optional
+
+import numpy as np
+
+
+class SlidingWindowRegression:
+    """Least-squares line over the last ``window`` samples, updated in O(1).
+
+    Samples are placed at x = 0..n-1 (oldest first). Only ``sum(y)`` and
+    ``sum(x*y)`` need to be tracked: ``sum(x)`` and ``sum(x*x)`` have closed
+    forms, and sliding the window shifts every x down by one, which lowers
+    ``sum(x*y)`` by ``sum(y)``. The sums are rebuilt from the stored samples
+    once per window to keep floating-point drift bounded.
+    """
+
+    def __init__(self, window: int):
+        if window < 2:
+            raise ValueError("window must hold at least two samples")
+        self.window = window
+        self._values = np.zeros(window, dtype=np.float64)
+        self._start = 0  # index of the oldest sample in _values
+        self._count = 0
+        self._sum_y = 0.0
+        self._sum_xy = 0.0
+        self._updates = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def is_full(self) -> bool:
+        return self._count == self.window
+
+    def add(self, y: float):
+        """Add a sample, evicting the oldest one once the window is full."""
+        y = float(y)
+        if self._count < self.window:
+            self._values[(self._start + self._count) % self.window] = y
+            self._sum_xy += self._count * y
+            self._sum_y += y
+            self._count += 1
+        else:
+            oldest = self._values[self._start]
+            self._sum_y -= oldest          # oldest sat at x = 0
+            self._sum_xy -= self._sum_y    # every remaining x shifts down by one
+            self._values[self._start] = y
+            self._start = (self._start + 1) % self.window
+            self._sum_xy += (self.window - 1) * y
+            self._sum_y += y
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self._resync()
+
+    def _resync(self):
+        ordered = np.roll(self._values, -self._start)[:self._count]
+        self._sum_y = float(ordered.sum())
+        self._sum_xy = float(np.dot(np.arange(self._count), ordered))
+
+    def coefficients(self) -> Optional[tuple]:
+        """``(slope, intercept)`` of the current fit, or None with < 2 samples."""
+        n = self._count
+        if n < 2:
+            return None
+        sum_x = n * (n - 1) / 2.0
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6.0
+        denominator = n * sum_xx - sum_x * sum_x
+        slope = (n * self._sum_xy - sum_x * self._sum_y) / denominator
+        intercept = (self._sum_y - slope * sum_x) / n
+        return slope, intercept
+
+    def predict(self, steps_ahead: float) -> Optional[float]:
+        """Value of the fitted line at x = n + steps_ahead."""
+        fit = self.coefficients()
+        if fit is None:
+            return None
+        slope, intercept = fit
+        return intercept + slope * (self._count + steps_ahead)
+
+
+class MetricForecaster:
+    """Keeps one SlidingWindowRegression per metric and forecasts at fixed horizons."""
+
+    def __init__(self, metrics: Iterable[str], window: int = 60,
+                 horizons: Optional[Mapping[str, int]] = None,
+                 bounds: tuple = (0.0, 100.0)):
+        """
+        Args:
+            metrics: Names of the metrics to track.
+            window (int): Samples per regression; forecasts need a full window.
+            horizons: Named horizons in samples, e.g. ``{"1h": 60}``. The first one
+                      is the default used by ``predictions()``.
+            bounds (tuple): Forecasts are clamped to ``(low, high)``.
+        """
+        self.window = window
+        self.horizons = dict(horizons or {"1h": 60})
+        self.bounds = bounds
+        self._models: Dict[str, SlidingWindowRegression] = {
+            name: SlidingWindowRegression(window) for name in metrics
+        }
+
+    def add_metric(self, name: str):
+        self._models.setdefault(name, SlidingWindowRegression(self.window))
+
+    def update(self, sample: Mapping[str, float]):
+        """Feed the latest value of every tracked metric present in ``sample``."""
+        for name, model in self._models.items():
+            value = sample.get(name)
+            if value is not None:
+                model.add(value)
+
+    def forecast(self, metric: str, horizon: Optional[str] = None) -> Optional[float]:
+        """Clamped forecast for one metric, or None until its window is full."""
+        model = self._models[metric]
+        if not model.is_full:
+            return None
+        steps = self.horizons[horizon] if horizon else next(iter(self.horizons.values()))
+        low, high = self.bounds
+        return max(low, min(high, model.predict(steps)))
+
+    def predictions(self, horizon: Optional[str] = None) -> Optional[Dict[str, float]]:
+        """Forecasts for every metric at ``horizon`` (default: the first one)."""
+        out = {}
+        for name in self._models:
+            value = self.forecast(name, horizon)
+            if value is None:
+                return None
+            out[name] = value
+        return out
+
+    def all_predictions(self) -> Optional[Dict[str, Dict[str, float]]]:
+        """Forecasts for every metric at every horizon, keyed by horizon name."""
+        if not all(model.is_full for model in self._models.values()):
+            return None
+        return {horizon: self.predictions(horizon) for horizon in self.horizons}
@@ -0,0 +1,145 @@
+"""Rendered-response cache with ETags and pre-compressed bodies for polled JSON endpoints."""
+
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+try:
+    import brotli  # optional; preferred over gzip when the client accepts it
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+DEFAULT_TTL = 2.0           # seconds a rendered payload is reused without a version change
+DEFAULT_MAX_ENTRIES = 256
+MIN_COMPRESS_SIZE = 1024    # bytes; smaller bodies are sent as is
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best content coding we can produce for an Accept-Encoding header."""
+    accepted = set()
+    for item in (accept_encoding or "").split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against ``etag``."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()) == opaque
+        for tag in if_none_match.split(",")
+    )
+
+class RenderedBody:
+    """One serialized payload with its ETag and lazily compressed variants."""
+    __slots__ = ("body", "etag", "version", "expires", "_encoded", "_lock")
+
+    def __init__(self, body: bytes, version: Hashable, expires: float):
+        self.body = body
+        # Derived from the bytes, so a rebuild with identical content keeps the
+        # ETag and clients keep getting 304s across TTL expiries.
+        self.etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.version = version
+        self.expires = expires
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """Body for ``encoding`` (compressed once, then reused) and the coding applied."""
+        if encoding is None or len(self.body) < MIN_COMPRESS_SIZE:
+            return self.body, None
+        with self._lock:
+            data = self._encoded.get(encoding)
+            if data is None:
+                if encoding == "br":
+                    data = brotli.compress(self.body, quality=BROTLI_QUALITY)
+                else:
+                    data = gzip.compress(self.body, compresslevel=GZIP_LEVEL, mtime=0)
+                self._encoded[encoding] = data
+        return data, encoding
+
+class ResponseCache:
+    """
+    Rendered JSON payloads keyed by endpoint and parameters.
+
+    An entry is rebuilt when its ``version`` differs from the caller's (e.g. a
+    sample counter that moves when the data does) or when it is older than
+    ``ttl``; ``version=None`` relies on the TTL alone. Payloads are serialized
+    once per build and compressed at most once per coding, so repeated polls
+    cost a dictionary lookup, and a matching If-None-Match costs nothing more.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, RenderedBody]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any], version: Hashable = None) -> RenderedBody:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version and now < entry.expires:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # Built outside the lock; concurrent misses may both build, the last wins.
+        body = json.dumps(build(), separators=(",", ":"), default=str).encode("utf-8")
+        entry = RenderedBody(body, version, now + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def respond(self, key: Hashable, build: Callable[[], Any], headers,
+                version: Hashable = None) -> Tuple[int, bytes, Dict[str, str]]:
+        """
+        Framework-neutral response for request ``headers`` (any mapping with
+        .get): (status, body, headers), with status 304 and an empty body when
+        the client's If-None-Match still matches. Clients are told to
+        revalidate every time, which is what makes that 304 cheap.
+        """
+        entry = self.get(key, build, version)
+        response_headers = {
+            "ETag": entry.etag,
+            "Vary": "Accept-Encoding",
+            "Cache-Control": "private, no-cache",
+        }
+        if etag_matches(headers.get("If-None-Match"), entry.etag):
+            return 304, b"", response_headers
+        body, coding = entry.encoded(choose_encoding(headers.get("Accept-Encoding")))
+        response_headers["Content-Type"] = "application/json"
+        if coding is not None:
+            response_headers["Content-Encoding"] = coding
+        return 200, body, response_headers
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
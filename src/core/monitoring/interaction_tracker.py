@@ -1,100 +1,251 @@
 """User interaction tracking and analysis module."""
 
-from typing import Dict, List, Optional
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+import atexit
+import json
+import math
+import os
+import sys
 import time
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field
 from datetime import datetime
 import threading
-from collections import defaultdict
+from collections import OrderedDict, deque
 import structlog
 
-@dataclass
+from .event_log import ACTION, CLICK, PAGE_VIEW, RAGE_CLICK, EventLog, EventRow
+
+MAX_CLICKS = 2000           # per session; older clicks are overwritten
+MAX_PAGE_VIEWS = 500
+MAX_ACTIONS = 500
+MAX_RAGE_ELEMENTS = 128     # elements with a live rage-click window per session
+MAX_RAGE_EVENTS = 200
+EXPIRY_SWEEP_INTERVAL = 30.0  # seconds between background expiry passes
+EXPIRY_SWEEP_BATCH = 500      # sessions expired per lock acquisition
+MAX_QUEUED_EVENTS = 500_000   # ingestion backlog before batches are refused
+INGEST_DRAIN_BATCH = 5000     # events applied per lock acquisition
+MAX_CLOCK_SKEW = 300.0        # client timestamps further from now are replaced
+EVENT_LOG_FLUSH_INTERVAL = 300.0  # seconds between exports of live sessions
+COORD_MIN, COORD_MAX = -2**31, 2**31 - 1  # click coordinates are stored as C ints
+
+# Interaction history is exported here on expiry and flush (an absolute path,
+# e.g. /var/lib/3ai/interactions); unset, nothing is written.
+INTERACTION_LOG_DIR = os.getenv("INTERACTION_LOG_DIR", "")
+
+EVENT_KINDS = {"click": CLICK, "page_view": PAGE_VIEW, "action": ACTION}
+
+def _is_coord(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and COORD_MIN <= value <= COORD_MAX
+
+@dataclass(slots=True)
 class UserClick:
     timestamp: float
     element_id: str
     x: int
     y: int
 
+class ClickLog:
+    """
+    Fixed-capacity ring buffer of clicks in parallel typed arrays.
+
+    A click costs 16 bytes of array storage plus a reference to its (interned)
+    element id instead of a dataclass instance. Once full, each new click
+    overwrites the oldest; ``total`` keeps counting and ``dropped`` tells how
+    many were overwritten. Indexing and iteration build UserClick views.
+    """
+    __slots__ = ("capacity", "total", "_timestamps", "_coords", "_elements")
+
+    def __init__(self, capacity: int = MAX_CLICKS):
+        self.capacity = capacity
+        self.total = 0
+        self._timestamps = array("d")
+        self._coords = array("i")  # x, y pairs
+        self._elements: List[str] = []
+
+    def append(self, timestamp: float, element_id: str, x: int, y: int):
+        element_id = sys.intern(element_id)
+        coords = array("i", (x, y))  # converted first: an overflow leaves the log untouched
+        if len(self._elements) < self.capacity:
+            self._coords.extend(coords)
+            self._timestamps.append(timestamp)
+            self._elements.append(element_id)
+        else:
+            i = self.total % self.capacity
+            self._coords[2 * i:2 * i + 2] = coords
+            self._timestamps[i] = timestamp
+            self._elements[i] = element_id
+        self.total += 1
+
+    @property
+    def dropped(self) -> int:
+        return self.total - len(self._elements)
+
+    def __len__(self) -> int:
+        return len(self._elements)
+
+    def __getitem__(self, index: int) -> UserClick:
+        size = len(self._elements)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("click index out of range")
+        # Oldest retained click first.
+        i = (self.total - size + index) % self.capacity
+        return UserClick(self._timestamps[i], self._elements[i], self._coords[2 * i], self._coords[2 * i + 1])
+
+    def __iter__(self) -> Iterator[UserClick]:
+        return (self[i] for i in range(len(self)))
+
+class CappedLog:
+    """Deque keeping the last ``capacity`` entries plus a count of everything appended."""
+    __slots__ = ("total", "_items")
+
+    def __init__(self, capacity: int):
+        self.total = 0
+        self._items: Deque[Any] = deque(maxlen=capacity)
+
+    def append(self, item: Any):
+        self._items.append(item)
+        self.total += 1
+
+    @property
+    def dropped(self) -> int:
+        return self.total - len(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index: int) -> Any:
+        return self._items[index]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._items)
+
 @dataclass
+class IngestResult:
+    accepted: int
+    invalid: int
+    queue_depth: int
+    # Set when the batch was refused because the backlog is full; the caller
+    # should retry after ``retry_after`` seconds.
+    backpressure: bool = False
+    retry_after: float = 0.0
+
+@dataclass(slots=True)
 class UserSession:
     session_id: str
     user_id: str
     start_time: float
     last_activity: float
-    clicks: List[UserClick]
-    page_views: List[str]
-    actions: List[Dict]
+    clicks: ClickLog = field(default_factory=ClickLog)
+    page_views: CappedLog = field(default_factory=lambda: CappedLog(MAX_PAGE_VIEWS))  # (timestamp, path)
+    actions: CappedLog = field(default_factory=lambda: CappedLog(MAX_ACTIONS))
+    # Per element, the timestamps of its last RAGE_CLICK_THRESHOLD clicks,
+    # least recently clicked element first.
+    rage_windows: "OrderedDict[str, Deque[float]]" = field(default_factory=OrderedDict)
+    rage_clicks: int = 0
+    rage_log: CappedLog = field(default_factory=lambda: CappedLog(MAX_RAGE_EVENTS))  # (timestamp, element)
+    # Totals of clicks, page views, actions and rage clicks already exported.
+    exported: Tuple[int, int, int, int] = (0, 0, 0, 0)
 
 class InteractionTracker:
-    def __init__(self):
+    """
+    Per-session interaction history.
+
+    ``_sessions`` is kept in last-activity order (every touch moves the session
+    to the end), so expired sessions are always at the front and expiry pops
+    them without scanning live ones. ``_by_user`` indexes sessions by user id
+    for ``get_user_sessions``.
+
+    Besides the per-event ``track_*`` calls, ``ingest`` accepts batches of
+    events. It only validates them into tuples and extends a deque (atomic
+    without a lock), so producers never wait for the tracker lock; a single
+    consumer thread drains the deque and applies thousands of events per lock
+    acquisition. When the backlog reaches ``max_queued`` events, whole batches
+    are refused with a retry hint instead of letting the queue grow.
+    """
+
+    def __init__(self, start_expiry: bool = True, start_consumer: bool = True,
+                 max_queued: int = MAX_QUEUED_EVENTS, event_log: Optional[EventLog] = None):
         self.logger = structlog.get_logger(__name__)
-        self._sessions: Dict[str, UserSession] = {}
+        self._sessions: "OrderedDict[str, UserSession]" = OrderedDict()
+        self._by_user: Dict[str, Dict[str, UserSession]] = {}
         self._lock = threading.Lock()
         self.RAGE_CLICK_THRESHOLD = 5  # clicks
         self.RAGE_CLICK_WINDOW = 2.0   # seconds
         self.SESSION_TIMEOUT = 1800     # 30 minutes
+        self.max_queued = max_queued
+        # Sessions are written here when they expire and on flush_event_log().
+        self.event_log = event_log
+        self._queue: Deque[Tuple] = deque()
+        self._queue_ready = threading.Event()
+        self._start_consumer = start_consumer
+        self._consumer: Optional[threading.Thread] = None
+        self._consumer_lock = threading.Lock()
+        self._ingest_stats = {"accepted": 0, "invalid": 0, "refused": 0, "applied": 0, "failed": 0}
+        self._drain_rate = 0.0  # events/second, exponentially smoothed
+        if start_expiry:
+            self._start_expiry_sweeper()
+
+    def _start_expiry_sweeper(self):
+        def sweep():
+            next_flush = time.monotonic() + EVENT_LOG_FLUSH_INTERVAL
+            while True:
+                time.sleep(EXPIRY_SWEEP_INTERVAL)
+                try:
+                    # Expire in batches so tracking calls never wait on a long pass.
+                    while self.cleanup_expired_sessions(EXPIRY_SWEEP_BATCH) == EXPIRY_SWEEP_BATCH:
+                        pass
+                    if self.event_log is not None and time.monotonic() >= next_flush:
+                        next_flush += EVENT_LOG_FLUSH_INTERVAL
+                        self.flush_event_log()
+                except Exception as e:
+                    self.logger.error("session_expiry_error", error=str(e))
+
+        thread = threading.Thread(target=sweep, name="session-expiry", daemon=True)
+        thread.start()
+
+    def _get_session(self, session_id: str, user_id: str, current_time: float) -> UserSession:
+        session = self._sessions.get(session_id)
+        if not session:
+            session = UserSession(
+                session_id=session_id,
+                user_id=user_id,
+                start_time=current_time,
+                last_activity=current_time,
+            )
+            self._sessions[session_id] = session
+            self._by_user.setdefault(user_id, {})[session_id] = session
+        else:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def get_user_sessions(self, user_id: str) -> List[UserSession]:
+        with self._lock:
+            return list(self._by_user.get(user_id, {}).values())
 
     def track_click(self, session_id: str, user_id: str, element_id: str, x: int, y: int):
         with self._lock:
             current_time = time.time()
-            
-            # Get or create session
-            session = self._sessions.get(session_id)
-            if not session:
-                session = UserSession(
-                    session_id=session_id,
-                    user_id=user_id,
-                    start_time=current_time,
-                    last_activity=current_time,
-                    clicks=[],
-                    page_views=[],
-                    actions=[]
-                )
-                self._sessions[session_id] = session
-            
-            # Add click
-            click = UserClick(timestamp=current_time, element_id=element_id, x=x, y=y)
-            session.clicks.append(click)
+            session = self._get_session(session_id, user_id, current_time)
+            session.clicks.append(current_time, element_id, x, y)
             session.last_activity = current_time
-            
+
             # Check for rage clicks
-            self._check_rage_clicks(session, element_id)
+            self._check_rage_clicks(session, element_id, current_time)
 
     def track_page_view(self, session_id: str, user_id: str, page_path: str):
         with self._lock:
             current_time = time.time()
-            session = self._sessions.get(session_id)
-            if not session:
-                session = UserSession(
-                    session_id=session_id,
-                    user_id=user_id,
-                    start_time=current_time,
-                    last_activity=current_time,
-                    clicks=[],
-                    page_views=[],
-                    actions=[]
-                )
-                self._sessions[session_id] = session
-            
-            session.page_views.append(page_path)
+            session = self._get_session(session_id, user_id, current_time)
+            session.page_views.append((current_time, page_path))
             session.last_activity = current_time
 
     def track_action(self, session_id: str, user_id: str, action_type: str, context: Optional[Dict] = None):
         with self._lock:
             current_time = time.time()
-            session = self._sessions.get(session_id)
-            if not session:
-                session = UserSession(
-                    session_id=session_id,
-                    user_id=user_id,
-                    start_time=current_time,
-                    last_activity=current_time,
-                    clicks=[],
-                    page_views=[],
-                    actions=[]
-                )
-                self._sessions[session_id] = session
-            
+            session = self._get_session(session_id, user_id, current_time)
             action = {
                 "type": action_type,
                 "timestamp": current_time,
@@ -103,32 +254,217 @@ class InteractionTracker:
             session.actions.append(action)
             session.last_activity = current_time
 
-    def _check_rage_clicks(self, session: UserSession, element_id: str):
-        current_time = time.time()
-        recent_clicks = [
-            click for click in session.clicks
-            if click.element_id == element_id
-            and current_time - click.timestamp <= self.RAGE_CLICK_WINDOW
-        ]
-        
-        if len(recent_clicks) >= self.RAGE_CLICK_THRESHOLD:
+    # -- batched ingestion ----------------------------------------------------
+    @staticmethod
+    def _parse_event(event: Dict[str, Any], now: float) -> Optional[Tuple]:
+        kind = EVENT_KINDS.get(event.get("type"))
+        session_id, user_id = event.get("session_id"), event.get("user_id")
+        if kind is None or not isinstance(session_id, str) or not isinstance(user_id, str):
+            return None
+        timestamp = event.get("timestamp")
+        if (not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool)
+                or not math.isfinite(timestamp) or abs(timestamp - now) > MAX_CLOCK_SKEW):
+            timestamp = now
+        if kind == CLICK:
+            element_id, x, y = event.get("element_id"), event.get("x", 0), event.get("y", 0)
+            if not isinstance(element_id, str) or not _is_coord(x) or not _is_coord(y):
+                return None
+            return (CLICK, session_id, user_id, timestamp, element_id, x, y)
+        if kind == PAGE_VIEW:
+            page_path = event.get("page_path")
+            return None if not isinstance(page_path, str) else (PAGE_VIEW, session_id, user_id, timestamp, page_path)
+        action_type, context = event.get("action_type"), event.get("context") or {}
+        if not isinstance(action_type, str) or not isinstance(context, dict):
+            return None
+        return (ACTION, session_id, user_id, timestamp, action_type, context)
+
+    def ingest(self, events: Iterable[Dict[str, Any]]) -> IngestResult:
+        """
+        Queue a batch of events without taking the tracker lock.
+
+        Each event is a dict with ``type`` ("click", "page_view" or "action"),
+        ``session_id``, ``user_id``, an optional epoch ``timestamp`` and the
+        fields of the matching ``track_*`` call. Invalid events are skipped
+        and counted.
+        """
+        now = time.time()
+        parsed = []
+        invalid = 0
+        for event in events:
+            item = self._parse_event(event, now) if isinstance(event, dict) else None
+            if item is None:
+                invalid += 1
+            else:
+                parsed.append(item)
+        depth = len(self._queue)
+        self._ingest_stats["invalid"] += invalid
+        if depth + len(parsed) > self.max_queued:
+            self._ingest_stats["refused"] += len(parsed)
+            retry_after = depth / self._drain_rate if self._drain_rate else 1.0
+            return IngestResult(0, invalid, depth, backpressure=True, retry_after=min(retry_after, 60.0))
+        self._queue.extend(parsed)
+        self._ingest_stats["accepted"] += len(parsed)
+        self._ensure_consumer()
+        self._queue_ready.set()
+        return IngestResult(len(parsed), invalid, depth + len(parsed))
+
+    def _ensure_consumer(self):
+        if self._consumer is not None or not self._start_consumer:
+            return
+        with self._consumer_lock:
+            if self._consumer is None:
+                self._consumer = threading.Thread(target=self._consume, name="interaction-ingest", daemon=True)
+                self._consumer.start()
+
+    def _consume(self):
+        while True:
+            self._queue_ready.wait()
+            # Cleared before draining, so events queued meanwhile set it again.
+            self._queue_ready.clear()
+            try:
+                while self.drain(INGEST_DRAIN_BATCH):
+                    pass
+            except Exception as e:
+                self.logger.error("interaction_ingest_error", error=str(e))
+
+    def drain(self, max_events: Optional[int] = None) -> int:
+        """
+        Apply up to ``max_events`` queued events (all by default); returns how
+        many were taken off the queue. An event that fails to apply is logged
+        and counted as failed without affecting the rest of the batch.
+        """
+        queue = self._queue
+        count = len(queue) if max_events is None else min(max_events, len(queue))
+        if not count:
+            return 0
+        popleft = queue.popleft
+        batch = [popleft() for _ in range(count)]
+        started = time.perf_counter()
+        with self._lock:
+            now = time.time()
+            session_id = session = None
+            failed = 0
+            for event in batch:
+                try:
+                    if event[1] != session_id:  # batches from one client share a session
+                        session_id = event[1]
+                        session = self._get_session(session_id, event[2], now)
+                        session.last_activity = now
+                    kind, timestamp = event[0], event[3]
+                    if kind == CLICK:
+                        session.clicks.append(timestamp, event[4], event[5], event[6])
+                        self._check_rage_clicks(session, event[4], timestamp)
+                    elif kind == PAGE_VIEW:
+                        session.page_views.append((timestamp, event[4]))
+                    else:
+                        session.actions.append({"type": event[4], "timestamp": timestamp, "context": event[5]})
+                except Exception as e:
+                    failed += 1
+                    session_id = None  # re-resolve the session for the next event
+                    self.logger.error("interaction_event_failed", session_id=event[1], error=str(e))
+        elapsed = time.perf_counter() - started
+        if elapsed > 0:
+            rate = count / elapsed
+            self._drain_rate = rate if not self._drain_rate else 0.8 * self._drain_rate + 0.2 * rate
+        self._ingest_stats["applied"] += count - failed
+        self._ingest_stats["failed"] += failed
+        return count
+
+    def ingest_stats(self) -> Dict[str, Any]:
+        return {**self._ingest_stats, "queue_depth": len(self._queue), "max_queued": self.max_queued,
+                "drain_rate": self._drain_rate}
+
+    def _check_rage_clicks(self, session: UserSession, element_id: str, current_time: float):
+        # The element's last THRESHOLD clicks all fall inside the window exactly
+        # when the window holds at least THRESHOLD clicks, so a fixed-size deque
+        # per element replaces scanning the session's click history.
+        windows = session.rage_windows
+        window = windows.get(element_id)
+        if window is None or window.maxlen != self.RAGE_CLICK_THRESHOLD:
+            window = windows[element_id] = deque(maxlen=self.RAGE_CLICK_THRESHOLD)
+            if len(windows) > MAX_RAGE_ELEMENTS:
+                windows.popitem(last=False)
+        else:
+            windows.move_to_end(element_id)
+        window.append(current_time)
+
+        if len(window) == window.maxlen and current_time - window[0] <= self.RAGE_CLICK_WINDOW:
+            session.rage_clicks += 1
+            session.rage_log.append((current_time, element_id))
             self.logger.warning(
                 "rage_clicks_detected",
                 session_id=session.session_id,
                 user_id=session.user_id,
                 element_id=element_id,
-                click_count=len(recent_clicks),
+                click_count=len(window),
                 window_seconds=self.RAGE_CLICK_WINDOW
             )
 
-    def cleanup_expired_sessions(self):
+    def cleanup_expired_sessions(self, max_sessions: Optional[int] = None) -> int:
+        """Drop sessions idle for longer than SESSION_TIMEOUT (at most ``max_sessions``); returns the count."""
+        rows: List[EventRow] = []
         with self._lock:
-            current_time = time.time()
-            expired_sessions = [
-                session_id for session_id, session in self._sessions.items()
-                if current_time - session.last_activity > self.SESSION_TIMEOUT
-            ]
-            for session_id in expired_sessions:
-                del self._sessions[session_id]
-
-interaction_tracker = InteractionTracker() 
\ No newline at end of file
+            cutoff = time.time() - self.SESSION_TIMEOUT
+            removed = 0
+            while self._sessions and (max_sessions is None or removed < max_sessions):
+                session = next(iter(self._sessions.values()))
+                if session.last_activity >= cutoff:
+                    break  # everything after it was active more recently
+                self._sessions.popitem(last=False)
+                user_sessions = self._by_user[session.user_id]
+                del user_sessions[session.session_id]
+                if not user_sessions:
+                    del self._by_user[session.user_id]
+                if self.event_log is not None:
+                    rows += self._export_rows(session)
+                removed += 1
+        if rows:
+            self._write_event_log(rows)
+        return removed
+
+    # -- export ---------------------------------------------------------------
+    @staticmethod
+    def _export_rows(session: UserSession) -> List[EventRow]:
+        """Rows for the session's events recorded since its last export (if still retained)."""
+        sid, uid = session.session_id, session.user_id
+        clicks, views, actions, rages = session.exported
+        rows: List[EventRow] = []
+        log = session.clicks
+        for i in range(max(0, len(log) - (log.total - clicks)), len(log)):
+            click = log[i]
+            rows.append((click.timestamp, CLICK, sid, uid, click.element_id, click.x, click.y, ""))
+
+        def new_entries(capped: CappedLog, exported: int) -> list:
+            count = min(capped.total - exported, len(capped))
+            return list(capped)[len(capped) - count:] if count else []
+
+        rows += [(ts, PAGE_VIEW, sid, uid, path, 0, 0, "") for ts, path in new_entries(session.page_views, views)]
+        rows += [
+            (a["timestamp"], ACTION, sid, uid, a["type"], 0, 0, json.dumps(a["context"]) if a["context"] else "")
+            for a in new_entries(session.actions, actions)
+        ]
+        rows += [(ts, RAGE_CLICK, sid, uid, element, 0, 0, "") for ts, element in new_entries(session.rage_log, rages)]
+        session.exported = (log.total, session.page_views.total, session.actions.total, session.rage_log.total)
+        return rows
+
+    def _write_event_log(self, rows: List[EventRow]):
+        try:
+            self.event_log.append(rows)
+        except OSError as e:
+            self.logger.error("interaction_export_failed", error=str(e), events=len(rows))
+
+    def flush_event_log(self) -> int:
+        """Export events recorded since the last export for every live session; returns the row count."""
+        if self.event_log is None:
+            return 0
+        with self._lock:
+            rows = [row for session in self._sessions.values() for row in self._export_rows(session)]
+        if rows:
+            self._write_event_log(rows)
+        return len(rows)
+
+interaction_tracker = InteractionTracker(
+    event_log=EventLog(INTERACTION_LOG_DIR) if INTERACTION_LOG_DIR else None
+)
+if interaction_tracker.event_log is not None:
+    atexit.register(interaction_tracker.flush_event_log)
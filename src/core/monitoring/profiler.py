@@ -0,0 +1,255 @@
+"""Low-overhead in-process sampling profiler with flame-graph output."""
+
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_RATE = 100.0       # samples per second
+MAX_OVERHEAD = 0.01        # share of one CPU the sampler may use
+MAX_DEPTH = 128
+TASK_SAMPLE_EVERY = 10     # suspended asyncio tasks are sampled every Nth tick
+
+# Leaf frames of threads that are blocked rather than running Python code.
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"), ("queue.py", "get"), ("socket.py", "accept"),
+    ("connection.py", "wait"), ("thread.py", "_worker"),
+}
+
+Frame = Tuple[str, str, int]  # (qualified name, file, first line)
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another one is running."""
+
+
+class SamplingProfiler:
+    """Periodically snapshots every thread's Python stack via ``sys._current_frames``.
+
+    Nothing is installed in the profiled threads (no ``settrace``/``setprofile``),
+    so code runs at full speed; the cost is the sampler thread itself. Each
+    tick's duration is measured and the sampling interval is stretched whenever
+    the sampler would exceed ``max_overhead`` of one CPU, which keeps it safe to
+    run in production. Identical stacks are aggregated into counts as they
+    are collected, so memory grows with distinct stacks, not with duration.
+
+    With ``loop`` set, the stacks of that loop's suspended asyncio tasks are
+    also sampled (under ``task:<name>`` roots) to show where requests wait.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, max_overhead: float = MAX_OVERHEAD,
+                 include_idle: bool = False, loop: Optional[asyncio.AbstractEventLoop] = None,
+                 max_depth: int = MAX_DEPTH):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.max_overhead = max_overhead
+        self.include_idle = include_idle
+        self.loop = loop
+        self.max_depth = max_depth
+        self._stacks: Counter = Counter()
+        self._frame_cache: Dict[Any, Frame] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._started_at = 0.0
+        self._duration = 0.0
+        self._ticks = 0
+        self._sampler_seconds = 0.0
+        self._interval = 1.0 / rate
+
+    # -- sampling -------------------------------------------------------------
+    def _frame(self, code) -> Frame:
+        frame = self._frame_cache.get(code)
+        if frame is None:
+            frame = self._frame_cache[code] = (
+                getattr(code, "co_qualname", code.co_name),
+                os.path.basename(code.co_filename),
+                code.co_firstlineno,
+            )
+        return frame
+
+    def _walk(self, frame) -> List[Frame]:
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append(self._frame(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _is_idle(self, stack: List[Frame]) -> bool:
+        return bool(stack) and (stack[-1][1], stack[-1][0].rsplit(".", 1)[-1]) in IDLE_FRAMES
+
+    def _sample_threads(self, own_ident: int, names: Dict[int, str]):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = self._walk(frame)
+            if not self.include_idle and self._is_idle(stack):
+                continue
+            root = ("thread:" + names.get(ident, str(ident)), "", 0)
+            self._stacks[(root, *stack)] += 1
+
+    def _sample_tasks(self):
+        try:
+            tasks = list(asyncio.all_tasks(self.loop))
+        except RuntimeError:  # task set changed while being copied; skip this tick
+            return
+        for task in tasks:
+            coro = task.get_coro()
+            frames = []
+            # Follow the await chain from the task's coroutine down to the leaf.
+            while coro is not None and len(frames) < self.max_depth:
+                frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+                if frame is None:
+                    break
+                frames.append(self._frame(frame.f_code))
+                coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+            if frames:
+                self._stacks[(("task:" + task.get_name(), "", 0), *frames)] += 1
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            tick_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            if self._ticks % 100 == 0:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            try:
+                self._sample_threads(own_ident, names)
+                if self.loop is not None and self._ticks % TASK_SAMPLE_EVERY == 0:
+                    self._sample_tasks()
+            except Exception as e:  # never let a bad frame kill the sampler
+                logger.warning("profiler_sample_failed", error=str(e))
+            self._ticks += 1
+            cost = time.thread_time() - cpu_start
+            self._sampler_seconds += cost
+            # Stretch the interval if sampling would exceed the overhead budget.
+            self._interval = max(1.0 / self.rate, cost / self.max_overhead)
+            next_tick = max(next_tick + self._interval, tick_start)
+            self._stop.wait(max(0.0, next_tick - time.perf_counter()))
+
+    # -- control --------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            raise ProfilerBusyError("profiler is already running")
+        self._stop.clear()
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._duration = time.perf_counter() - self._started_at
+
+    def profile(self, seconds: float) -> "SamplingProfiler":
+        """Blocking helper: sample for ``seconds`` and return self."""
+        self.start()
+        try:
+            time.sleep(seconds)
+        finally:
+            self.stop()
+        return self
+
+    # -- output ---------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        duration = self._duration or max(time.perf_counter() - self._started_at, 1e-9)
+        return {
+            "duration_seconds": duration,
+            "ticks": self._ticks,
+            "samples": sum(self._stacks.values()),
+            "distinct_stacks": len(self._stacks),
+            "requested_rate": self.rate,
+            "effective_rate": self._ticks / duration if duration else 0.0,
+            "overhead_percent": 100.0 * self._sampler_seconds / duration if duration else 0.0,
+        }
+
+    @staticmethod
+    def _label(frame: Frame) -> str:
+        name, filename, line = frame
+        label = f"{name} ({filename}:{line})" if filename else name
+        return label.replace(";", ":")
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format (``flamegraph.pl``/speedscope input)."""
+        lines = [
+            ";".join(self._label(frame) for frame in stack) + f" {count}"
+            for stack, count in self._stacks.most_common()
+        ]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def speedscope(self, name: str = "3AI profile") -> Dict[str, Any]:
+        """Speedscope "sampled" profiles, one per thread/task root, sharing one frame table."""
+        frame_index: Dict[Frame, int] = {}
+        frames: List[Dict[str, Any]] = []
+        profiles: Dict[str, Dict[str, Any]] = {}
+
+        def index(frame: Frame) -> int:
+            i = frame_index.get(frame)
+            if i is None:
+                i = frame_index[frame] = len(frames)
+                entry = {"name": frame[0]}
+                if frame[1]:
+                    entry.update(file=frame[1], line=frame[2])
+                frames.append(entry)
+            return i
+
+        # Weight samples by the achieved interval, which may exceed 1/rate.
+        interval = self.stats()["duration_seconds"] / self._ticks if self._ticks else 1.0 / self.rate
+        for stack, count in self._stacks.items():
+            root, *rest = stack
+            profile = profiles.setdefault(root[0], {
+                "type": "sampled", "name": root[0], "unit": "seconds",
+                "startValue": 0, "endValue": 0.0, "samples": [], "weights": [],
+            })
+            profile["samples"].append([index(frame) for frame in rest])
+            profile["weights"].append(count * interval)
+            profile["endValue"] += count * interval
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "3AI sampling profiler",
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+        }
+
+
+_profile_lock = threading.Lock()
+
+
+async def run_profile(seconds: float, rate: float = DEFAULT_RATE,
+                      include_idle: bool = False, include_tasks: bool = True) -> SamplingProfiler:
+    """
+    Profile the whole process for ``seconds`` without blocking the event loop.
+
+    Only one profile runs at a time; a concurrent call raises ProfilerBusyError.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("a profile is already in progress")
+    try:
+        loop = asyncio.get_running_loop() if include_tasks else None
+        profiler = SamplingProfiler(rate=rate, include_idle=include_idle, loop=loop)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+        logger.info("profile_completed", **profiler.stats())
+        return profiler
+    finally:
+        _profile_lock.release()
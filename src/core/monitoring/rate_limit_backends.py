@@ -0,0 +1,437 @@
+"""Rate limit backends: the GCRA step, the backend interface, and shared-memory and Redis state."""
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+import asyncio
+import hashlib
+import math
+import mmap
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+import structlog
+
+if TYPE_CHECKING:
+    from .rate_limiter import RateLimitConfig
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_IDLE_TTL = 3600.0  # keep an idle key's violation history this long
+DEFAULT_SHM_SLOTS = 65536
+SHM_STRIPES = 64
+SHM_MAGIC = b"GRLS"
+_HEADER = struct.Struct("<4sII")          # magic, slots, stripes
+_HEADER_SIZE = 64
+_RECORD = struct.Struct("<QddI4x")        # key hash, tat, backoff_until, violations
+
+DEFAULT_REDIS_URL = "redis://localhost:6379/0"
+REDIS_KEY_PREFIX = "ratelimit:"
+
+GCRA_TOLERANCE = 1e-9  # relative; GCRA_SCRIPT uses the same literal
+
+# Same decision as gcra_step, executed atomically on the server. Times are
+# passed in and returned as strings so no precision is lost to Redis' integer
+# conversion of Lua numbers; ``now`` comes from the caller so every worker
+# judges against its own clock, like the in-process backend.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local multiplier = tonumber(ARGV[4])
+local idle_ttl = tonumber(ARGV[5])
+local state = redis.call('HMGET', KEYS[1], 't', 'b', 'v')
+local tat = tonumber(state[1]) or 0
+local backoff_until = tonumber(state[2]) or 0
+local violations = tonumber(state[3]) or 0
+local limited = 1
+if now >= backoff_until then
+  local new_tat = math.max(tat, now) + interval
+  if new_tat - now > window * (1 + 1e-9) then
+    violations = violations + 1
+    backoff_until = now + window * multiplier ^ violations
+  else
+    tat = new_tat
+    limited = 0
+  end
+end
+local t = string.format('%.17g', tat)
+local b = string.format('%.17g', backoff_until)
+redis.call('HSET', KEYS[1], 't', t, 'b', b, 'v', violations)
+redis.call('EXPIRE', KEYS[1], math.ceil(math.max(tat, backoff_until) - now + idle_ttl))
+return {limited, t, b}
+""".strip()
+
+GCRA_SCRIPT_SHA = hashlib.sha1(GCRA_SCRIPT.encode()).hexdigest()
+
+
+def gcra_step(tat: float, backoff_until: float, violations: int, now: float,
+              config: "RateLimitConfig") -> Tuple[bool, float, float, int]:
+    """
+    One GCRA decision with exponential backoff.
+
+    Returns:
+        tuple: (limited, tat, backoff_until, violations) after the request
+    """
+    if now < backoff_until:
+        return True, tat, backoff_until, violations
+    # Accepting would push the TAT more than a window ahead: reject and back off.
+    # The relative tolerance absorbs the rounding of summed emission intervals
+    # when max_requests does not divide the window (5 x 7/5 s is 7.000000000000001).
+    new_tat = max(tat, now) + config.emission_interval
+    if new_tat - now > config.window_seconds * (1 + GCRA_TOLERANCE):
+        violations += 1
+        backoff_until = now + config.window_seconds * (config.backoff_multiplier ** violations)
+        return True, tat, backoff_until, violations
+    return False, new_tat, backoff_until, violations
+
+
+def gcra_quota(tat: float, backoff_until: float, now: float, config: "RateLimitConfig") -> Tuple[int, float]:
+    """
+    Returns:
+        tuple: (requests still allowed now, seconds until the next slot frees up
+               or the backoff ends; a full window when nothing is in use)
+    """
+    if now < backoff_until:
+        return 0, backoff_until - now
+    interval = config.emission_interval
+    backlog = max(0.0, tat - now)
+    used = min(config.max_requests, math.ceil(backlog / interval - 1e-9))
+    if used == 0:
+        return config.max_requests, float(config.window_seconds)
+    return config.max_requests - used, backlog - (used - 1) * interval
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage and atomic check-and-increment of GCRA state.
+
+    Backends only differ in where the per-key state lives: this process
+    (InProcessBackend in rate_limiter.py), one host's shared memory, or a
+    Redis server.
+    """
+
+    @abstractmethod
+    def check(self, key: str, endpoint: str, config: "RateLimitConfig") -> Tuple[bool, int, float]:
+        """Atomically apply one request; returns (limited, remaining, reset_in)."""
+
+    @abstractmethod
+    def quota(self, key: str, endpoint: str, config: "RateLimitConfig") -> Tuple[int, float]:
+        """(remaining, reset_in) without consuming quota."""
+
+    def is_limited(self, key: str, endpoint: str, config: "RateLimitConfig") -> bool:
+        """``check`` without the quota; backends override it when that is cheaper."""
+        return self.check(key, endpoint, config)[0]
+
+    def check_many(self, requests: Iterable[Tuple[str, str, "RateLimitConfig"]]) -> List[Tuple[bool, int, float]]:
+        """``check`` for several requests; network backends send them in one round trip."""
+        return [self.check(key, endpoint, config) for key, endpoint, config in requests]
+
+    async def acheck(self, key: str, endpoint: str, config: "RateLimitConfig") -> Tuple[bool, int, float]:
+        """Async ``check``; backends that do I/O run it off the event loop."""
+        return await asyncio.to_thread(self.check, key, endpoint, config)
+
+    def close(self):
+        pass
+
+
+def _key_hash(key: str, endpoint: str) -> int:
+    digest = hashlib.blake2b(f"{endpoint}\0{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1  # 0 marks an empty slot
+
+
+class SharedMemoryBackend(RateLimitBackend):
+    """
+    GCRA state in a memory-mapped file shared by every process on the host.
+
+    The file holds a fixed open-addressing table of 32-byte records (a 64-bit
+    hash of the key, tat, backoff end and violation count) split into
+    ``SHM_STRIPES`` regions. A key is probed only within its region, which is
+    guarded by an ``fcntl`` byte-range lock between processes plus a thread lock
+    within this one (fcntl locks are per process). Records whose quota has been
+    idle for ``idle_ttl`` are reused in place; if a region is full, the record
+    that went idle first is overwritten.
+
+    Put the file on tmpfs (/dev/shm) so it never touches the disk.
+    """
+
+    def __init__(self, path: Optional[str] = None, slots: int = DEFAULT_SHM_SLOTS,
+                 idle_ttl: float = DEFAULT_IDLE_TTL):
+        if fcntl is None:
+            raise RuntimeError("the shared memory rate limit backend needs fcntl")
+        if slots < SHM_STRIPES or slots % SHM_STRIPES:
+            raise ValueError(f"slots must be a positive multiple of {SHM_STRIPES}")
+        self.path = path or default_shm_path()
+        self.idle_ttl = idle_ttl
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        # Byte 0 serialises initialisation; byte 1 + i guards stripe i.
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if len(header) == _HEADER.size and header[:4] == SHM_MAGIC:
+                _, slots, stripes = _HEADER.unpack(header)
+                if stripes != SHM_STRIPES:
+                    raise ValueError(f"{self.path} was created with {stripes} stripes")
+            else:
+                os.ftruncate(self._fd, _HEADER_SIZE + slots * _RECORD.size)
+                os.pwrite(self._fd, _HEADER.pack(SHM_MAGIC, slots, SHM_STRIPES), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 0)
+        self.slots = slots
+        self._per_stripe = slots // SHM_STRIPES
+        self._map = mmap.mmap(self._fd, _HEADER_SIZE + slots * _RECORD.size)
+        self._locks = [threading.Lock() for _ in range(SHM_STRIPES)]
+
+    def __len__(self) -> int:
+        """Occupied records, including idle ones not reused yet."""
+        return sum(
+            1 for slot in range(self.slots)
+            if struct.unpack_from("<Q", self._map, _HEADER_SIZE + slot * _RECORD.size)[0]
+        )
+
+    @contextmanager
+    def _locked(self, stripe: int):
+        with self._locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 1 + stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 1 + stripe)
+
+    def _find(self, key_hash: int, stripe: int, now: float, create: bool) -> Optional[int]:
+        """Offset of the key's record; with ``create``, claims a free or idle one if missing."""
+        base = stripe * self._per_stripe
+        start = key_hash // SHM_STRIPES % self._per_stripe
+        reusable = None
+        oldest, oldest_expiry = None, float("inf")
+        for i in range(self._per_stripe):
+            offset = _HEADER_SIZE + (base + (start + i) % self._per_stripe) * _RECORD.size
+            stored, tat, backoff_until, _ = _RECORD.unpack_from(self._map, offset)
+            if stored == key_hash:
+                return offset
+            if stored == 0:  # end of the probe chain: the key is not stored
+                if reusable is None:
+                    reusable = offset
+                break
+            expiry = max(tat, backoff_until) + self.idle_ttl
+            if reusable is None and expiry <= now:
+                reusable = offset
+            if expiry < oldest_expiry:
+                oldest, oldest_expiry = offset, expiry
+        if not create:
+            return None
+        offset = reusable if reusable is not None else oldest
+        if reusable is None:
+            logger.warning("rate_limit_shm_region_full", path=self.path, stripe=stripe)
+        _RECORD.pack_into(self._map, offset, key_hash, 0.0, 0.0, 0)
+        return offset
+
+    def check(self, key: str, endpoint: str, config: "RateLimitConfig") -> Tuple[bool, int, float]:
+        key_hash = _key_hash(key, endpoint)
+        stripe = key_hash % SHM_STRIPES
+        with self._locked(stripe):
+            now = time.time()
+            offset = self._find(key_hash, stripe, now, create=True)
+            _, tat, backoff_until, violations = _RECORD.unpack_from(self._map, offset)
+            limited, tat, backoff_until, violations = gcra_step(tat, backoff_until, violations, now, config)
+            _RECORD.pack_into(self._map, offset, key_hash, tat, backoff_until, violations)
+        return (limited, *gcra_quota(tat, backoff_until, now, config))
+
+    def quota(self, key: str, endpoint: str, config: "RateLimitConfig") -> Tuple[int, float]:
+        key_hash = _key_hash(key, endpoint)
+        stripe = key_hash % SHM_STRIPES
+        with self._locked(stripe):
+            now = time.time()
+            offset = self._find(key_hash, stripe, now, create=False)
+            if offset is None:
+                return config.max_requests, float(config.window_seconds)
+            _, tat, backoff_until, _ = _RECORD.unpack_from(self._map, offset)
+        return gcra_quota(tat, backoff_until, now, config)
+
+    async def acheck(self, key: str, endpoint: str, config: "RateLimitConfig") -> Tuple[bool, int, float]:
+        # A lock syscall and a few struct reads: cheaper inline than a thread hop.
+        return self.check(key, endpoint, config)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class RespError(RuntimeError):
+    """Error reply from a Redis-protocol server."""
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    GCRA state in Redis (or any server speaking its protocol), shared by every
+    worker on every host.
+
+    Each check is one EVALSHA of GCRA_SCRIPT, so the read-modify-write is
+    atomic on the server and costs a single round trip; the script is sent
+    with EVAL only when the server answers NOSCRIPT. ``check_many`` writes all
+    of its EVALSHA commands at once and then reads the replies (pipelining).
+    Keys expire on their own ``idle_ttl`` after their quota has replenished.
+
+    The client is a minimal RESP implementation over one socket, serialised by
+    a lock. If the server is unreachable, checks fail open (are allowed) unless
+    ``fail_open`` is False, in which case the OSError propagates.
+    """
+
+    def __init__(self, url: str = DEFAULT_REDIS_URL, idle_ttl: float = DEFAULT_IDLE_TTL,
+                 timeout: float = 1.0, key_prefix: str = REDIS_KEY_PREFIX, fail_open: bool = True):
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"unsupported rate limit backend URL '{url}'")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.idle_ttl = idle_ttl
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self.fail_open = fail_open
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    # -- RESP -----------------------------------------------------------------
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by the rate limit server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return RespError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise RespError(f"unexpected reply type {kind!r}")
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock, self._reader = sock, sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for reply in self._roundtrip(setup):
+            if isinstance(reply, RespError):
+                raise reply
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    def _roundtrip(self, commands) -> list:
+        """Send ``commands`` in one write and read one reply per command."""
+        if not commands:
+            return []
+        self._sock.sendall(b"".join(self._encode(*command) for command in commands))
+        return [self._read_reply() for _ in commands]
+
+    def _execute(self, commands) -> list:
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._roundtrip(commands)
+                except OSError:
+                    # A stale connection is reopened once; a second failure is real.
+                    self._disconnect()
+                    if attempt == 2:
+                        raise
+
+    # -- backend --------------------------------------------------------------
+    def _script_args(self, key: str, endpoint: str, config: "RateLimitConfig", now: float) -> tuple:
+        return (1, f"{self.key_prefix}{endpoint}:{key}", repr(now), repr(config.emission_interval),
+                config.window_seconds, repr(float(config.backoff_multiplier)), repr(float(self.idle_ttl)))
+
+    def check_many(self, requests: Iterable[Tuple[str, str, "RateLimitConfig"]]) -> List[Tuple[bool, int, float]]:
+        requests = list(requests)
+        now = time.time()
+        args = [self._script_args(key, endpoint, config, now) for key, endpoint, config in requests]
+        try:
+            replies = self._execute([("EVALSHA", GCRA_SCRIPT_SHA, *a) for a in args])
+            missing = [i for i, reply in enumerate(replies) if isinstance(reply, RespError)
+                       and str(reply).startswith("NOSCRIPT")]
+            if missing:
+                # EVAL also caches the script, so this happens once per server restart.
+                for i, reply in zip(missing, self._execute([("EVAL", GCRA_SCRIPT, *args[i]) for i in missing])):
+                    replies[i] = reply
+        except OSError as e:
+            if not self.fail_open:
+                raise
+            logger.warning("rate_limit_backend_unavailable", backend="redis", error=str(e))
+            return [(False, config.max_requests, float(config.window_seconds)) for _, _, config in requests]
+
+        results = []
+        for (_, _, config), reply in zip(requests, replies):
+            if isinstance(reply, RespError):
+                raise reply
+            limited, tat, backoff_until = reply
+            results.append((bool(limited), *gcra_quota(float(tat), float(backoff_until), now, config)))
+        return results
+
+    def check(self, key: str, endpoint: str, config: "RateLimitConfig") -> Tuple[bool, int, float]:
+        return self.check_many([(key, endpoint, config)])[0]
+
+    def quota(self, key: str, endpoint: str, config: "RateLimitConfig") -> Tuple[int, float]:
+        now = time.time()
+        try:
+            reply, = self._execute([("HMGET", f"{self.key_prefix}{endpoint}:{key}", "t", "b")])
+        except OSError as e:
+            if not self.fail_open:
+                raise
+            logger.warning("rate_limit_backend_unavailable", backend="redis", error=str(e))
+            reply = [None, None]
+        if isinstance(reply, RespError):
+            raise reply
+        tat, backoff_until = reply
+        if tat is None:
+            return config.max_requests, float(config.window_seconds)
+        return gcra_quota(float(tat), float(backoff_until), now, config)
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+def default_shm_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "3ai-rate-limits")
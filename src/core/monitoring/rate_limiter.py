@@ -1,11 +1,23 @@
-"""Rate limiting implementation with sliding window approach."""
+"""Rate limiting implementation with a constant-time GCRA (generic cell rate algorithm)."""
 
-from typing import Dict, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
 import time
 from dataclasses import dataclass
-from datetime import datetime
 import threading
-from collections import defaultdict
+
+import structlog
+
+from .rate_limit_backends import (
+    DEFAULT_IDLE_TTL, DEFAULT_SHM_SLOTS, RateLimitBackend, RedisBackend, SharedMemoryBackend,
+    gcra_quota, gcra_step,
+)
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_STRIPES = 64
+WHEEL_TICK = 10.0          # seconds per timer wheel slot
+WHEEL_SLOTS = 512
 
 @dataclass
 class RateLimitConfig:
@@ -13,50 +25,244 @@ class RateLimitConfig:
     window_seconds: int
     backoff_multiplier: float = 2.0
 
-class SlidingWindowRateLimiter:
+    @property
+    def emission_interval(self) -> float:
+        """Seconds of quota one request consumes."""
+        return self.window_seconds / self.max_requests
+
+class _LimitState:
+    """GCRA state of one (key, endpoint) pair: a few numbers regardless of the limit."""
+    __slots__ = ("tat", "backoff_until", "violations", "expires", "scheduled")
+
     def __init__(self):
-        self._windows: Dict[str, Dict[str, list[float]]] = defaultdict(lambda: defaultdict(list))
-        self._backoff_times: Dict[str, Dict[str, Tuple[float, int]]] = defaultdict(lambda: defaultdict(lambda: (0, 0)))
-        self._lock = threading.Lock()
+        self.tat = 0.0            # theoretical arrival time of the next request
+        self.backoff_until = 0.0
+        self.violations = 0
+        self.expires = 0.0        # when the idle state may be dropped
+        self.scheduled = 0        # timer wheel tick the state is currently filed under
+
+class _TimerWheel:
+    """
+    Hashed timing wheel of states to expire.
+
+    Each state is filed once under the tick of its expiry. Touching a state only
+    moves its ``expires`` forward; when its tick comes up, the state is dropped
+    if it really expired or re-filed under its new expiry otherwise (lazy
+    rescheduling), so accesses never search or remove wheel entries.
+    """
+
+    def __init__(self, now: float, tick: float = WHEEL_TICK, slots: int = WHEEL_SLOTS):
+        self.tick = tick
+        self._slots: List[list] = [[] for _ in range(slots)]
+        self.current = int(now // tick)
+        self.next_advance = (self.current + 1) * tick
+
+    def schedule(self, key, state: _LimitState):
+        tick = max(int(state.expires // self.tick) + 1, self.current + 1)
+        state.scheduled = tick
+        self._slots[tick % len(self._slots)].append((tick, key))
+
+    def advance(self, now: float, states: Dict) -> int:
+        """Process every tick up to ``now``; returns the number of evicted states."""
+        target = int(now // self.tick)
+        evicted = 0
+        reschedule = []
+        # A gap longer than the wheel visits each slot once; entries filed for a
+        # later lap are kept where they are.
+        for tick in range(self.current + 1, self.current + 1 + min(target - self.current, len(self._slots))):
+            index = tick % len(self._slots)
+            keep = []
+            for entry in self._slots[index]:
+                due, key = entry
+                if due > target:
+                    keep.append(entry)
+                    continue
+                state = states.get(key)
+                if state is None or state.scheduled != due:
+                    continue  # stale entry: already evicted or filed elsewhere
+                if state.expires <= now:
+                    del states[key]
+                    evicted += 1
+                else:
+                    reschedule.append((key, state))
+            self._slots[index] = keep
+        self.current = max(self.current, target)
+        self.next_advance = (self.current + 1) * self.tick
+        for key, state in reschedule:
+            self.schedule(key, state)
+        return evicted
+
+class _Stripe:
+    """One shard of limiter state with its own lock and expiry wheel."""
+    __slots__ = ("lock", "states", "wheel", "evicted")
+
+    def __init__(self, now: float):
+        self.lock = threading.Lock()
+        self.states: Dict[Tuple[str, str], _LimitState] = {}
+        self.wheel = _TimerWheel(now)
+        self.evicted = 0
+
+class InProcessBackend(RateLimitBackend):
+    """
+    Process-local GCRA state.
+
+    State is spread over ``stripes`` independently locked shards, so threads
+    checking different keys rarely contend. A state whose quota has fully
+    replenished and whose backoff has ended is dropped after ``idle_ttl`` more
+    seconds by a per-stripe timer wheel advanced from the request path, so
+    memory is bounded by the number of keys active within that period.
+    """
+
+    def __init__(self, stripes: int = DEFAULT_STRIPES, idle_ttl: float = DEFAULT_IDLE_TTL):
+        if stripes < 1 or stripes & (stripes - 1):
+            raise ValueError("stripes must be a power of two")
+        self.idle_ttl = idle_ttl
+        now = time.time()
+        self._stripes = [_Stripe(now) for _ in range(stripes)]
+        self._mask = stripes - 1
+
+    def __len__(self) -> int:
+        return sum(len(stripe.states) for stripe in self._stripes)
+
+    @property
+    def evicted(self) -> int:
+        """Idle states dropped so far."""
+        return sum(stripe.evicted for stripe in self._stripes)
+
+    def _stripe(self, state_key: Tuple[str, str]) -> _Stripe:
+        return self._stripes[hash(state_key) & self._mask]
+
+    def _apply(self, stripe: _Stripe, state_key: Tuple[str, str],
+               config: RateLimitConfig, now: float) -> Tuple[bool, _LimitState]:
+        if now >= stripe.wheel.next_advance:
+            stripe.evicted += stripe.wheel.advance(now, stripe.states)
+        state = stripe.states.get(state_key)
+        if state is None:
+            state = stripe.states[state_key] = _LimitState()
+            state.expires = now + self.idle_ttl
+            stripe.wheel.schedule(state_key, state)
+        limited, state.tat, state.backoff_until, state.violations = gcra_step(
+            state.tat, state.backoff_until, state.violations, now, config
+        )
+        state.expires = max(state.tat, state.backoff_until) + self.idle_ttl
+        return limited, state
+
+    def check(self, key: str, endpoint: str, config: RateLimitConfig) -> Tuple[bool, int, float]:
+        state_key = (key, endpoint)
+        stripe = self._stripe(state_key)
+        with stripe.lock:
+            now = time.time()
+            limited, state = self._apply(stripe, state_key, config, now)
+            return (limited, *gcra_quota(state.tat, state.backoff_until, now, config))
+
+    def is_limited(self, key: str, endpoint: str, config: RateLimitConfig) -> bool:
+        state_key = (key, endpoint)
+        stripe = self._stripe(state_key)
+        with stripe.lock:
+            return self._apply(stripe, state_key, config, time.time())[0]
+
+    def quota(self, key: str, endpoint: str, config: RateLimitConfig) -> Tuple[int, float]:
+        state_key = (key, endpoint)
+        stripe = self._stripe(state_key)
+        with stripe.lock:
+            state = stripe.states.get(state_key)
+            if state is None:
+                return config.max_requests, float(config.window_seconds)
+            return gcra_quota(state.tat, state.backoff_until, time.time(), config)
+
+    async def acheck(self, key: str, endpoint: str, config: RateLimitConfig) -> Tuple[bool, int, float]:
+        # The striped critical section is a few dictionary and float operations
+        # with no I/O, so it runs inline instead of paying for a thread hop.
+        return self.check(key, endpoint, config)
+
+    def sweep(self) -> int:
+        """Advance every stripe's wheel to now (also happens lazily on requests)."""
+        now = time.time()
+        evicted = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                dropped = stripe.wheel.advance(now, stripe.states)
+                stripe.evicted += dropped
+            evicted += dropped
+        return evicted
+
+class SlidingWindowRateLimiter:
+    """
+    Allows ``max_requests`` per ``window_seconds`` per (key, endpoint).
+
+    Instead of storing every request timestamp, GCRA keeps a single
+    "theoretical arrival time" (TAT): each accepted request pushes it
+    ``window / max_requests`` seconds further into the future, and a request is
+    rejected when that would put the TAT more than one window ahead of now.
+    This admits the same bursts as the previous sliding log (up to
+    ``max_requests`` at once, then one request per emission interval) in O(1)
+    time and memory per key, and remaining quota is derived from the same state.
+
+    Rejections keep the original exponential backoff: the n-th violation blocks
+    the pair for ``window_seconds * backoff_multiplier ** n``.
+
+    State lives in ``backend``: by default a striped, self-evicting
+    InProcessBackend; pass a shared backend (see rate_limit_backends.py) to
+    enforce one limit across worker processes.
+    """
+
+    def __init__(self, stripes: int = DEFAULT_STRIPES, idle_ttl: float = DEFAULT_IDLE_TTL,
+                 backend: Optional[RateLimitBackend] = None):
+        self.backend = backend if backend is not None else InProcessBackend(stripes, idle_ttl)
+
+    def __len__(self) -> int:
+        return len(self.backend) if hasattr(self.backend, "__len__") else 0
+
+    @property
+    def evicted(self) -> int:
+        return getattr(self.backend, "evicted", 0)
 
     def is_rate_limited(self, key: str, endpoint: str, config: RateLimitConfig) -> bool:
-        with self._lock:
-            current_time = time.time()
-            window = self._windows[key][endpoint]
-            
-            # Clean old timestamps
-            cutoff = current_time - config.window_seconds
-            window[:] = [ts for ts in window if ts > cutoff]
-
-            # Check backoff
-            backoff_until, violations = self._backoff_times[key][endpoint]
-            if current_time < backoff_until:
-                return True
-
-            # Check rate limit
-            if len(window) >= config.max_requests:
-                violations += 1
-                backoff_duration = config.window_seconds * (config.backoff_multiplier ** violations)
-                self._backoff_times[key][endpoint] = (current_time + backoff_duration, violations)
-                return True
-
-            # Add new request timestamp
-            window.append(current_time)
-            return False
+        return self.backend.is_limited(key, endpoint, config)
 
     def get_remaining_quota(self, key: str, endpoint: str, config: RateLimitConfig) -> Tuple[int, float]:
-        with self._lock:
-            current_time = time.time()
-            window = self._windows[key][endpoint]
-            cutoff = current_time - config.window_seconds
-            window[:] = [ts for ts in window if ts > cutoff]
-            
-            backoff_until, _ = self._backoff_times[key][endpoint]
-            if current_time < backoff_until:
-                return 0, backoff_until - current_time
-                
-            remaining = max(0, config.max_requests - len(window))
-            reset_time = min(window[0] + config.window_seconds, current_time + config.window_seconds) if window else current_time + config.window_seconds
-            return remaining, reset_time - current_time
-
-rate_limiter = SlidingWindowRateLimiter() 
\ No newline at end of file
+        """
+        Returns:
+            tuple: (requests still allowed now, seconds until the next slot frees up
+                   or the backoff ends; a full window when nothing is in use)
+        """
+        return self.backend.quota(key, endpoint, config)
+
+    def check(self, key: str, endpoint: str, config: RateLimitConfig) -> Tuple[bool, int, float]:
+        """``is_rate_limited`` plus the resulting quota, in one backend operation."""
+        return self.backend.check(key, endpoint, config)
+
+    def check_many(self, requests: Iterable[Tuple[str, str, RateLimitConfig]]) -> List[Tuple[bool, int, float]]:
+        """Batch ``check``; pipelined into one round trip by network backends."""
+        return self.backend.check_many(requests)
+
+    async def acheck(self, key: str, endpoint: str, config: RateLimitConfig) -> Tuple[bool, int, float]:
+        """Async form of ``check`` for request handlers."""
+        return await self.backend.acheck(key, endpoint, config)
+
+    def sweep(self) -> int:
+        """Drop expired idle state now (in-process backend only)."""
+        sweep = getattr(self.backend, "sweep", None)
+        return sweep() if sweep else 0
+
+def backend_from_env() -> RateLimitBackend:
+    """
+    Backend selected by RATE_LIMIT_BACKEND: "memory" (default, per process),
+    "shm" (per host; file at RATE_LIMIT_SHM_PATH) or a redis:// URL.
+    """
+    setting = os.getenv("RATE_LIMIT_BACKEND", "memory").strip()
+    try:
+        if setting.startswith("redis://"):
+            return RedisBackend(setting)
+        if setting == "shm":
+            return SharedMemoryBackend(
+                os.getenv("RATE_LIMIT_SHM_PATH") or None,
+                slots=int(os.getenv("RATE_LIMIT_SHM_SLOTS", DEFAULT_SHM_SLOTS)),
+            )
+        if setting not in ("", "memory"):
+            raise ValueError(f"unknown rate limit backend '{setting}'")
+    except (OSError, RuntimeError, ValueError) as e:
+        logger.error("rate_limit_backend_failed", backend=setting, error=str(e))
+    return InProcessBackend()
+
+rate_limiter = SlidingWindowRateLimiter(backend=backend_from_env())
@@ -0,0 +1,147 @@
+"""Local Redis-protocol stand-in that runs the rate limiter's GCRA script, for tests and development."""
+
+from typing import Dict, Optional, Tuple
+import hashlib
+import socketserver
+import threading
+import time
+from types import SimpleNamespace
+
+from .rate_limit_backends import GCRA_SCRIPT_SHA, gcra_step
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.decode().split()  # inline command, e.g. from telnet
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def handle(self):
+        while True:
+            command = self._read_command()
+            if command is None:
+                return
+            # Replies of a pipelined batch are written as they are produced,
+            # like Redis; the client reads them in order.
+            self.wfile.write(_encode(self.server.stand_in.execute(command)))
+
+
+class _Error(str):
+    pass
+
+
+def _encode(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, _Error):
+        return b"-%s\r\n" % reply.encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
+    data = str(reply).encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+class RespStandIn:
+    """
+    Threaded TCP server speaking enough of the Redis protocol for RedisBackend:
+    PING, SELECT, AUTH, SCRIPT LOAD/FLUSH, EVAL/EVALSHA of GCRA_SCRIPT
+    (implemented in Python with the same semantics), HMGET, DEL, DBSIZE and
+    FLUSHALL. Script execution is serialised like on a real server.
+
+    Usage:
+        server = RespStandIn().start()
+        backend = RedisBackend(server.url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = socketserver.ThreadingTCPServer((host, port), _Handler, bind_and_activate=True)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[Dict[str, str], float]] = {}
+        self._scripts = set()
+        self.commands = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "RespStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="resp-stand-in", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _hash(self, key: str) -> Dict[str, str]:
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= time.time():
+            self._data.pop(key, None)
+            return {}
+        return entry[0]
+
+    def _gcra(self, key: str, args) -> list:
+        now, interval, window, multiplier, idle_ttl = (float(a) for a in args)
+        fields = self._hash(key)
+        # gcra_step only reads these three attributes of a RateLimitConfig.
+        config = SimpleNamespace(emission_interval=interval, window_seconds=window,
+                                 backoff_multiplier=multiplier)
+        limited, tat, backoff_until, violations = gcra_step(
+            float(fields.get("t", 0)), float(fields.get("b", 0)), int(fields.get("v", 0)), now, config
+        )
+        t, b = repr(tat), repr(backoff_until)
+        self._data[key] = ({"t": t, "b": b, "v": str(violations)},
+                           time.time() + max(tat, backoff_until) - now + idle_ttl)
+        return [int(limited), t, b]
+
+    def execute(self, command) -> object:
+        name, args = command[0].upper(), command[1:]
+        with self._lock:
+            self.commands += 1
+            if name == "PING":
+                return "PONG"
+            if name in ("SELECT", "AUTH"):
+                return "OK"
+            if name == "SCRIPT" and args and args[0].upper() == "LOAD":
+                sha = hashlib.sha1(args[1].encode()).hexdigest()
+                self._scripts.add(sha)
+                return sha
+            if name == "SCRIPT" and args and args[0].upper() == "FLUSH":
+                self._scripts.clear()
+                return "OK"
+            if name in ("EVAL", "EVALSHA"):
+                if name == "EVAL":
+                    sha = hashlib.sha1(args[0].encode()).hexdigest()
+                    self._scripts.add(sha)
+                else:
+                    sha = args[0]
+                    if sha not in self._scripts:
+                        return _Error("NOSCRIPT No matching script. Please use EVAL.")
+                if sha != GCRA_SCRIPT_SHA or args[1] != "1":
+                    return _Error("ERR the stand-in only runs the GCRA rate limit script")
+                return self._gcra(args[2], args[3:])
+            if name == "HMGET":
+                fields = self._hash(args[0])
+                return [fields.get(field) for field in args[1:]]
+            if name == "DEL":
+                return sum(self._data.pop(key, None) is not None for key in args)
+            if name == "DBSIZE":
+                return sum(1 for key in list(self._data) if self._hash(key))
+            if name == "FLUSHALL":
+                self._data.clear()
+                return "OK"
+            return _Error(f"ERR unknown command '{command[0]}'")
+
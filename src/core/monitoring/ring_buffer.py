@@ -0,0 +1,119 @@
+"""Preallocated, NumPy-backed columnar ring buffer for metrics history."""
+
+from typing import Dict, Iterable, Mapping, Optional
+import threading
+
+import numpy as np
+
+
+class MetricsRingBuffer:
+    """Fixed-capacity history of numeric samples stored one array per metric.
+
+    Every sample is written twice, at ``i`` and ``i + capacity`` of arrays that
+    are ``2 * capacity`` long (a mirrored ring). The most recent ``n`` samples
+    are therefore always one contiguous slice, so windows are returned as
+    zero-copy, read-only views and appends stay O(1).
+
+    Views alias the buffer: they stay valid until later appends wrap around and
+    overwrite their oldest samples, so copy them if they must outlive a
+    collection interval.
+    """
+
+    def __init__(self, capacity: int, columns: Iterable[str] = (), dtype=np.float32):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._dtype = dtype
+        self._timestamps = np.full(2 * capacity, np.nan, dtype=np.float64)
+        self._columns: Dict[str, np.ndarray] = {}
+        self._head = 0   # index of the next write, in [0, capacity)
+        self._size = 0
+        self._lock = threading.Lock()
+        for name in columns:
+            self.add_column(name)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def columns(self) -> list:
+        return list(self._columns)
+
+    @property
+    def nbytes(self) -> int:
+        return self._timestamps.nbytes + sum(c.nbytes for c in self._columns.values())
+
+    def add_column(self, name: str):
+        """Add a metric column; earlier samples read as NaN."""
+        with self._lock:
+            if name not in self._columns:
+                self._columns[name] = np.full(2 * self.capacity, np.nan, dtype=self._dtype)
+
+    def append(self, timestamp: float, values: Mapping[str, Optional[float]]):
+        """Append one sample. Unknown metric names create new columns."""
+        for name in values:
+            if name not in self._columns:
+                self.add_column(name)
+        with self._lock:
+            head, mirror = self._head, self._head + self.capacity
+            self._timestamps[head] = self._timestamps[mirror] = timestamp
+            for name, column in self._columns.items():
+                value = values.get(name)
+                column[head] = column[mirror] = np.nan if value is None else value
+            self._head = (head + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def _bounds(self, last: Optional[int]) -> slice:
+        n = self._size if last is None else max(0, min(last, self._size))
+        end = self._head + self.capacity
+        return slice(end - n, end)
+
+    def window(self, last: Optional[int] = None,
+               columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Zero-copy views of the ``last`` samples (all if None), oldest first,
+        keyed by column name plus ``"timestamp"`` (epoch seconds).
+        """
+        with self._lock:
+            bounds = self._bounds(last)
+            names = self._columns if columns is None else columns
+            out = {"timestamp": self._timestamps[bounds]}
+            for name in names:
+                out[name] = self._columns[name][bounds]
+        for view in out.values():
+            view.flags.writeable = False
+        return out
+
+    def column(self, name: str, last: Optional[int] = None) -> np.ndarray:
+        """Zero-copy view of one column over the ``last`` samples."""
+        return self.window(last, columns=(name,))[name]
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        """The most recent sample as plain floats, or None when empty."""
+        if not self._size:
+            return None
+        with self._lock:
+            index = self._head + self.capacity - 1
+            sample = {name: float(col[index]) for name, col in self._columns.items()}
+            sample["timestamp"] = float(self._timestamps[index])
+        return sample
+
+    def aggregate(self, last: Optional[int] = None,
+                  columns: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, float]]:
+        """Vectorized min/max/mean/last per column over the ``last`` samples (NaNs ignored)."""
+        window = self.window(last, columns)
+        window.pop("timestamp")
+        stats = {}
+        for name, values in window.items():
+            valid = values[~np.isnan(values)]
+            if valid.size == 0:
+                stats[name] = {"min": None, "max": None, "mean": None, "last": None, "count": 0}
+                continue
+            stats[name] = {
+                "min": float(valid.min()),
+                "max": float(valid.max()),
+                "mean": float(valid.mean()),
+                "last": float(valid[-1]),
+                "count": int(valid.size),
+            }
+        return stats
@@ -0,0 +1,173 @@
+"""Tiered, cached system sampler for cheap metrics collection."""
+
+from typing import Any, Callable, Dict, List, Optional
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+
+import psutil
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass
+class SamplerTier:
+    """A group of metrics collected together at a fixed cadence."""
+    name: str
+    interval: float  # seconds between collections
+    metrics: List[str]
+    last_run: float = 0.0
+    runs: int = 0
+    cpu_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    last_duration: float = 0.0
+
+
+def default_tiers() -> List[SamplerTier]:
+    """Cheap gauges every second, disk usage every 30s, fd/socket scans every minute."""
+    return [
+        SamplerTier("fast", 1.0, ["cpu_percent", "memory_percent"]),
+        SamplerTier("disk", 30.0, ["disk_usage"]),
+        SamplerTier("slow", 60.0, ["open_files", "connections"]),
+    ]
+
+
+class SystemSampler:
+    """Collects system metrics on per-tier cadences and caches the latest values.
+
+    - One ``psutil.Process`` handle is reused (and recreated after a fork).
+    - The partition list is cached and refreshed every ``partition_refresh`` seconds.
+    - ``disk_usage`` runs in a small worker pool with a timeout, so a hung
+      network mount costs at most ``disk_timeout`` once; the mount is then
+      skipped until its pending call returns.
+    - CPU and wall time spent in each tier are recorded, so the sampler's own
+      overhead is visible next to the metrics it produces.
+    """
+
+    def __init__(self, tiers: Optional[List[SamplerTier]] = None,
+                 disk_timeout: float = 1.0, partition_refresh: float = 600.0):
+        self.tiers = tiers or default_tiers()
+        self.disk_timeout = disk_timeout
+        self.partition_refresh = partition_refresh
+        self._process: Optional[psutil.Process] = None
+        self._values: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._partitions: List[str] = []
+        self._partitions_at = 0.0
+        self._disk_pending: Dict[str, Any] = {}
+        self._disk_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="disk-usage")
+        self._started = time.monotonic()
+        self._collectors: Dict[str, Callable[[], Any]] = {
+            "cpu_percent": lambda: psutil.cpu_percent(interval=None),
+            "memory_percent": lambda: psutil.virtual_memory().percent,
+            "disk_usage": self._collect_disk_usage,
+            "open_files": lambda: len(self.process.open_files()),
+            "connections": self._collect_connections,
+        }
+        psutil.cpu_percent(interval=None)  # prime the non-blocking CPU counter
+
+    @property
+    def process(self) -> psutil.Process:
+        """Cached handle for the current process, recreated after a fork."""
+        if self._process is None or self._process.pid != os.getpid():
+            self._process = psutil.Process()
+        return self._process
+
+    def _collect_connections(self) -> int:
+        proc = self.process
+        getter = getattr(proc, "net_connections", None) or proc.connections
+        return len(getter(kind="inet"))
+
+    def _mountpoints(self) -> List[str]:
+        now = time.monotonic()
+        if not self._partitions or now - self._partitions_at > self.partition_refresh:
+            self._partitions = [part.mountpoint for part in psutil.disk_partitions(all=False)]
+            self._partitions_at = now
+        return self._partitions
+
+    def _collect_disk_usage(self) -> Dict[str, float]:
+        previous = self._values.get("disk_usage", {})
+        usage: Dict[str, float] = {}
+        futures = {}
+        for mount in self._mountpoints():
+            pending = self._disk_pending.get(mount)
+            if pending is not None and not pending.done():
+                # Still stuck from an earlier tick; keep the last known value.
+                if mount in previous:
+                    usage[mount] = previous[mount]
+                continue
+            futures[mount] = self._disk_executor.submit(psutil.disk_usage, mount)
+        deadline = time.monotonic() + self.disk_timeout
+        for mount, future in futures.items():
+            try:
+                usage[mount] = future.result(timeout=max(0.0, deadline - time.monotonic())).percent
+                self._disk_pending.pop(mount, None)
+            except FutureTimeout:
+                self._disk_pending[mount] = future
+                logger.warning("disk_usage_timeout", mountpoint=mount, timeout=self.disk_timeout)
+                if mount in previous:
+                    usage[mount] = previous[mount]
+            except OSError as e:
+                logger.debug("disk_usage_unavailable", mountpoint=mount, error=str(e))
+        return usage
+
+    def sample(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Run every tier that is due (all of them with ``force``) and return a
+        copy of the latest value of every metric.
+        """
+        now = time.monotonic()
+        for tier in self.tiers:
+            if not force and tier.runs and now - tier.last_run < tier.interval:
+                continue
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+            values = {}
+            for metric in tier.metrics:
+                try:
+                    values[metric] = self._collectors[metric]()
+                except (psutil.Error, OSError) as e:
+                    logger.warning("metric_collection_failed", metric=metric, error=str(e))
+            with self._lock:
+                self._values.update(values)
+            tier.last_duration = time.perf_counter() - wall_start
+            tier.wall_seconds += tier.last_duration
+            tier.cpu_seconds += time.thread_time() - cpu_start
+            tier.last_run = now
+            tier.runs += 1
+        return self.latest()
+
+    def latest(self) -> Dict[str, Any]:
+        """The most recently collected value of every metric (no collection)."""
+        with self._lock:
+            values = dict(self._values)
+        if "disk_usage" in values:
+            values["disk_usage"] = dict(values["disk_usage"])
+        return values
+
+    def stats(self) -> Dict[str, Any]:
+        """Sampler overhead: per-tier runs, CPU and wall time, and share of one CPU."""
+        uptime = max(time.monotonic() - self._started, 1e-9)
+        tiers = {
+            tier.name: {
+                "interval": tier.interval,
+                "runs": tier.runs,
+                "cpu_seconds": tier.cpu_seconds,
+                "wall_seconds": tier.wall_seconds,
+                "last_duration": tier.last_duration,
+            }
+            for tier in self.tiers
+        }
+        cpu_total = sum(t.cpu_seconds for t in self.tiers)
+        return {
+            "uptime_seconds": uptime,
+            "cpu_seconds": cpu_total,
+            "cpu_overhead_percent": 100.0 * cpu_total / uptime,
+            "stuck_mounts": [m for m, f in self._disk_pending.items() if not f.done()],
+            "tiers": tiers,
+        }
+
+    def close(self):
+        self._disk_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,576 @@
+"""Embedded, compressed time-series store for system metrics.
+
+Layout under ``root``::
+
+    series.json              series name -> id (position in the list)
+    raw/YYYYMMDD.seg         Gorilla-compressed blocks, appended as they fill
+    1m/YYYYMMDD.rollup       fixed-size (ts, series, min, max, sum, count) records
+    5m/YYYYMMDD.rollup
+    1h/YYYYMMDD.rollup
+
+Raw samples are buffered into blocks of ``block_size`` samples that share one
+timestamp stream (delta-of-delta encoded) and hold one XOR-compressed float
+stream per series, as in Facebook's Gorilla paper. Segments are read through
+``mmap`` and only the blocks overlapping a query are decoded.
+
+Every sample also feeds 1m/5m/1h rollup accumulators; a bucket is written when
+a later sample closes it. Rollup files are read as NumPy memory maps, so a
+week-long query at 5m or 1h resolution touches a few thousand fixed-size
+records. Each tier has its own retention and whole day files are dropped once
+they age out.
+
+Samples still in the open block or open buckets are included in queries but
+are only persisted on ``flush()``/``close()`` or when the block fills.
+"""
+
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+RAW_TIER = "raw"
+DEFAULT_ROLLUPS = {"1m": 60, "5m": 300, "1h": 3600}
+DEFAULT_RETENTION = {
+    RAW_TIER: 2 * 86400,
+    "1m": 7 * 86400,
+    "5m": 35 * 86400,
+    "1h": 400 * 86400,
+}
+DEFAULT_BLOCK_SIZE = 60
+RAW_MAX_SPAN = 6 * 3600  # "auto" resolution reads raw data up to this span
+
+ROLLUP_DTYPE = np.dtype([
+    ("ts", "<i8"), ("series", "<u4"),
+    ("min", "<f8"), ("max", "<f8"), ("sum", "<f8"), ("count", "<u4"),
+])
+
+_BLOCK_MAGIC = b"GRL1"
+_BLOCK_HEADER = struct.Struct("<4sIqqIH")  # magic, total length, start ms, end ms, count, series
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_MASK64 = (1 << 64) - 1
+
+
+# ----------------------------------------------------------------------------
+# Bit streams
+# ----------------------------------------------------------------------------
+class BitWriter:
+    """Append-only big-endian bit stream."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value: int, nbits: int):
+        self._acc = (self._acc << nbits) | (value & ((1 << nbits) - 1))
+        self._bits += nbits
+        while self._bits >= 8:
+            self._bits -= 8
+            self._buf.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def getvalue(self) -> bytes:
+        if self._bits:
+            return bytes(self._buf) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self._buf)
+
+
+class BitReader:
+    """Reader for streams produced by BitWriter."""
+
+    def __init__(self, data):
+        self._data = data
+        self._pos = 0
+
+    def read(self, nbits: int) -> int:
+        pos = self._pos
+        start, end = pos >> 3, (pos + nbits + 7) >> 3
+        chunk = int.from_bytes(self._data[start:end], "big")
+        self._pos = pos + nbits
+        return (chunk >> (end * 8 - pos - nbits)) & ((1 << nbits) - 1)
+
+
+# ----------------------------------------------------------------------------
+# Gorilla encodings
+# ----------------------------------------------------------------------------
+def encode_timestamps(timestamps: List[int]) -> bytes:
+    """Delta-of-delta encode integer (millisecond) timestamps."""
+    writer = BitWriter()
+    if not timestamps:
+        return b""
+    writer.write(timestamps[0] & _MASK64, 64)
+    prev, prev_delta = timestamps[0], 0
+    for ts in timestamps[1:]:
+        delta = ts - prev
+        dod = delta - prev_delta
+        if dod == 0:
+            writer.write(0b0, 1)
+        elif -63 <= dod <= 64:
+            writer.write(0b10, 2)
+            writer.write(dod + 63, 7)
+        elif -255 <= dod <= 256:
+            writer.write(0b110, 3)
+            writer.write(dod + 255, 9)
+        elif -2047 <= dod <= 2048:
+            writer.write(0b1110, 4)
+            writer.write(dod + 2047, 12)
+        else:
+            writer.write(0b1111, 4)
+            writer.write(dod & _MASK64, 64)
+        prev, prev_delta = ts, delta
+    return writer.getvalue()
+
+
+def decode_timestamps(data, count: int) -> List[int]:
+    if count == 0:
+        return []
+    reader = BitReader(data)
+    first = reader.read(64)
+    if first >= 1 << 63:
+        first -= 1 << 64
+    out = [first]
+    prev, prev_delta = first, 0
+    for _ in range(count - 1):
+        if reader.read(1) == 0:
+            dod = 0
+        elif reader.read(1) == 0:
+            dod = reader.read(7) - 63
+        elif reader.read(1) == 0:
+            dod = reader.read(9) - 255
+        elif reader.read(1) == 0:
+            dod = reader.read(12) - 2047
+        else:
+            dod = reader.read(64)
+            if dod >= 1 << 63:
+                dod -= 1 << 64
+        prev_delta += dod
+        prev += prev_delta
+        out.append(prev)
+    return out
+
+
+def encode_floats(values: Iterable[float]) -> bytes:
+    """XOR-compress float64 values (NaN and infinities round-trip exactly)."""
+    bits = np.asarray(list(values), dtype=">f8").view(">u8").tolist()
+    writer = BitWriter()
+    if not bits:
+        return b""
+    writer.write(bits[0], 64)
+    prev = bits[0]
+    prev_leading = prev_trailing = -1
+    for value in bits[1:]:
+        xor = value ^ prev
+        prev = value
+        if xor == 0:
+            writer.write(0b0, 1)
+            continue
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if prev_leading >= 0 and leading >= prev_leading and trailing >= prev_trailing:
+            writer.write(0b10, 2)
+            writer.write(xor >> prev_trailing, 64 - prev_leading - prev_trailing)
+        else:
+            significant = 64 - leading - trailing
+            writer.write(0b11, 2)
+            writer.write(leading, 5)
+            writer.write(significant - 1, 6)
+            writer.write(xor >> trailing, significant)
+            prev_leading, prev_trailing = leading, trailing
+    return writer.getvalue()
+
+
+def decode_floats(data, count: int) -> np.ndarray:
+    if count == 0:
+        return np.empty(0, dtype=np.float64)
+    reader = BitReader(data)
+    prev = reader.read(64)
+    out = [prev]
+    leading = trailing = 0
+    for _ in range(count - 1):
+        if reader.read(1) == 0:
+            out.append(prev)
+            continue
+        if reader.read(1) == 1:
+            leading = reader.read(5)
+            significant = reader.read(6) + 1
+            trailing = 64 - leading - significant
+        xor = reader.read(64 - leading - trailing) << trailing
+        prev ^= xor
+        out.append(prev)
+    return np.array(out, dtype=">u8").view(">f8").astype(np.float64)
+
+
+def encode_block(timestamps_ms: List[int], columns: Mapping[str, List[float]]) -> bytes:
+    """Serialize one block: shared timestamps plus one XOR stream per series."""
+    parts = []
+    for name in columns:
+        encoded = name.encode("utf-8")
+        parts.append(_U16.pack(len(encoded)) + encoded)
+    ts_stream = encode_timestamps(timestamps_ms)
+    parts.append(_U32.pack(len(ts_stream)) + ts_stream)
+    for values in columns.values():
+        stream = encode_floats(values)
+        parts.append(_U32.pack(len(stream)) + stream)
+    body = b"".join(parts)
+    header = _BLOCK_HEADER.pack(
+        _BLOCK_MAGIC, _BLOCK_HEADER.size + len(body),
+        timestamps_ms[0], timestamps_ms[-1], len(timestamps_ms), len(columns),
+    )
+    return header + body
+
+
+def decode_block(buf, offset: int = 0) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Inverse of encode_block; returns (timestamps in seconds, {series: values})."""
+    magic, _, _, _, count, n_series = _BLOCK_HEADER.unpack_from(buf, offset)
+    if magic != _BLOCK_MAGIC:
+        raise ValueError(f"Corrupt block at offset {offset}")
+    pos = offset + _BLOCK_HEADER.size
+    names = []
+    for _ in range(n_series):
+        (length,) = _U16.unpack_from(buf, pos)
+        names.append(bytes(buf[pos + 2:pos + 2 + length]).decode("utf-8"))
+        pos += 2 + length
+    (length,) = _U32.unpack_from(buf, pos)
+    timestamps = decode_timestamps(buf[pos + 4:pos + 4 + length], count)
+    pos += 4 + length
+    columns = {}
+    for name in names:
+        (length,) = _U32.unpack_from(buf, pos)
+        columns[name] = decode_floats(buf[pos + 4:pos + 4 + length], count)
+        pos += 4 + length
+    return np.array(timestamps, dtype=np.float64) / 1000.0, columns
+
+
+# ----------------------------------------------------------------------------
+# Store
+# ----------------------------------------------------------------------------
+def _day(ts: float) -> str:
+    return time.strftime("%Y%m%d", time.gmtime(ts))
+
+
+def _day_start(day: str) -> float:
+    return float(np.datetime64(f"{day[:4]}-{day[4:6]}-{day[6:]}").astype("datetime64[s]").astype(np.int64))
+
+
+class TimeSeriesStore:
+    """On-disk store with Gorilla-compressed raw data and min/max/avg rollups."""
+
+    def __init__(self, root: str, block_size: int = DEFAULT_BLOCK_SIZE,
+                 rollups: Optional[Mapping[str, int]] = None,
+                 retention: Optional[Mapping[str, float]] = None):
+        """
+        Args:
+            root (str): Directory holding the store; created on first write.
+            block_size (int): Samples per compressed raw block.
+            rollups (dict): Rollup tier name -> bucket width in seconds.
+            retention (dict): Tier name (including "raw") -> seconds to keep.
+        """
+        self.root = root
+        self.block_size = block_size
+        self.rollups = dict(sorted((rollups or DEFAULT_ROLLUPS).items(), key=lambda item: item[1]))
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self._lock = threading.RLock()
+        self._series: List[str] = []
+        self._series_ids: Dict[str, int] = {}
+        self._block_ts: List[int] = []
+        self._block_values: Dict[str, List[float]] = {}
+        self._block_day: Optional[str] = None
+        self._buckets: Dict[str, Tuple[Optional[int], Dict[int, list]]] = {
+            tier: (None, {}) for tier in self.rollups
+        }
+        self._segment_index: Dict[str, Tuple[int, List[Tuple[float, float, int]]]] = {}
+        self._last_retention_day: Optional[str] = None
+        self._initialized = False
+        self._load_series()
+
+    # -- setup ----------------------------------------------------------------
+    def _path(self, tier: str, day: str) -> str:
+        suffix = "seg" if tier == RAW_TIER else "rollup"
+        return os.path.join(self.root, tier, f"{day}.{suffix}")
+
+    def _load_series(self):
+        path = os.path.join(self.root, "series.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._series = json.load(f)
+            self._series_ids = {name: i for i, name in enumerate(self._series)}
+
+    def _ensure_dirs(self):
+        if self._initialized:
+            return
+        for tier in (RAW_TIER, *self.rollups):
+            os.makedirs(os.path.join(self.root, tier), exist_ok=True)
+        self._initialized = True
+
+    def _series_id(self, name: str) -> int:
+        series_id = self._series_ids.get(name)
+        if series_id is None:
+            series_id = self._series_ids[name] = len(self._series)
+            self._series.append(name)
+            tmp = os.path.join(self.root, "series.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._series, f)
+            os.replace(tmp, os.path.join(self.root, "series.json"))
+        return series_id
+
+    @property
+    def series_names(self) -> List[str]:
+        return list(self._series)
+
+    # -- writes ---------------------------------------------------------------
+    def append(self, timestamp: float, values: Mapping[str, Optional[float]]):
+        """Add one sample of several series taken at ``timestamp`` (epoch seconds)."""
+        with self._lock:
+            self._ensure_dirs()
+            day = _day(timestamp)
+            if self._block_day is not None and day != self._block_day:
+                self._flush_block()
+            self._block_day = day
+
+            position = len(self._block_ts)
+            self._block_ts.append(int(round(timestamp * 1000)))
+            for name, value in values.items():
+                column = self._block_values.get(name)
+                if column is None:
+                    column = self._block_values[name] = [float("nan")] * position
+                column.append(float("nan") if value is None else float(value))
+            for name, column in self._block_values.items():
+                if len(column) == position:
+                    column.append(float("nan"))
+
+            for tier, width in self.rollups.items():
+                self._update_rollup(tier, width, timestamp, values)
+
+            if len(self._block_ts) >= self.block_size:
+                self._flush_block()
+            if day != self._last_retention_day:
+                self._last_retention_day = day
+                self.enforce_retention(timestamp)
+
+    def _update_rollup(self, tier: str, width: int, timestamp: float,
+                       values: Mapping[str, Optional[float]]):
+        bucket = int(timestamp // width) * width
+        current, accumulators = self._buckets[tier]
+        if current is not None and bucket != current:
+            self._write_bucket(tier, current, accumulators)
+            accumulators = {}
+        for name, value in values.items():
+            if value is None or value != value:
+                continue
+            series_id = self._series_id(name)
+            acc = accumulators.get(series_id)
+            if acc is None:
+                accumulators[series_id] = [value, value, value, 1]
+            else:
+                if value < acc[0]:
+                    acc[0] = value
+                if value > acc[1]:
+                    acc[1] = value
+                acc[2] += value
+                acc[3] += 1
+        self._buckets[tier] = (bucket, accumulators)
+
+    def _write_bucket(self, tier: str, bucket: int, accumulators: Dict[int, list]):
+        if not accumulators:
+            return
+        records = np.array(
+            [(bucket, sid, a[0], a[1], a[2], a[3]) for sid, a in accumulators.items()],
+            dtype=ROLLUP_DTYPE,
+        )
+        with open(self._path(tier, _day(bucket)), "ab") as f:
+            records.tofile(f)
+
+    def _flush_block(self):
+        if not self._block_ts:
+            return
+        block = encode_block(self._block_ts, self._block_values)
+        with open(self._path(RAW_TIER, self._block_day), "ab") as f:
+            f.write(block)
+        self._block_ts = []
+        self._block_values = {}
+
+    def flush(self):
+        """Persist the open raw block and the open rollup buckets."""
+        with self._lock:
+            if not self._initialized:
+                return
+            self._flush_block()
+            for tier in self.rollups:
+                current, accumulators = self._buckets[tier]
+                if current is not None:
+                    # Queries merge duplicate buckets, so a later partial write
+                    # of the same bucket (e.g. after a restart) stays correct.
+                    self._write_bucket(tier, current, accumulators)
+                self._buckets[tier] = (None, {})
+
+    def close(self):
+        self.flush()
+
+    def enforce_retention(self, now: Optional[float] = None):
+        """Delete whole day files that are older than their tier's retention."""
+        now = time.time() if now is None else now
+        for tier in (RAW_TIER, *self.rollups):
+            directory = os.path.join(self.root, tier)
+            if not os.path.isdir(directory):
+                continue
+            cutoff = now - self.retention.get(tier, float("inf"))
+            for filename in os.listdir(directory):
+                day = filename.split(".", 1)[0]
+                if len(day) != 8 or not day.isdigit():
+                    continue
+                if _day_start(day) + 86400 <= cutoff:
+                    path = os.path.join(directory, filename)
+                    os.remove(path)
+                    self._segment_index.pop(path, None)
+                    logger.info("tsdb_segment_expired", tier=tier, day=day)
+
+    # -- reads ----------------------------------------------------------------
+    def _days(self, start: float, end: float) -> List[str]:
+        days = []
+        day_ts = int(start // 86400) * 86400
+        while day_ts <= end:
+            days.append(_day(day_ts))
+            day_ts += 86400
+        return days
+
+    def _block_offsets(self, path: str, buf) -> List[Tuple[float, float, int]]:
+        """(start, end, offset) of every block in a segment, cached by file size."""
+        size = len(buf)
+        cached_size, blocks = self._segment_index.get(path, (0, []))
+        if cached_size == size:
+            return blocks
+        blocks = list(blocks)
+        offset = cached_size
+        while offset + _BLOCK_HEADER.size <= size:
+            magic, length, start_ms, end_ms, _, _ = _BLOCK_HEADER.unpack_from(buf, offset)
+            if magic != _BLOCK_MAGIC or offset + length > size:
+                logger.warning("tsdb_truncated_segment", path=path, offset=offset)
+                break
+            blocks.append((start_ms / 1000.0, end_ms / 1000.0, offset))
+            offset += length
+        self._segment_index[path] = (offset, blocks)
+        return blocks
+
+    def _read_raw(self, start: float, end: float,
+                  series: Optional[Iterable[str]]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        chunks: List[Tuple[np.ndarray, Dict[str, np.ndarray]]] = []
+        for day in self._days(start, end):
+            path = self._path(RAW_TIER, day)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                continue
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                for block_start, block_end, offset in self._block_offsets(path, buf):
+                    if block_end < start or block_start > end:
+                        continue
+                    chunks.append(decode_block(buf, offset))
+        if self._block_ts and self._block_ts[0] / 1000.0 <= end and self._block_ts[-1] / 1000.0 >= start:
+            chunks.append((
+                np.array(self._block_ts, dtype=np.float64) / 1000.0,
+                {name: np.array(values) for name, values in self._block_values.items()},
+            ))
+
+        names = list(series) if series is not None else sorted({n for _, cols in chunks for n in cols})
+        timestamps, columns = [], {name: [] for name in names}
+        for ts, cols in chunks:
+            mask = (ts >= start) & (ts <= end)
+            timestamps.append(ts[mask])
+            for name in names:
+                column = cols.get(name)
+                columns[name].append(column[mask] if column is not None else np.full(int(mask.sum()), np.nan))
+        if not timestamps:
+            return np.empty(0), {name: np.empty(0) for name in names}
+        return np.concatenate(timestamps), {name: np.concatenate(parts) for name, parts in columns.items()}
+
+    def _read_rollup(self, tier: str, start: float, end: float,
+                     series: Optional[Iterable[str]]) -> Tuple[np.ndarray, Dict[str, Dict[str, np.ndarray]]]:
+        parts = []
+        for day in self._days(start, end):
+            path = self._path(tier, day)
+            if not os.path.exists(path) or os.path.getsize(path) < ROLLUP_DTYPE.itemsize:
+                continue
+            records = np.memmap(path, dtype=ROLLUP_DTYPE, mode="r",
+                                shape=(os.path.getsize(path) // ROLLUP_DTYPE.itemsize,))
+            parts.append(records[(records["ts"] >= start) & (records["ts"] <= end)])
+        current, accumulators = self._buckets[tier]
+        if current is not None and start <= current <= end and accumulators:
+            parts.append(np.array(
+                [(current, sid, a[0], a[1], a[2], a[3]) for sid, a in accumulators.items()],
+                dtype=ROLLUP_DTYPE,
+            ))
+        records = np.concatenate(parts) if parts else np.empty(0, dtype=ROLLUP_DTYPE)
+
+        names = list(series) if series is not None else [
+            self._series[sid] for sid in np.unique(records["series"]).tolist()
+        ]
+        timestamps = np.unique(records["ts"])
+        result = {}
+        for name in names:
+            stats = {key: np.full(len(timestamps), np.nan) for key in ("min", "max", "avg")}
+            sid = self._series_ids.get(name)
+            if sid is not None:
+                rows = records[records["series"] == sid]
+                if len(rows):
+                    keys, inverse = np.unique(rows["ts"], return_inverse=True)
+                    if len(keys) == len(rows):
+                        order = np.argsort(rows["ts"], kind="stable")
+                        mins, maxs = rows["min"][order], rows["max"][order]
+                        sums, counts = rows["sum"][order], rows["count"][order]
+                    else:
+                        # Merge duplicate buckets (partial writes from flush/restart).
+                        mins = np.full(len(keys), np.inf)
+                        maxs = np.full(len(keys), -np.inf)
+                        sums = np.zeros(len(keys))
+                        counts = np.zeros(len(keys))
+                        np.minimum.at(mins, inverse, rows["min"])
+                        np.maximum.at(maxs, inverse, rows["max"])
+                        np.add.at(sums, inverse, rows["sum"])
+                        np.add.at(counts, inverse, rows["count"])
+                    positions = np.searchsorted(timestamps, keys)
+                    stats["min"][positions] = mins
+                    stats["max"][positions] = maxs
+                    stats["avg"][positions] = sums / counts
+            result[name] = stats
+        return timestamps.astype(np.float64), result
+
+    def choose_resolution(self, start: float, end: float, max_points: int,
+                          now: Optional[float] = None) -> str:
+        """Finest tier that covers ``start`` within retention and yields <= max_points."""
+        now = time.time() if now is None else now
+        span = max(end - start, 0.0)
+        if span <= RAW_MAX_SPAN and start >= now - self.retention[RAW_TIER]:
+            return RAW_TIER
+        for tier, width in self.rollups.items():
+            if span / width <= max_points and start >= now - self.retention.get(tier, float("inf")):
+                return tier
+        return next(reversed(self.rollups))
+
+    def query(self, start: float, end: float, series: Optional[Iterable[str]] = None,
+              resolution: str = "auto", max_points: int = 2000) -> Dict[str, Any]:
+        """
+        Read ``series`` (all when None) between ``start`` and ``end`` (epoch seconds).
+
+        Returns:
+            dict: ``{"resolution", "timestamps", "series"}`` where raw series map to
+                  ``{"value": array}`` and rollup series to ``{"min", "max", "avg"}``
+                  arrays aligned with ``timestamps``.
+        """
+        with self._lock:
+            if resolution == "auto":
+                resolution = self.choose_resolution(start, end, max_points)
+            if resolution == RAW_TIER:
+                timestamps, columns = self._read_raw(start, end, series)
+                data = {name: {"value": values} for name, values in columns.items()}
+            elif resolution in self.rollups:
+                timestamps, data = self._read_rollup(resolution, start, end, series)
+            else:
+                raise ValueError(f"Unknown resolution '{resolution}'")
+        return {"resolution": resolution, "timestamps": timestamps, "series": data}
@@ -0,0 +1,189 @@
+# src/core/orchestrator_host.py
+
+#orchestrator_host.py
+#
+#Runs an AgentOrchestrator on its own asyncio event loop in a dedicated thread,
+#so synchronous servers (the Flask/eventlet dashboard) can embed it without
+#hosting asyncio themselves.
+#
+#The loop thread is the only one that touches agents. Every SNAPSHOT_INTERVAL
+#seconds, and after each command, it publishes an immutable snapshot of all
+#agents by replacing a single attribute; readers on other threads just read
+#that attribute, with no lock and no wait on the loop. Commands (register an
+#agent, run one now) go the other way through run_coroutine_threadsafe and
+#return a concurrent.futures.Future at once; async callers can await them.
+#
+#The loop needs a real OS thread. Under eventlet monkey patching (the
+#dashboard's `gunicorn --worker-class eventlet`), threading.Thread would be a
+#green thread running asyncio inside the eventlet hub, so the host takes its
+#Thread, Event and selector from the unpatched modules instead (see
+#native_threading). The futures returned by commands use the patched (green)
+#locks, which are not safe to contend across OS threads, so green threads
+#should fire and forget: failures are logged by the host and results show up
+#in the snapshots. gevent patching is not supported.
+#
+#Usage Example:
+#    host = OrchestratorHost(AgentOrchestrator(), schedule_interval=60).start()
+#    host.register(SalesAgent("SalesAgent"))
+#    host.run_agent("SalesAgent")          # Future; never blocks the caller
+#    host.snapshot()["SalesAgent"]["state"]
+
+import asyncio
+import concurrent.futures
+import sys
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Awaitable, Dict, List, Mapping, Optional
+
+import structlog
+
+from .agent_orchestration import AgentOrchestrator, BaseAgent, agent_snapshot
+
+logger = structlog.get_logger(__name__)
+
+SNAPSHOT_INTERVAL = 0.5  # seconds between published snapshots
+START_TIMEOUT = 10.0
+
+
+def _eventlet_patcher():
+    """eventlet.patcher when eventlet has monkey patched threading, else None."""
+    if "eventlet" not in sys.modules:
+        return None
+    from eventlet import patcher
+    return patcher if patcher.is_monkey_patched("thread") else None
+
+def native_threading():
+    """The threading module with real OS threads, even under eventlet monkey patching."""
+    patcher = _eventlet_patcher()
+    return patcher.original("threading") if patcher else threading
+
+def _new_event_loop() -> asyncio.AbstractEventLoop:
+    patcher = _eventlet_patcher()
+    if patcher is not None and patcher.is_monkey_patched("select"):
+        # A green selector would run the loop's I/O waits through an eventlet hub.
+        # Patching strips epoll from the select module, so wait in the real select().
+        class NativeSelector(patcher.original("selectors").SelectSelector):
+            _select = staticmethod(patcher.original("select").select)
+        return asyncio.SelectorEventLoop(NativeSelector())
+    return asyncio.new_event_loop()
+
+
+class OrchestratorHost:
+    """An AgentOrchestrator on a private event loop, with snapshot reads and a command channel."""
+
+    def __init__(self, orchestrator: Optional[AgentOrchestrator] = None,
+                 schedule_interval: Optional[float] = 60, snapshot_interval: float = SNAPSHOT_INTERVAL):
+        self.orchestrator = orchestrator or AgentOrchestrator()
+        self.schedule_interval = schedule_interval  # None: only run agents on command
+        self.snapshot_interval = snapshot_interval
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread = None
+        self._threading = native_threading()
+        self._ready = self._threading.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._snapshot: Mapping[str, Mapping[str, Any]] = MappingProxyType({})
+        self.snapshot_version = 0
+        self.snapshot_time = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "OrchestratorHost":
+        if self.running:
+            return self
+        self._ready.clear()
+        self._thread = self._threading.Thread(target=self._run, name="agent-orchestrator", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(START_TIMEOUT):
+            raise RuntimeError("orchestrator loop did not start")
+        return self
+
+    def _run(self):
+        self.loop = _new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._tasks.append(self.loop.create_task(self._publish_snapshots()))
+        if self.schedule_interval is not None:
+            self._tasks.append(self.loop.create_task(self.orchestrator.schedule_agents(self.schedule_interval)))
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.close()
+            logger.info("orchestrator_host_stopped")
+
+    def stop(self, timeout: float = 5.0):
+        """Cancel scheduling and pending commands and stop the loop thread."""
+        if not self.running:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+    # -- snapshots (any thread) ------------------------------------------------
+
+    def _publish(self):
+        # Runs on the loop thread, the only writer; one attribute store makes
+        # the new snapshot visible to readers atomically.
+        self._snapshot = MappingProxyType({
+            name: MappingProxyType(agent_snapshot(agent))
+            for name, agent in list(self.orchestrator.agents.items())
+        })
+        self.snapshot_version += 1
+        self.snapshot_time = time.time()
+
+    async def _publish_snapshots(self):
+        while True:
+            try:
+                self._publish()
+            except Exception as e:
+                logger.error("orchestrator_snapshot_failed", error=str(e))
+            await asyncio.sleep(self.snapshot_interval)
+
+    def snapshot(self) -> Mapping[str, Mapping[str, Any]]:
+        """Read-only {agent name: state} as of the last publish; never blocks."""
+        return self._snapshot
+
+    def list_agents(self) -> List[Dict[str, Any]]:
+        """Snapshot as the list of dicts AgentOrchestrator.list_agents returns."""
+        return [{"id": name, **state} for name, state in self._snapshot.items()]
+
+    # -- commands (any thread) -------------------------------------------------
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """Schedule ``coro`` on the orchestrator's loop; returns immediately."""
+        if not self.running:
+            coro.close()
+            raise RuntimeError("orchestrator host is not running")
+        return asyncio.run_coroutine_threadsafe(self._command(coro), self.loop)
+
+    async def _command(self, coro: Awaitable) -> Any:
+        try:
+            return await coro
+        except Exception as e:
+            logger.error("orchestrator_command_failed", error=repr(e))
+            raise
+        finally:
+            self._publish()  # readers see the command's effect without waiting a tick
+
+    def register(self, agent: BaseAgent) -> concurrent.futures.Future:
+        """Register ``agent`` (its health monitor task starts on the loop)."""
+        return self.submit(self.orchestrator.register_agent(agent))
+
+    def run_agent(self, name: str) -> concurrent.futures.Future:
+        """Run a registered agent now, outside the schedule. The future's result is the agent's."""
+        return self.submit(self._run_named(name))
+
+    async def _run_named(self, name: str) -> Any:
+        agent = self.orchestrator.agents.get(name)
+        if agent is None:
+            raise KeyError(name)
+        return await self.orchestrator.run_agent(agent)
+
+    async def arun_agent(self, name: str) -> Any:
+        """``run_agent`` for callers on another event loop."""
+        return await asyncio.wrap_future(self.run_agent(name))
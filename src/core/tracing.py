@@ -0,0 +1,288 @@
+# src/core/tracing.py
+
+#tracing.py
+#
+#OpenTelemetry tracing for the orchestrator, agents and Gemini calls. Spans are
+#opened with ``span(name, **attributes)``; because OpenTelemetry keeps the active
+#span in a context variable, spans opened in tasks created with
+#``asyncio.create_task``/``gather`` are parented automatically. Work handed to an
+#executor must carry the context explicitly: use ``run_in_executor`` or
+#``wrap_context`` from this module.
+#
+#Tracing is off until ``configure_tracing()`` is called (or TRACING_EXPORTER is
+#set); until then ``span()`` is a no-op context manager that costs one global
+#lookup, and the module works without the OpenTelemetry packages installed.
+#
+#Sampling happens in two stages to keep overhead low:
+#  - head: a parent-based trace-id ratio sampler (TRACING_SAMPLE_RATIO) decides
+#    at the root whether a trace records spans at all;
+#  - tail: TailSamplingProcessor buffers each recorded trace until its local root
+#    ends, then exports it only if it contains an error, the root took at least
+#    TRACING_TAIL_LATENCY seconds, or it falls in a small baseline fraction.
+#
+#Exporters: "memory" (InMemorySpanExporter, for tests), "file" (JSON lines at
+#TRACING_FILE), "console", and "otlp" when opentelemetry-exporter-otlp is present.
+#
+#Usage Example:
+#    from src.core.tracing import configure_tracing, span
+#
+#    exporter = configure_tracing("memory", sample_ratio=1.0)
+#    with span("agent.run", **{"agent.name": "SalesAgent"}):
+#        ...
+#    exporter.get_finished_spans()
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+import structlog
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.trace import Status, StatusCode
+except ImportError:  # pragma: no cover - depends on the environment
+    trace = None
+
+try:
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+    from opentelemetry.sdk.trace.export import (
+        BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor, SpanExporter, SpanExportResult,
+    )
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+except ImportError:  # pragma: no cover - depends on the environment
+    TracerProvider = None
+    SpanProcessor = SpanExporter = object
+
+logger = structlog.get_logger(__name__)
+
+SERVICE_NAME = "3ai-platform"
+DEFAULT_SAMPLE_RATIO = 0.1
+DEFAULT_TAIL_KEEP_RATIO = 0.01
+MAX_BUFFERED_TRACES = 10000
+
+_tracer = None
+_provider = None
+_env_checked = False
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Appends finished spans to a file, one JSON document per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans) -> "SpanExportResult":
+        lines = "".join(json.dumps(json.loads(s.to_json()), separators=(",", ":")) + "\n" for s in spans)
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.error("trace_export_failed", path=self.path, error=str(e))
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """
+    Buffers spans per trace and forwards a trace to ``next_processor`` once its
+    local root ends, if it is interesting (error or slow root) or randomly
+    selected with ``keep_ratio``. At most ``max_traces`` incomplete traces are
+    held; the oldest are dropped beyond that.
+    """
+
+    def __init__(self, next_processor, latency_threshold: float,
+                 keep_ratio: float = DEFAULT_TAIL_KEEP_RATIO,
+                 max_traces: int = MAX_BUFFERED_TRACES):
+        self.next_processor = next_processor
+        self.latency_threshold = latency_threshold
+        self.keep_ratio = keep_ratio
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[int, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.kept = 0
+        self.dropped = 0
+
+    def on_start(self, span, parent_context=None):
+        self.next_processor.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span):
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            if spans is None:
+                spans = self._traces[trace_id] = []
+            spans.append(span)
+            if not is_local_root:
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+                    self.dropped += 1
+                return
+            del self._traces[trace_id]
+
+        duration = (span.end_time - span.start_time) / 1e9
+        keep = (
+            duration >= self.latency_threshold
+            or any(s.status.status_code is StatusCode.ERROR for s in spans)
+            or random.random() < self.keep_ratio
+        )
+        if not keep:
+            self.dropped += 1
+            return
+        self.kept += 1
+        for buffered in spans:
+            self.next_processor.on_end(buffered)
+
+    def shutdown(self):
+        self.next_processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.next_processor.force_flush(timeout_millis)
+
+
+def _make_exporter(kind: str, path: Optional[str]):
+    if kind == "memory":
+        return InMemorySpanExporter()
+    if kind == "file":
+        return JsonLinesSpanExporter(path or os.getenv("TRACING_FILE", "logs/traces.jsonl"))
+    if kind == "console":
+        return ConsoleSpanExporter()
+    if kind == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown trace exporter '{kind}'")
+
+
+def configure_tracing(
+    exporter: str = "memory",
+    sample_ratio: float = DEFAULT_SAMPLE_RATIO,
+    tail_latency: Optional[float] = None,
+    tail_keep_ratio: float = DEFAULT_TAIL_KEEP_RATIO,
+    path: Optional[str] = None,
+    set_global: bool = False,
+):
+    """
+    Enable tracing for this module's spans and return the exporter.
+
+    Args:
+        exporter (str): "memory", "file", "console" or "otlp".
+        sample_ratio (float): Head-sampling probability for new traces.
+        tail_latency (float, optional): Enables tail sampling; traces whose root
+                                        is faster than this (and error-free) are
+                                        only kept with ``tail_keep_ratio``.
+        path (str, optional): Output path of the "file" exporter.
+        set_global (bool): Also install the provider as the global OpenTelemetry one.
+    """
+    global _tracer, _provider, _env_checked
+    if TracerProvider is None:
+        raise RuntimeError("opentelemetry-sdk is required to configure tracing")
+    span_exporter = _make_exporter(exporter, path)
+    # Synchronous export for tests and local files; batched for network exporters.
+    if exporter in ("memory", "file"):
+        processor = SimpleSpanProcessor(span_exporter)
+    else:
+        processor = BatchSpanProcessor(span_exporter)
+    if tail_latency is not None:
+        processor = TailSamplingProcessor(processor, tail_latency, tail_keep_ratio)
+    provider = TracerProvider(
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio)),
+        resource=Resource.create({"service.name": SERVICE_NAME}),
+    )
+    provider.add_span_processor(processor)
+    if set_global:
+        trace.set_tracer_provider(provider)
+    if _provider is not None:
+        _provider.shutdown()
+    _provider = provider
+    _tracer = provider.get_tracer(__name__)
+    _env_checked = True
+    logger.info("tracing_configured", exporter=exporter, sample_ratio=sample_ratio,
+                tail_latency=tail_latency)
+    return span_exporter
+
+
+def disable_tracing():
+    """Flush and turn tracing back into a no-op."""
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = _provider = None
+
+
+def _configure_from_env():
+    global _env_checked
+    _env_checked = True
+    kind = os.getenv("TRACING_EXPORTER", "").strip().lower()
+    if not kind or trace is None or TracerProvider is None:
+        return
+    tail = os.getenv("TRACING_TAIL_LATENCY")
+    try:
+        configure_tracing(
+            kind,
+            sample_ratio=float(os.getenv("TRACING_SAMPLE_RATIO", DEFAULT_SAMPLE_RATIO)),
+            tail_latency=float(tail) if tail else None,
+            tail_keep_ratio=float(os.getenv("TRACING_TAIL_KEEP_RATIO", DEFAULT_TAIL_KEEP_RATIO)),
+            set_global=True,
+        )
+    except (ImportError, ValueError) as e:
+        logger.error("tracing_configuration_failed", exporter=kind, error=str(e))
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """
+    Open a span as the current one for the duration of the block. Exceptions
+    escaping the block are recorded and mark the span as failed. Yields the
+    span, or None while tracing is disabled.
+    """
+    if not _env_checked:
+        _configure_from_env()
+    tracer = _tracer
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=attributes or None) as current:
+        yield current
+
+
+def mark_error(current, error):
+    """
+    Mark ``current`` (a span from ``span()``, may be None) as failed because of a
+    handled exception, which is recorded on the span, or a description string.
+    """
+    if current is not None and current.is_recording():
+        if isinstance(error, BaseException):
+            current.record_exception(error)
+        current.set_status(Status(StatusCode.ERROR, str(error)))
+
+
+def wrap_context(fn: Callable) -> Callable:
+    """Bind ``fn`` to a copy of the caller's context (active span included)."""
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return ctx.run(fn, *args, **kwargs)
+    return wrapper
+
+
+def run_in_executor(executor, fn: Callable, *args):
+    """``loop.run_in_executor`` that keeps the current trace context in the worker."""
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(executor, contextvars.copy_context().run, fn, *args)
@@ -0,0 +1,452 @@
+# src/core/vector_index.py
+
+#vector_index.py
+#
+#In-process approximate nearest-neighbour index used to build retrieval context
+#for Gemini prompts (CRM leads, ICD-10 documentation, vendor catalogs, past agent
+#results) without an external vector database.
+#
+#The index is an IVF-flat structure on NumPy arrays:
+#  - vectors are L2-normalised and scored by inner product (cosine similarity);
+#  - once trained, a spherical k-means quantizer splits the space into
+#    ``n_lists`` cells, and each cell keeps its vectors in one contiguous array,
+#    so a query only scores the ``n_probe`` closest cells with a single matmul each;
+#  - before training (small collections) the index is exact brute force;
+#  - inserts are incremental: new vectors are appended to their cell;
+#  - ``save`` writes the cells back to back in one .npy file that ``load`` opens
+#    memory-mapped, so a large index starts instantly and pages in on demand.
+#
+#Embeddings come from any callable mapping a list of strings to a 2-D array.
+#HashingEmbedder is a deterministic, dependency-free embedder for tests and for
+#lexical retrieval.
+#
+#Usage Example:
+#    index = VectorIndex(dim=256, embedder=HashingEmbedder(dim=256))
+#    index.add_texts(["Z00.00 general adult exam", "E11.9 type 2 diabetes"],
+#                    payloads=[{"code": "Z00.00"}, {"code": "E11.9"}])
+#    index.search_texts(["diabetes follow-up"], k=1)
+#    index.save("data/icd10_index")
+#    index = VectorIndex.load("data/icd10_index", embedder=HashingEmbedder(dim=256))
+
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Embedder = Callable[[Sequence[str]], np.ndarray]
+
+DEFAULT_TRAIN_THRESHOLD = 20_000
+KMEANS_ITERATIONS = 10
+KMEANS_MAX_SAMPLE = 256  # training points per list
+KMEANS_MAX_TRAIN = 100_000
+_ASSIGN_CHUNK = 65_536
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class HashingEmbedder:
+    """
+    Deterministic feature-hashing embedder.
+
+    Words (and optionally character n-grams) are hashed with BLAKE2b into
+    ``dim`` signed buckets and the result is L2-normalised. The output only
+    depends on the text, never on the process, so it is safe for tests and for
+    indexes persisted to disk.
+    """
+
+    def __init__(self, dim: int = 256, char_ngrams: int = 3):
+        """
+        Args:
+            dim (int): Output dimensionality.
+            char_ngrams (int): Length of character n-grams added per word; 0 disables.
+        """
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self._cache: Dict[str, Tuple[int, float]] = {}
+
+    def _features(self, text: str) -> Iterable[str]:
+        for word in _TOKEN_RE.findall(text.lower()):
+            yield word
+            n = self.char_ngrams
+            if n and len(word) > n:
+                padded = f"<{word}>"
+                for i in range(len(padded) - n + 1):
+                    yield padded[i:i + n]
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        hit = self._cache.get(feature)
+        if hit is None:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            hit = (value % self.dim, 1.0 if (value >> 63) & 1 else -1.0)
+            if len(self._cache) < 1_000_000:
+                self._cache[feature] = hit
+        return hit
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                bucket, sign = self._bucket(feature)
+                out[row, bucket] += sign
+        return _normalize(out)
+
+
+class _InvertedList:
+    """One IVF cell: contiguous vectors and ids with amortised O(1) appends."""
+    __slots__ = ("vectors", "ids", "size")
+
+    def __init__(self, dim: int, vectors: Optional[np.ndarray] = None,
+                 ids: Optional[np.ndarray] = None):
+        if vectors is None:
+            vectors = np.empty((0, dim), dtype=np.float32)
+            ids = np.empty(0, dtype=np.int64)
+        self.vectors = vectors  # may be a read-only memory-mapped view
+        self.ids = ids
+        self.size = len(ids)
+
+    def append(self, vectors: np.ndarray, ids: np.ndarray):
+        needed = self.size + len(ids)
+        capacity = len(self.ids)
+        if needed > capacity or not self.vectors.flags.writeable:
+            new_capacity = max(needed, 2 * capacity, 16)
+            grown = np.empty((new_capacity, self.vectors.shape[1]), dtype=np.float32)
+            grown_ids = np.empty(new_capacity, dtype=np.int64)
+            grown[:self.size] = self.vectors[:self.size]
+            grown_ids[:self.size] = self.ids[:self.size]
+            self.vectors, self.ids = grown, grown_ids
+        self.vectors[self.size:needed] = vectors
+        self.ids[self.size:needed] = ids
+        self.size = needed
+
+    def view(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.vectors[:self.size], self.ids[:self.size]
+
+
+class VectorIndex:
+    """
+    IVF-flat approximate nearest-neighbour index over cosine similarity.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        embedder: Optional[Embedder] = None,
+        train_threshold: int = DEFAULT_TRAIN_THRESHOLD,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            dim (int): Vector dimensionality.
+            n_lists (int, optional): Number of IVF cells; defaults to ~4*sqrt(N) at training.
+            n_probe (int): Cells scanned per query; higher is slower and more exact.
+            embedder (callable, optional): Maps a list of texts to a (len, dim) array.
+            train_threshold (int): Train the quantizer automatically once this many
+                                   vectors are stored; 0 disables auto-training.
+            seed (int): Seed for k-means initialisation.
+        """
+        self.dim = dim
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.embedder = embedder
+        self.train_threshold = train_threshold
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[_InvertedList] = [_InvertedList(dim)]
+        self._payloads: Dict[int, Any] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return sum(lst.size for lst in self._lists)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    # ------------------------------------------------------------------
+    # Inserts
+    # ------------------------------------------------------------------
+    def add(self, vectors: np.ndarray, ids: Optional[Sequence[int]] = None,
+            payloads: Optional[Sequence[Any]] = None) -> np.ndarray:
+        """
+        Insert vectors, returning their ids.
+
+        Args:
+            vectors (np.ndarray): (n, dim) array; normalised on insert.
+            ids (sequence of int, optional): Explicit ids; auto-assigned otherwise.
+            payloads (sequence, optional): JSON-serialisable payload per vector.
+        """
+        vectors = _normalize(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+        count = len(vectors)
+        if ids is None:
+            ids = np.arange(self._next_id, self._next_id + count, dtype=np.int64)
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+            if len(ids) != count:
+                raise ValueError("ids and vectors must have the same length")
+        if count:
+            self._next_id = max(self._next_id, int(ids.max()) + 1)
+        if payloads is not None:
+            for vector_id, payload in zip(ids.tolist(), payloads):
+                self._payloads[vector_id] = payload
+
+        if self.is_trained:
+            assignments = self._assign(vectors)
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(assignments[order], np.arange(len(self._lists) + 1))
+            for cell in range(len(self._lists)):
+                lo, hi = bounds[cell], bounds[cell + 1]
+                if hi > lo:
+                    rows = order[lo:hi]
+                    self._lists[cell].append(vectors[rows], ids[rows])
+        else:
+            self._lists[0].append(vectors, ids)
+            if self.train_threshold and len(self) >= self.train_threshold:
+                self.train()
+        return ids
+
+    def add_texts(self, texts: Sequence[str], ids: Optional[Sequence[int]] = None,
+                  payloads: Optional[Sequence[Any]] = None) -> np.ndarray:
+        """Embed ``texts`` with the configured embedder and insert them."""
+        return self.add(self._embed(texts), ids=ids, payloads=payloads)
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        if self.embedder is None:
+            raise ValueError("VectorIndex has no embedder configured")
+        return self.embedder(list(texts))
+
+    # ------------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------------
+    def _assign(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None) -> np.ndarray:
+        centroids = self.centroids if centroids is None else centroids
+        chunk_rows = max(1, _ASSIGN_CHUNK * 64 // len(centroids))
+        out = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_rows):
+            chunk = vectors[start:start + chunk_rows]
+            out[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return out
+
+    def train(self, n_lists: Optional[int] = None):
+        """
+        Fit the coarse quantizer with spherical k-means and redistribute all
+        stored vectors into their cells.
+        """
+        vectors, ids = self._all_vectors()
+        total = len(ids)
+        if total == 0:
+            raise ValueError("Cannot train an empty index")
+        n_lists = n_lists or self.n_lists or int(4 * np.sqrt(total))
+        n_lists = max(1, min(n_lists, total))
+
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(total, n_lists * KMEANS_MAX_SAMPLE, max(n_lists, KMEANS_MAX_TRAIN))
+        sample = vectors[rng.choice(total, size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=n_lists) == 0
+            # Re-seed empty cells from random sample points.
+            sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        self.centroids = centroids
+        self.n_lists = n_lists
+        self._lists = [_InvertedList(self.dim) for _ in range(n_lists)]
+        payloads, self._payloads = self._payloads, {}
+        self.add(vectors, ids=ids)
+        self._payloads = payloads
+
+    def _all_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        views = [lst.view() for lst in self._lists]
+        vectors = np.concatenate([v for v, _ in views]) if views else np.empty((0, self.dim), np.float32)
+        ids = np.concatenate([i for _, i in views]) if views else np.empty(0, np.int64)
+        return vectors, ids
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def search(self, queries: np.ndarray, k: int = 10,
+               n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batched top-k search.
+
+        Args:
+            queries (np.ndarray): (b, dim) or (dim,) query vectors.
+            k (int): Neighbours per query.
+            n_probe (int, optional): Overrides the index default.
+
+        Returns:
+            tuple: (scores, ids), each (b, k); missing results have id -1 and score -inf.
+        """
+        queries = _normalize(queries)
+        batch = len(queries)
+        candidates_scores: List[List[np.ndarray]] = [[] for _ in range(batch)]
+        candidates_ids: List[List[np.ndarray]] = [[] for _ in range(batch)]
+
+        if self.is_trained:
+            probe = min(n_probe or self.n_probe, len(self._lists))
+            coarse = queries @ self.centroids.T
+            if probe < len(self._lists):
+                probed = np.argpartition(-coarse, probe - 1, axis=1)[:, :probe]
+            else:
+                probed = np.broadcast_to(np.arange(len(self._lists)), (batch, probe))
+            # Group queries by cell so each cell is scored with one matmul.
+            flat_cells = probed.ravel()
+            flat_queries = np.repeat(np.arange(batch), probe)
+            order = np.argsort(flat_cells, kind="stable")
+            cells, starts = np.unique(flat_cells[order], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            groups = [(int(c), flat_queries[order[s:e]]) for c, s, e in zip(cells, starts, ends)]
+        else:
+            groups = [(0, np.arange(batch))]
+
+        for cell, query_rows in groups:
+            vectors, ids = self._lists[cell].view()
+            if len(ids) == 0:
+                continue
+            scores = vectors @ queries[query_rows].T  # (cell_size, len(query_rows))
+            if len(ids) > k:
+                top = np.argpartition(-scores, k - 1, axis=0)[:k]
+            else:
+                top = np.broadcast_to(np.arange(len(ids))[:, None], scores.shape)
+            for column, query in enumerate(query_rows.tolist()):
+                rows = top[:, column]
+                candidates_scores[query].append(scores[rows, column])
+                candidates_ids[query].append(ids[rows])
+
+        out_scores = np.full((batch, k), -np.inf, dtype=np.float32)
+        out_ids = np.full((batch, k), -1, dtype=np.int64)
+        for query in range(batch):
+            if not candidates_ids[query]:
+                continue
+            scores = np.concatenate(candidates_scores[query])
+            ids = np.concatenate(candidates_ids[query])
+            take = min(k, len(ids))
+            best = np.argpartition(-scores, take - 1)[:take] if len(ids) > take else np.arange(len(ids))
+            best = best[np.argsort(-scores[best], kind="stable")]
+            out_scores[query, :take] = scores[best]
+            out_ids[query, :take] = ids[best]
+        return out_scores, out_ids
+
+    def search_texts(self, texts: Sequence[str], k: int = 10,
+                     n_probe: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Embed ``texts`` and return, per query, a list of
+        ``{"id", "score", "payload"}`` dicts ordered by similarity.
+        """
+        scores, ids = self.search(self._embed(texts), k=k, n_probe=n_probe)
+        results = []
+        for row_scores, row_ids in zip(scores.tolist(), ids.tolist()):
+            results.append([
+                {"id": vector_id, "score": score, "payload": self._payloads.get(vector_id)}
+                for score, vector_id in zip(row_scores, row_ids) if vector_id != -1
+            ])
+        return results
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, path: str):
+        """
+        Write the index to directory ``path``: cells are stored back to back in
+        vectors.npy/ids.npy with their boundaries in offsets.npy.
+        """
+        os.makedirs(path, exist_ok=True)
+        vectors, ids = self._all_vectors()
+        sizes = [lst.size for lst in self._lists]
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        np.save(os.path.join(path, "vectors.npy"), vectors)
+        np.save(os.path.join(path, "ids.npy"), ids)
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        if self.is_trained:
+            np.save(os.path.join(path, "centroids.npy"), self.centroids)
+        elif os.path.exists(os.path.join(path, "centroids.npy")):
+            os.remove(os.path.join(path, "centroids.npy"))
+        with open(os.path.join(path, "payloads.json"), "w", encoding="utf-8") as f:
+            json.dump({str(k): v for k, v in self._payloads.items()}, f)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim,
+                "n_lists": self.n_lists,
+                "n_probe": self.n_probe,
+                "train_threshold": self.train_threshold,
+                "seed": self.seed,
+                "next_id": self._next_id,
+                "saved_at": time.time(),
+            }, f)
+
+    @classmethod
+    def load(cls, path: str, embedder: Optional[Embedder] = None,
+             mmap: bool = True) -> "VectorIndex":
+        """
+        Open an index written by ``save``. With ``mmap`` the vectors stay on
+        disk and are paged in as cells are probed; a cell is copied into memory
+        only when new vectors are appended to it.
+        """
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(
+            dim=meta["dim"],
+            n_lists=meta["n_lists"],
+            n_probe=meta["n_probe"],
+            embedder=embedder,
+            train_threshold=meta["train_threshold"],
+            seed=meta["seed"],
+        )
+        mode = "r" if mmap else None
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode)
+        ids = np.load(os.path.join(path, "ids.npy"), mmap_mode=mode)
+        offsets = np.load(os.path.join(path, "offsets.npy"))
+        centroids_path = os.path.join(path, "centroids.npy")
+        if os.path.exists(centroids_path):
+            index.centroids = np.load(centroids_path)
+        index._lists = [
+            _InvertedList(index.dim, vectors[offsets[i]:offsets[i + 1]], ids[offsets[i]:offsets[i + 1]])
+            for i in range(len(offsets) - 1)
+        ]
+        with open(os.path.join(path, "payloads.json"), encoding="utf-8") as f:
+            index._payloads = {int(k): v for k, v in json.load(f).items()}
+        index._next_id = meta["next_id"]
+        return index
+
+
+def _benchmark(count: int = 1_000_000, dim: int = 128, queries: int = 100, k: int = 10):
+    """Build a random index of ``count`` vectors and report per-query latency."""
+    rng = np.random.default_rng(0)
+    index = VectorIndex(dim=dim, train_threshold=0)
+    for start in range(0, count, 100_000):
+        index.add(rng.standard_normal((min(100_000, count - start), dim), dtype=np.float32))
+    started = time.perf_counter()
+    index.train()
+    print(f"trained {index.n_lists} lists over {len(index)} vectors in "
+          f"{time.perf_counter() - started:.1f}s")
+    probe = rng.standard_normal((queries, dim), dtype=np.float32)
+    for batch in (1, queries):
+        started = time.perf_counter()
+        for start in range(0, queries, batch):
+            index.search(probe[start:start + batch], k=k)
+        elapsed = (time.perf_counter() - started) / queries * 1000
+        print(f"batch={batch}: {elapsed:.2f} ms/query")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,166 @@
+"""
+agent_updates.py - Socket.IO push of agent state changes for the dashboard
+
+Instead of every client polling /api/agent-status, one background task takes
+a snapshot of all agents per tick, diffs it against the previous one and
+queues the changed fields for the rooms that watch them: "agents" for the
+whole fleet and "agent:<name>" per agent. Bursts are coalesced (the latest
+value of each field wins) so a room gets at most ``max_updates_per_second``
+broadcasts, and each broadcast is serialized to JSON once and handed to the
+Socket.IO server as a string for every subscriber of the room.
+"""
+
+from typing import Callable, Dict, Iterable, Optional, Set
+import json
+import threading
+import time
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+ALL_AGENTS_ROOM = "agents"
+UPDATE_EVENT = "agent_update"
+STATE_EVENT = "agent_state"
+DEFAULT_UPDATES_PER_SECOND = 4.0
+DEFAULT_TICK_INTERVAL = 0.25  # seconds between snapshots
+
+def agent_room(agent_name: str) -> str:
+    return f"agent:{agent_name}"
+
+def diff_snapshots(previous: Dict[str, dict], current: Dict[str, dict]) -> Dict[str, Optional[dict]]:
+    """
+    Per agent, the fields whose value changed; a new agent maps to its full
+    snapshot and a removed one to None. Unchanged agents are left out.
+    """
+    changes: Dict[str, Optional[dict]] = {}
+    for name, state in current.items():
+        before = previous.get(name)
+        if before is None:
+            changes[name] = state
+            continue
+        changed = {field: value for field, value in state.items() if before.get(field) != value}
+        if changed:
+            changes[name] = changed
+    for name in previous.keys() - current.keys():
+        changes[name] = None
+    return changes
+
+class AgentUpdateBroadcaster:
+    """
+    Diffs agent snapshots and pushes coalesced, pre-serialized updates per room.
+
+    ``snapshot`` returns {agent name: agent_snapshot(agent)}; ``emit`` is called
+    as ``emit(event, payload, room)`` with ``payload`` already a JSON string
+    (clients JSON.parse it). Membership is tracked here so that changes are
+    only queued for rooms somebody is watching.
+    """
+
+    def __init__(self, snapshot: Callable[[], Dict[str, dict]], emit: Callable[[str, str, str], None],
+                 max_updates_per_second: float = DEFAULT_UPDATES_PER_SECOND,
+                 clock: Callable[[], float] = time.monotonic):
+        self._snapshot = snapshot
+        self._emit = emit
+        self.min_interval = 1.0 / max_updates_per_second
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state: Dict[str, dict] = {}
+        self._members: Dict[str, Set[str]] = {}
+        self._pending: Dict[str, Dict[str, Optional[dict]]] = {}
+        self._last_sent: Dict[str, float] = {}
+        self.seq = 0
+        self.broadcasts = 0
+
+    def subscribe(self, sid: str, agents: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+        """
+        Add ``sid`` to the rooms of ``agents`` (the whole fleet when None).
+        Returns the rooms' current state for the client's initial render;
+        updates that follow may repeat part of it, which clients apply as
+        plain field overwrites.
+        """
+        current = self._snapshot()
+        if agents is None:
+            rooms = [ALL_AGENTS_ROOM]
+            state = current
+        else:
+            agents = list(agents)
+            rooms = [agent_room(name) for name in agents]
+            state = {name: current[name] for name in agents if name in current}
+        with self._lock:
+            for room in rooms:
+                self._members.setdefault(room, set()).add(sid)
+            return state
+
+    def unsubscribe(self, sid: str, agents: Optional[Iterable[str]] = None):
+        rooms = [ALL_AGENTS_ROOM] if agents is None else [agent_room(name) for name in agents]
+        with self._lock:
+            for room in rooms:
+                self._leave(sid, room)
+
+    def disconnect(self, sid: str):
+        with self._lock:
+            for room in list(self._members):
+                self._leave(sid, room)
+
+    def _leave(self, sid: str, room: str):
+        members = self._members.get(room)
+        if members is None:
+            return
+        members.discard(sid)
+        if not members:
+            del self._members[room]
+            self._pending.pop(room, None)
+
+    def rooms(self, sid: str) -> Set[str]:
+        with self._lock:
+            return {room for room, members in self._members.items() if sid in members}
+
+    def _queue(self, room: str, changes: Dict[str, Optional[dict]]):
+        pending = self._pending.setdefault(room, {})
+        for name, change in changes.items():
+            queued = pending.get(name)
+            if change is None or queued is None:
+                # Copied: the same change is queued for several rooms and a new
+                # agent's change is its snapshot in self._state.
+                pending[name] = None if change is None else dict(change)
+            else:
+                queued.update(change)
+
+    def tick(self) -> int:
+        """Snapshot, diff and send whatever is due; returns the number of broadcasts."""
+        current = self._snapshot()
+        due = []
+        with self._lock:
+            changes = diff_snapshots(self._state, current)
+            self._state = current
+            if changes:
+                if ALL_AGENTS_ROOM in self._members:
+                    self._queue(ALL_AGENTS_ROOM, changes)
+                for name, change in changes.items():
+                    room = agent_room(name)
+                    if room in self._members:
+                        self._queue(room, {name: change})
+            now = self._clock()
+            for room, pending in list(self._pending.items()):
+                if now - self._last_sent.get(room, float("-inf")) < self.min_interval:
+                    continue
+                self.seq += 1
+                due.append((room, json.dumps({"seq": self.seq, "changes": pending}, default=str)))
+                self._last_sent[room] = now
+                del self._pending[room]
+        for room, payload in due:
+            try:
+                self._emit(UPDATE_EVENT, payload, room)
+            except Exception as e:
+                logger.error("agent_update_emit_failed", room=room, error=str(e))
+        self.broadcasts += len(due)
+        return len(due)
+
+    def run(self, sleep: Callable[[float], None], tick_interval: float = DEFAULT_TICK_INTERVAL):
+        """Tick forever; ``sleep`` is the server's cooperative sleep (socketio.sleep)."""
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("agent_update_tick_failed", error=str(e))
+            sleep(tick_interval)
@@ -19,15 +19,22 @@ import json
 import asyncio
 import time
 from datetime import datetime
-from collections import defaultdict, deque
 from functools import wraps
-import psutil
 import structlog
-from flask import Flask, render_template, jsonify, request, session
-from flask_socketio import SocketIO
+from flask import Flask, Response, render_template, jsonify, request, session
+from flask_socketio import SocketIO, join_room, leave_room
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from src.core.agent_orchestration import AgentOrchestrator
+from src.core.orchestrator_host import OrchestratorHost, native_threading
+from src.core.monitoring.rate_limiter import RateLimitConfig, rate_limiter
+from src.core.monitoring.sampler import SystemSampler
+from src.core.monitoring.http_cache import ResponseCache
+from src.ui.worker_stats import stats_from_env
+from src.utils.monitoring import initialize_monitoring
+from src.ui.agent_updates import (
+    ALL_AGENTS_ROOM, STATE_EVENT, AgentUpdateBroadcaster, agent_room,
+)
 from flask_wtf.csrf import CSRFProtect
 import sys
 
@@ -55,24 +62,51 @@ logger = structlog.get_logger()
 # ----------------------------------------------------------------------------
 # Resource and Error Monitoring
 # ----------------------------------------------------------------------------
+RESOURCE_SAMPLE_INTERVAL = 1.0    # seconds between sampler ticks
+RESOURCE_RECORD_INTERVAL = 60.0   # seconds between entries in resource_metrics
+
 class MonitoringService:
-    def __init__(self):
-        self.error_counts = defaultdict(int)
-        self.recent_errors = deque(maxlen=100)
-        self.user_interactions = defaultdict(lambda: defaultdict(int))
-        self.resource_metrics = deque(maxlen=60)  # Last hour of metrics
-        self.rate_limits = defaultdict(lambda: defaultdict(int))
+    def __init__(self, start_sampler=True, stats=None):
+        # Counters and ring buffers live in per-worker rows of a shared memory
+        # segment (see worker_stats.py), so every gunicorn worker reports the
+        # totals of all of them; the properties below read the merged view.
+        self.stats = stats or stats_from_env()
+        self.sampler = SystemSampler()
+        # Shared with the monitoring API; RATE_LIMIT_BACKEND=shm or a redis://
+        # URL makes the limit hold across gunicorn workers instead of per worker.
+        self.rate_limiter = rate_limiter
+        if start_sampler:
+            self.start_resource_sampler()
+
+    @property
+    def error_counts(self):
+        return self.stats.error_counts()
+
+    @property
+    def recent_errors(self):
+        return self.stats.recent_errors()
+
+    @property
+    def user_interactions(self):
+        return self.stats.user_interactions()
+
+    @property
+    def resource_metrics(self):
+        """Last hour of metrics, one entry per minute for all workers."""
+        return self.stats.resource_history(interval=RESOURCE_RECORD_INTERVAL)
+
+    @property
+    def latest_resources(self):
+        """Latest resource snapshot of the live workers; never calls psutil."""
+        return self.stats.latest_resources()
+
+    @property
+    def version(self):
+        """Moves whenever the data behind /api/monitoring/metrics changes in any worker."""
+        return self.stats.version
         
     def track_error(self, error_type, error_msg, user_id=None):
-        timestamp = datetime.utcnow()
-        self.error_counts[error_type] += 1
-        error_data = {
-            'timestamp': timestamp.isoformat(),
-            'type': error_type,
-            'message': error_msg,
-            'user_id': user_id
-        }
-        self.recent_errors.append(error_data)
+        self.stats.record_error(error_type, error_msg, user_id)
         logger.error("error_tracked", 
             error_type=error_type,
             error_msg=error_msg,
@@ -80,51 +114,68 @@ class MonitoringService:
         )
         
     def track_interaction(self, user_id, action_type):
-        timestamp = int(time.time())
-        self.user_interactions[user_id][action_type] += 1
-        
-        # Detect rage clicks (more than 5 clicks in 2 seconds)
-        recent_clicks = sum(1 for t in self.user_interactions[user_id].values() 
-                          if t > timestamp - 2)
-        if recent_clicks > 5:
-            logger.warning("rage_clicks_detected",
-                user_id=user_id,
-                click_count=recent_clicks
-            )
+        # Rage clicks are detected per element by the interaction tracker
+        # (src/core/monitoring/interaction_tracker.py); this only counts.
+        self.stats.record_interaction(user_id, action_type)
             
-    def collect_resource_metrics(self):
+    def start_resource_sampler(self):
+        """Sample resources on a fixed cadence, independent of request traffic."""
+        def sample_resources():
+            next_record = time.monotonic()
+            while True:
+                try:
+                    record = time.monotonic() >= next_record
+                    if record:
+                        next_record += RESOURCE_RECORD_INTERVAL
+                    self.collect_resource_metrics(record=record)
+                except Exception as e:
+                    logger.error("resource_sampling_error", error=str(e))
+                time.sleep(RESOURCE_SAMPLE_INTERVAL)
+
+        # A real OS thread rather than a socketio background task: psutil calls
+        # block, and must not stall the eventlet hub serving requests. Under the
+        # eventlet worker threading is monkey patched, hence native_threading.
+        thread = native_threading().Thread(target=sample_resources, name="dashboard-resources", daemon=True)
+        thread.start()
+
+    def collect_resource_metrics(self, record=True):
+        """
+        Publish this worker's sample from the sampler, whose tiers decide which
+        psutil calls are due (cheap gauges every second, open files and
+        connections every minute). With ``record`` the sample is also
+        appended to the shared history and checked for high usage.
+        """
+        values = self.sampler.sample()
+        disk_usage = values.get('disk_usage', {})
         metrics = {
             'timestamp': datetime.utcnow().isoformat(),
-            'cpu_percent': psutil.cpu_percent(),
-            'memory_percent': psutil.virtual_memory().percent,
-            'disk_usage': psutil.disk_usage('/').percent,
-            'open_files': len(psutil.Process().open_files()),
-            'connections': len(psutil.Process().connections())
+            'cpu_percent': values.get('cpu_percent'),
+            'memory_percent': values.get('memory_percent'),
+            'disk_usage': disk_usage.get('/', max(disk_usage.values(), default=None)),
+            'open_files': values.get('open_files'),
+            'connections': values.get('connections')
         }
-        self.resource_metrics.append(metrics)
-        
+        self.stats.record_resources(metrics, append=record)
+        if not record:
+            return metrics
+
         # Log warnings for high resource usage
-        if metrics['cpu_percent'] > 80:
+        if (metrics['cpu_percent'] or 0) > 80:
             logger.warning("high_cpu_usage", cpu_percent=metrics['cpu_percent'])
-        if metrics['memory_percent'] > 85:
+        if (metrics['memory_percent'] or 0) > 85:
             logger.warning("high_memory_usage", memory_percent=metrics['memory_percent'])
+        return metrics
             
     def check_rate_limit(self, user_id, action_type, limit=60, window=60):
         """Rate limiting with sliding window"""
-        now = time.time()
-        self.rate_limits[user_id][action_type] = [
-            t for t in self.rate_limits[user_id][action_type] 
-            if t > now - window
-        ]
-        
-        if len(self.rate_limits[user_id][action_type]) >= limit:
+        # No backoff: a rejected user may retry as soon as the window allows.
+        config = RateLimitConfig(max_requests=limit, window_seconds=window, backoff_multiplier=0.0)
+        if self.rate_limiter.is_rate_limited(str(user_id), f"dashboard:{action_type}", config):
             logger.warning("rate_limit_exceeded",
                 user_id=user_id,
                 action_type=action_type
             )
             return False
-            
-        self.rate_limits[user_id][action_type].append(now)
         return True
 
 monitoring = MonitoringService()
@@ -154,8 +205,39 @@ socketio = SocketIO(app,
     engineio_logger=True
 )
 
-# Initialize agent management
+# Initialize agent management. The orchestrator runs on its own asyncio loop
+# in a real OS thread, also under the eventlet gunicorn worker (see
+# orchestrator_host.py); handlers read its published snapshots and send it
+# commands, and never wait on that loop. Every process that imports this
+# module schedules the agents, so serve it with a single worker
+# (src/ui/gunicorn_conf.py refuses more).
 orchestrator = AgentOrchestrator()
+orchestrator_host = OrchestratorHost(
+    orchestrator,
+    schedule_interval=float(os.getenv("AGENT_SCHEDULE_INTERVAL", 60)),
+).start()
+
+# Prometheus metrics (agent runs, Gemini calls, the LLM ledger) on METRIC_PORT;
+# with PROMETHEUS_MULTIPROC_DIR set, the aggregate of all workers.
+try:
+    initialize_monitoring()
+except OSError as e:  # port still held, e.g. by a worker that is shutting down
+    logger.error("metrics_server_start_failed", error=str(e))
+
+# Push agent state changes to subscribed rooms instead of per-client polling
+agent_updates = AgentUpdateBroadcaster(
+    snapshot=lambda: {name: dict(state) for name, state in orchestrator_host.snapshot().items()},
+    emit=lambda event, payload, room: socketio.emit(event, payload, to=room),
+    max_updates_per_second=float(os.getenv("AGENT_UPDATES_PER_SECOND", 4)),
+)
+_agent_updates_task = None
+
+def start_agent_updates():
+    """Start the push loop once, on the first subscription (works under gunicorn too)."""
+    global _agent_updates_task
+    if _agent_updates_task is None:
+        # A green thread is fine here: snapshots and diffs are pure Python.
+        _agent_updates_task = socketio.start_background_task(agent_updates.run, socketio.sleep)
 
 # ----------------------------------------------------------------------------
 # Middleware and Decorators
@@ -172,7 +254,14 @@ def log_request():
 @app.before_request
 def before_request():
     log_request()
-    monitoring.collect_resource_metrics()
+
+# Rendered JSON of the polled endpoints, with ETag/304 and gzip/br
+response_cache = ResponseCache(ttl=float(os.getenv("DASHBOARD_CACHE_TTL", 2.0)))
+
+def cached_json(key, build, version=None):
+    """Serve build()'s JSON through the response cache for the current request."""
+    status, body, headers = response_cache.respond(key, build, request.headers, version)
+    return Response(body, status=status, headers=headers)
 
 def require_user(f):
     @wraps(f)
@@ -241,8 +330,8 @@ def get_agents():
         if not monitoring.check_rate_limit(user_id, 'get_agents'):
             return jsonify({"error": "Rate limit exceeded"}), 429
             
-        agents = orchestrator.list_agents()
-        return jsonify({"agents": agents})
+        return cached_json("agents", lambda: {"agents": orchestrator_host.list_agents()},
+                           version=orchestrator_host.snapshot_version)
     except Exception as e:
         monitoring.track_error('agent_list_error', str(e), user_id)
         logger.exception("failed_to_fetch_agents")
@@ -251,6 +340,33 @@ def get_agents():
             "message": "Failed to retrieve agents"
         }), 500
 
+@app.route("/api/agents/<name>/run", methods=["POST"])
+@require_user
+def run_agent(name):
+    """
+    POST /api/agents/<name>/run - Queue an immediate run of one agent
+    Returns:
+        202 once the run is handed to the orchestrator loop
+    """
+    user_id = session.get('user', {}).get('id')
+    try:
+        if not monitoring.check_rate_limit(user_id, 'run_agent', limit=10):
+            return jsonify({"error": "Rate limit exceeded"}), 429
+        if name not in orchestrator_host.snapshot():
+            return jsonify({"error": f"Unknown agent '{name}'"}), 404
+
+        # Fire and forget: the host logs failures and the outcome shows up in
+        # its snapshots, so this green thread never touches the future's locks.
+        orchestrator_host.run_agent(name)
+        return jsonify({"status": "queued", "agent": name}), 202
+    except Exception as e:
+        monitoring.track_error('agent_run_error', str(e), user_id)
+        logger.exception("failed_to_queue_agent_run")
+        return jsonify({
+            "status": "error",
+            "message": "Failed to queue agent run"
+        }), 500
+
 @app.route("/api/agent-status", methods=["GET"])
 def agent_status():
     """
@@ -259,15 +375,14 @@ def agent_status():
         JSON array of agent status data
     """
     try:
-        agent_data = [
+        return cached_json("agent_status", lambda: [
             {
-                "name": agent.name,
-                "status": agent.status,
-                "last_active": agent.last_active
+                "name": name,
+                "status": state["state"],
+                "last_active": state["last_active"]
             } 
-            for agent in orchestrator.agents.values()
-        ]
-        return jsonify(agent_data)
+            for name, state in orchestrator_host.snapshot().items()
+        ], version=orchestrator_host.snapshot_version)
     except Exception as e:
         logger.error(f"Failed to fetch agent status: {e}", exc_info=True)
         return jsonify({
@@ -292,11 +407,36 @@ def handle_connect():
 def handle_disconnect():
     """Handle WebSocket client disconnection with monitoring."""
     user_id = session.get('user', {}).get('id')
+    agent_updates.disconnect(request.sid)
     logger.info("websocket_disconnected",
         user_id=user_id,
         sid=request.sid
     )
 
+@socketio.on("subscribe_agents")
+def handle_subscribe_agents(data=None):
+    """
+    Subscribe to agent_update pushes: {"agents": [names]} for the agents the
+    client is viewing, or no agents for the whole fleet. The current state of
+    the subscribed agents is sent back at once as agent_state.
+    """
+    start_agent_updates()
+    agents = (data or {}).get('agents')
+    rooms = [ALL_AGENTS_ROOM] if agents is None else [agent_room(name) for name in agents]
+    for room in rooms:
+        join_room(room)
+    state = agent_updates.subscribe(request.sid, agents)
+    socketio.emit(STATE_EVENT, json.dumps(state, default=str), to=request.sid)
+
+@socketio.on("unsubscribe_agents")
+def handle_unsubscribe_agents(data=None):
+    """Leave the rooms joined with subscribe_agents."""
+    agents = (data or {}).get('agents')
+    agent_updates.unsubscribe(request.sid, agents)
+    rooms = [ALL_AGENTS_ROOM] if agents is None else [agent_room(name) for name in agents]
+    for room in rooms:
+        leave_room(room)
+
 # ----------------------------------------------------------------------------
 # Error Handlers with Monitoring
 # ----------------------------------------------------------------------------
@@ -322,11 +462,12 @@ def server_error(e):
 def get_metrics():
     """Get current monitoring metrics"""
     try:
-        return jsonify({
-            'resource_metrics': list(monitoring.resource_metrics),
-            'error_counts': dict(monitoring.error_counts),
-            'recent_errors': list(monitoring.recent_errors)
-        })
+        return cached_json("metrics", lambda: {
+            'current': monitoring.latest_resources,
+            'resource_metrics': monitoring.resource_metrics,
+            'error_counts': monitoring.error_counts,
+            'recent_errors': monitoring.recent_errors
+        }, version=monitoring.version)
     except Exception as e:
         logger.exception("failed_to_fetch_metrics")
         return jsonify({"error": "Failed to fetch metrics"}), 500
@@ -349,8 +490,5 @@ if __name__ == "__main__":
     port = int(os.environ.get("FLASK_PORT", 5000))
     debug = os.environ.get("FLASK_DEBUG", "False").lower() == "true"
     
-    # Initialize the agent orchestrator
-    agent_orchestrator = AgentOrchestrator()
-    
     # Start the SocketIO server
     socketio.run(app, host=host, port=port, debug=debug)
@@ -0,0 +1,43 @@
+"""
+gunicorn_conf.py - gunicorn server hooks for the dashboard
+
+    gunicorn -c python:src.ui.gunicorn_conf --worker-class eventlet src.ui.dashboard:app
+
+The dashboard runs as ONE worker: each worker process would start its own
+OrchestratorHost and run every scheduled agent again, so more than one is
+refused at startup and when the count is raised with TTIN. The worker's
+monitoring state lives in a shared memory segment (see worker_stats.py) that
+outlives it, so a replacement worker keeps the totals; the master removes the
+segment on shutdown. With PROMETHEUS_MULTIPROC_DIR set, the master also
+retires the metric files of each worker that exits (see src/utils/monitoring.py).
+"""
+
+import os
+
+from src.ui.worker_stats import segment_from_env, unlink_segment
+
+workers = 1
+MAX_WORKERS = 1  # see the module docstring
+
+
+def nworkers_changed(server, new_value, old_value):
+    if new_value <= MAX_WORKERS:
+        return
+    if old_value is None:  # the arbiter applying --workers at startup
+        raise RuntimeError(
+            f"the dashboard runs its agent orchestrator in-process and supports "
+            f"--workers {MAX_WORKERS}, not {new_value}"
+        )
+    server.log.error("dashboard supports %d worker(s); ignoring the increase to %d", MAX_WORKERS, new_value)
+    server.num_workers = old_value
+
+def child_exit(server, worker):
+    # Live gauges (in-flight runs, queue depths) of a dead worker must not stick.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+def on_exit(server):
+    name = segment_from_env()
+    if name is not None:
+        unlink_segment(name)
@@ -0,0 +1,482 @@
+"""
+worker_stats.py - Dashboard monitoring state shared by all server workers
+
+Error counts, recent errors, interaction counts and resource samples live in
+one multiprocessing.shared_memory segment with a fixed layout, so any gunicorn
+worker answers /api/monitoring/metrics with the totals of all of them.
+
+Every worker claims a row at startup and is the only writer of that row: its
+counter increments and ring-buffer appends need no cross-process lock, and
+readers sum or merge the rows. Ring records carry a sequence number that is
+odd while the record is being written, so readers skip torn records instead
+of waiting. Only the rare structural changes (claiming a row, adding a new
+error type or interaction key to the shared name tables) take a file lock.
+
+Slots are fixed: error types beyond ERROR_TYPES and interaction keys beyond
+INTERACTION_KEYS are counted under OTHER_KEY. Rows of exited workers are
+reused by new ones and keep their counts, so totals survive worker restarts.
+
+The segment outlives the workers. Its name ends in a hash of LAYOUT, so a
+deploy that changes the layout starts a fresh segment instead of failing to
+attach to the old one, and the gunicorn master removes it on shutdown (see
+gunicorn_conf.py).
+"""
+
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import fcntl
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+import structlog
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover - platforms without POSIX shared memory
+    shared_memory = None
+
+logger = structlog.get_logger(__name__)
+
+MAGIC = b"3AISTAT1"
+MAX_WORKERS = 32
+ERROR_TYPES = 256
+INTERACTION_KEYS = 8192
+RECENT_ERRORS = 100
+RESOURCE_HISTORY = 60
+WORKER_STALE_AFTER = 10.0  # seconds without a resource sample before a worker is left out
+OTHER_KEY = "_other"
+SEGMENT_PREFIX = "3ai-dashboard-stats"
+
+_ERROR_RECORD = np.dtype([
+    ("seq", "i8"), ("timestamp", "f8"),
+    ("type", "S64"), ("message", "S256"), ("user_id", "S64"),
+], align=True)
+_RESOURCE_RECORD = np.dtype([
+    ("seq", "i8"), ("timestamp", "f8"),
+    ("cpu_percent", "f8"), ("memory_percent", "f8"), ("disk_usage", "f8"),
+    ("open_files", "f8"), ("connections", "f8"),
+], align=True)
+HOST_RESOURCES = ("cpu_percent", "memory_percent", "disk_usage")  # same for every worker
+PROCESS_RESOURCES = ("open_files", "connections")                 # summed over workers
+
+LAYOUT = np.dtype([
+    ("magic", "S8"),
+    ("itemsize", "i8"),
+    ("pids", "i8", (MAX_WORKERS,)),
+    ("heartbeats", "f8", (MAX_WORKERS,)),
+    ("versions", "i8", (MAX_WORKERS,)),
+    ("error_used", "i8", (ERROR_TYPES,)),
+    ("error_names", "S64", (ERROR_TYPES,)),
+    ("interaction_used", "i8", (INTERACTION_KEYS,)),
+    ("interaction_users", "S64", (INTERACTION_KEYS,)),
+    ("interaction_actions", "S64", (INTERACTION_KEYS,)),
+    ("error_counts", "i8", (MAX_WORKERS, ERROR_TYPES)),
+    ("interaction_counts", "i8", (MAX_WORKERS, INTERACTION_KEYS)),
+    ("error_heads", "i8", (MAX_WORKERS,)),
+    ("errors", _ERROR_RECORD, (MAX_WORKERS, RECENT_ERRORS)),
+    ("resource_heads", "i8", (MAX_WORKERS,)),
+    ("resources", _RESOURCE_RECORD, (MAX_WORKERS, RESOURCE_HISTORY)),
+    ("latest", _RESOURCE_RECORD, (MAX_WORKERS,)),
+], align=True)
+LAYOUT_ID = "%08x" % zlib.crc32(MAGIC + repr(LAYOUT.descr).encode())
+DEFAULT_SEGMENT_NAME = f"{SEGMENT_PREFIX}-{LAYOUT_ID}"
+
+
+def segment_name(prefix: str = SEGMENT_PREFIX) -> str:
+    """Name of the segment for ``prefix`` and this build's LAYOUT."""
+    return f"{prefix}-{LAYOUT_ID}"
+
+def _lock_path(name: str) -> str:
+    return os.path.join(tempfile.gettempdir(), f"{name}.lock")
+
+def _encode(value, size: int) -> bytes:
+    return str("" if value is None else value).encode("utf-8")[:size]
+
+def _decode(raw: bytes) -> str:
+    return raw.decode("utf-8", "replace")
+
+def _isoformat(ts: float) -> str:
+    return datetime.utcfromtimestamp(ts).isoformat()
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _open_segment(name: str):
+    """Create or attach the named segment; returns (SharedMemory, created)."""
+    def open_shm(**kwargs):
+        try:
+            return shared_memory.SharedMemory(name=name, track=False, **kwargs)
+        except TypeError:  # Python < 3.13: keep the resource tracker from unlinking it at exit
+            shm = shared_memory.SharedMemory(name=name, **kwargs)
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+            return shm
+    try:
+        return open_shm(create=True, size=LAYOUT.itemsize), True
+    except FileExistsError:
+        return open_shm(), False
+
+def _unlink_segment(name: str) -> bool:
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    shm.unlink()  # processes that still map it keep their memory
+    return True
+
+def unlink_segment(name: str = DEFAULT_SEGMENT_NAME) -> bool:
+    """
+    Remove the named segment and its lock file, for when no worker is
+    attached any more (the gunicorn master's exit). Returns False when there
+    was no segment.
+    """
+    if shared_memory is None:
+        return False
+    path = _lock_path(name)
+    with _FileLock(path):
+        removed = _unlink_segment(name)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    if removed:
+        logger.info("worker_stats_segment_removed", segment=name)
+    return removed
+
+
+class WorkerStats:
+    """
+    Per-worker rows of dashboard monitoring state in a fixed memory layout.
+
+    ``WorkerStats.attach(name)`` opens the segment shared by all workers on the
+    host; ``WorkerStats.local()`` keeps the same layout in private memory, for
+    single-process use or when shared memory is unavailable.
+    """
+
+    def __init__(self, buffer, shm=None, lock_path: Optional[str] = None):
+        self._shm = shm
+        self._lock_path = lock_path
+        self._data = np.ndarray((), dtype=LAYOUT, buffer=buffer)
+        self._thread_lock = threading.Lock()  # writers within this process share the row
+        self._error_slots: Dict[str, int] = {}
+        self._interaction_slots: Dict[Tuple[str, str], int] = {}
+        self.row = -1
+        self._pid = 0
+        self._claim_row()
+
+    @classmethod
+    def attach(cls, name: str = DEFAULT_SEGMENT_NAME) -> "WorkerStats":
+        if shared_memory is None:
+            raise OSError("multiprocessing.shared_memory is not available")
+        lock_path = _lock_path(name)
+        with _FileLock(lock_path):
+            shm, created = _open_segment(name)
+            if not created and not _has_layout(shm):
+                # Left under this name by a build with another layout (or a
+                # custom DASHBOARD_STATS_SHM reused across them): replace it.
+                shm.close()
+                _unlink_segment(name)
+                logger.warning("worker_stats_segment_replaced", segment=name)
+                shm, created = _open_segment(name)
+            if created:
+                data = np.ndarray((), dtype=LAYOUT, buffer=shm.buf)
+                data["itemsize"] = LAYOUT.itemsize
+                data["magic"] = MAGIC
+                del data
+        stats = cls(shm.buf, shm, lock_path)
+        # A worker forked from the process that attached must not share its row.
+        os.register_at_fork(after_in_child=stats._claim_row)
+        return stats
+
+    @classmethod
+    def local(cls) -> "WorkerStats":
+        buffer = bytearray(LAYOUT.itemsize)
+        np.ndarray((), dtype=LAYOUT, buffer=buffer)["itemsize"] = LAYOUT.itemsize
+        return cls(buffer)
+
+    @property
+    def shared(self) -> bool:
+        return self._shm is not None
+
+    def close(self):
+        """Release this process's row (its counts stay) and detach."""
+        if self.row >= 0 and self._data["pids"][self.row] == os.getpid():
+            self._data["pids"][self.row] = 0
+        self.row = -1
+        if self._shm is not None:
+            self._data = None
+            self._shm.close()
+            self._shm = None
+
+    # -- structural changes, under the file lock ------------------------------
+
+    def _locked(self):
+        if self._lock_path is None:
+            return _NullLock()
+        return _FileLock(self._lock_path)
+
+    def _claim_row(self):
+        if self._data is None:
+            return  # closed
+        pid = os.getpid()
+        self._thread_lock = threading.Lock()  # a forked child must not inherit a held lock
+        with self._locked():
+            pids = self._data["pids"]
+            rows = [i for i in range(MAX_WORKERS) if pids[i] == pid]
+            rows = rows or [i for i in range(MAX_WORKERS) if pids[i] == 0]
+            rows = rows or [i for i in range(MAX_WORKERS) if not _pid_alive(int(pids[i]))]
+            if not rows:
+                raise OSError(f"no free worker row (MAX_WORKERS={MAX_WORKERS})")
+            self.row = rows[0]
+            pids[self.row] = pid
+            # Not live until it publishes a sample; a reused row's old one is stale.
+            self._data["heartbeats"][self.row] = 0.0
+        self._pid = pid
+
+    def _slot(self, key: Tuple[bytes, ...], used: np.ndarray, names: List[np.ndarray]) -> int:
+        """Index of ``key`` in a shared name table, adding it if missing."""
+        size = len(used) - 1  # the last slot is OTHER_KEY's
+        start = zlib.crc32(b"\0".join(key)) % size
+
+        def probe() -> Tuple[Optional[int], bool]:
+            for step in range(size):
+                index = (start + step) % size
+                if not used[index]:
+                    return index, False
+                if all(column[index] == part for column, part in zip(names, key)):
+                    return index, True
+            return None, False
+
+        index, found = probe()
+        if found:
+            return index
+        with self._locked():
+            index, found = probe()  # another worker may have added it meanwhile
+            if index is None:
+                index = size
+                key = (OTHER_KEY.encode(),) + tuple(b"" for _ in names[1:])
+                found = bool(used[index])
+            if not found:
+                for column, part in zip(names, key):
+                    column[index] = part
+                used[index] = 1  # published after the name is written
+        return index
+
+    def _error_slot(self, error_type: str) -> int:
+        slot = self._error_slots.get(error_type)
+        if slot is None:
+            slot = self._error_slots[error_type] = self._slot(
+                (_encode(error_type, 64),), self._data["error_used"], [self._data["error_names"]]
+            )
+        return slot
+
+    def _interaction_slot(self, user_id, action_type) -> int:
+        key = (str(user_id), str(action_type))
+        slot = self._interaction_slots.get(key)
+        if slot is None:
+            slot = self._interaction_slots[key] = self._slot(
+                (_encode(user_id, 64), _encode(action_type, 64)),
+                self._data["interaction_used"],
+                [self._data["interaction_users"], self._data["interaction_actions"]],
+            )
+        return slot
+
+    # -- writes: this worker's row only ---------------------------------------
+
+    def _own_row(self) -> int:
+        if self._pid != os.getpid():
+            self._claim_row()
+        return self.row
+
+    def record_error(self, error_type: str, message: str, user_id=None, timestamp: Optional[float] = None):
+        slot = self._error_slot(error_type)
+        with self._thread_lock:
+            row = self._own_row()
+            self._data["error_counts"][row, slot] += 1
+            n = int(self._data["error_heads"][row])
+            record = self._data["errors"][row, n % RECENT_ERRORS]
+            record["seq"] = 2 * n + 1
+            record["timestamp"] = time.time() if timestamp is None else timestamp
+            record["type"] = _encode(error_type, 64)
+            record["message"] = _encode(message, 256)
+            record["user_id"] = _encode(user_id, 64)
+            record["seq"] = 2 * n + 2
+            self._data["error_heads"][row] = n + 1
+            self._data["versions"][row] += 1
+
+    def record_interaction(self, user_id, action_type) -> int:
+        """Count one interaction; returns this worker's count for the key."""
+        slot = self._interaction_slot(user_id, action_type)
+        with self._thread_lock:
+            row = self._own_row()
+            counts = self._data["interaction_counts"]
+            counts[row, slot] += 1
+            return int(counts[row, slot])
+
+    def record_resources(self, metrics: Dict[str, Optional[float]], append: bool,
+                         timestamp: Optional[float] = None):
+        """Publish this worker's latest sample; with ``append`` also add it to the history."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._thread_lock:
+            row = self._own_row()
+            latest = self._data["latest"][row]
+            self._write_resources(latest, int(latest["seq"]) // 2, metrics, timestamp)
+            if append:
+                n = int(self._data["resource_heads"][row])
+                self._write_resources(self._data["resources"][row, n % RESOURCE_HISTORY], n, metrics, timestamp)
+                self._data["resource_heads"][row] = n + 1
+            self._data["heartbeats"][row] = timestamp
+            self._data["versions"][row] += 1
+
+    @staticmethod
+    def _write_resources(record, n: int, metrics, timestamp: float):
+        record["seq"] = 2 * n + 1
+        record["timestamp"] = timestamp
+        for field in HOST_RESOURCES + PROCESS_RESOURCES:
+            value = metrics.get(field)
+            record[field] = np.nan if value is None else value
+        record["seq"] = 2 * n + 2
+
+    # -- reads: all rows ------------------------------------------------------
+
+    @property
+    def version(self) -> int:
+        """Moves whenever any worker records anything."""
+        return int(self._data["versions"].sum())
+
+    def _live_rows(self, now: Optional[float] = None) -> np.ndarray:
+        now = time.time() if now is None else now
+        return np.flatnonzero((self._data["pids"] != 0) & (now - self._data["heartbeats"] < WORKER_STALE_AFTER))
+
+    def workers(self) -> int:
+        return int(np.count_nonzero(self._data["pids"]))
+
+    def error_counts(self) -> Dict[str, int]:
+        totals = self._data["error_counts"].sum(axis=0)
+        names = self._data["error_names"]
+        return {_decode(names[i]): int(totals[i]) for i in np.flatnonzero(totals)}
+
+    def user_interactions(self) -> Dict[str, Dict[str, int]]:
+        totals = self._data["interaction_counts"].sum(axis=0)
+        users, actions = self._data["interaction_users"], self._data["interaction_actions"]
+        result: Dict[str, Dict[str, int]] = {}
+        for i in np.flatnonzero(totals):
+            result.setdefault(_decode(users[i]), {})[_decode(actions[i])] = int(totals[i])
+        return result
+
+    @staticmethod
+    def _consistent(copied: np.ndarray, live: np.ndarray) -> np.ndarray:
+        """Mask of copied records that were complete and unchanged while being copied."""
+        seq = copied["seq"]
+        return (seq > 0) & (seq % 2 == 0) & (seq == live["seq"])
+
+    def recent_errors(self, limit: int = RECENT_ERRORS) -> List[Dict[str, object]]:
+        ring = self._data["errors"].ravel()
+        records = ring.copy()
+        records = records[self._consistent(records, ring)]
+        records = records[np.argsort(records["timestamp"], kind="stable")][-limit:]
+        return [{
+            "timestamp": _isoformat(record["timestamp"]),
+            "type": _decode(record["type"]),
+            "message": _decode(record["message"]),
+            "user_id": _decode(record["user_id"]) or None,
+        } for record in records]
+
+    @staticmethod
+    def _combine(records: np.ndarray) -> Dict[str, object]:
+        """One view of several workers' samples: host gauges from the newest, process counts summed."""
+        newest = records[np.argmax(records["timestamp"])]
+        combined = {"timestamp": _isoformat(newest["timestamp"])}
+        for field in HOST_RESOURCES:
+            combined[field] = None if np.isnan(newest[field]) else float(newest[field])
+        for field in PROCESS_RESOURCES:
+            values = records[field][~np.isnan(records[field])]
+            combined[field] = int(values.sum()) if len(values) else None
+        combined["workers"] = len(records)
+        return combined
+
+    def latest_resources(self) -> Optional[Dict[str, object]]:
+        latest = self._data["latest"]
+        records = latest.copy()
+        live = np.zeros(MAX_WORKERS, dtype=bool)
+        live[self._live_rows()] = True
+        records = records[self._consistent(records, latest) & live]
+        return self._combine(records) if len(records) else None
+
+    def resource_history(self, limit: int = RESOURCE_HISTORY,
+                         interval: float = 60.0) -> List[Dict[str, object]]:
+        """Samples of all workers merged per ``interval`` bucket, oldest first."""
+        ring = self._data["resources"].ravel()
+        records = ring.copy()
+        records = records[self._consistent(records, ring)]
+        if not len(records):
+            return []
+        buckets = (records["timestamp"] // interval).astype(np.int64)
+        order = np.unique(buckets)[-limit:]
+        return [self._combine(records[buckets == bucket]) for bucket in order]
+
+
+def _has_layout(shm) -> bool:
+    if shm.size < LAYOUT.itemsize:
+        return False
+    header = np.ndarray((), dtype=LAYOUT, buffer=shm.buf)
+    matches = header["magic"] == MAGIC and header["itemsize"] == LAYOUT.itemsize
+    del header  # no export of shm.buf may outlive a close
+    return bool(matches)
+
+
+class _NullLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FileLock:
+    """Exclusive fcntl lock on ``path`` for the duration of a with block."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        fcntl.lockf(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()  # closing the descriptor releases the lock
+        return False
+
+
+def segment_from_env() -> Optional[str]:
+    """
+    Segment name for the DASHBOARD_STATS_SHM prefix (default SEGMENT_PREFIX);
+    None when DASHBOARD_STATS_SHM=off.
+    """
+    prefix = os.getenv("DASHBOARD_STATS_SHM", SEGMENT_PREFIX).strip()
+    if not prefix or prefix.lower() in ("off", "0", "none"):
+        return None
+    return segment_name(prefix)
+
+def stats_from_env() -> WorkerStats:
+    """Shared stats per segment_from_env(); disabled, or any failure to attach, keeps state per process."""
+    name = segment_from_env()
+    if name is not None:
+        try:
+            return WorkerStats.attach(name)
+        except (OSError, ValueError) as e:
+            logger.error("worker_stats_attach_failed", segment=name, error=str(e))
+    return WorkerStats.local()
@@ -7,27 +7,246 @@ Best Practices Implemented:
 2. Start an HTTP server for metric scraping
 3. Sample Metrics (Counters, Gauges) for Agent Operations
 4. Easily Extensible for Additional Metrics
+5. Per-agent LLM usage exported from the LLM ledger at scrape time
+6. Labeled agent/Gemini metrics recorded through pre-bound label children
+7. Multi-process aggregation (gunicorn workers) via PROMETHEUS_MULTIPROC_DIR
+
+The dashboard calls initialize_monitoring() at startup. Multi-process mode:
+set PROMETHEUS_MULTIPROC_DIR to an empty, writable directory before gunicorn
+starts. Each worker then writes its samples to memory-mapped files there,
+initialize_monitoring() serves the aggregate of all workers, and the
+``child_exit`` hook in the dashboard's gunicorn config (src/ui/gunicorn_conf.py)
+drops the live gauges of dead workers. The LLM ledger collector stays
+per-process.
 """
 
 import os
-from prometheus_client import start_http_server, Counter, Gauge
+import time
+from typing import Dict
+
+from prometheus_client import start_http_server, Counter, Gauge, Histogram, REGISTRY, CollectorRegistry
+from prometheus_client import multiprocess
+from prometheus_client.core import CounterMetricFamily, HistogramMetricFamily
 
 # Example counters for agent operations
 agent_run_counter = Counter("agent_run_count", "Number of times any agent's run() method is invoked")
 agent_error_counter = Counter("agent_error_count", "Number of errors encountered across all agents")
 
 # Optional gauge to track concurrent operations
-agent_active_gauge = Gauge("agent_active_operations", "Number of agents running at a given time")
+agent_active_gauge = Gauge(
+    "agent_active_operations", "Number of agents running at a given time", multiprocess_mode="livesum"
+)
+
+# Agent runs take from milliseconds (cached answers) to minutes (multi-step LLM workflows).
+AGENT_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, float("inf"))
+# Gemini calls: network round trip plus generation time.
+GEMINI_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, float("inf"))
+
+agent_runs_total = Counter(
+    "agent_runs_total", "Agent runs by outcome (success, error, rejected by the circuit breaker)",
+    ["agent", "outcome"]
+)
+agent_run_duration = Histogram(
+    "agent_run_duration_seconds", "Wall time of one agent run", ["agent"], buckets=AGENT_LATENCY_BUCKETS
+)
+agent_runs_in_flight = Gauge(
+    "agent_runs_in_flight", "Agent runs currently executing", ["agent"], multiprocess_mode="livesum"
+)
+orchestrator_queue_depth = Gauge(
+    "orchestrator_queue_depth", "Work items queued and not yet finished", ["queue"],
+    multiprocess_mode="livesum"
+)
+gemini_requests_total = Counter(
+    "gemini_requests_total", "Gemini API requests by HTTP status ('error' for transport failures)",
+    ["endpoint", "status"]
+)
+gemini_request_duration = Histogram(
+    "gemini_request_duration_seconds", "Gemini API request latency", ["endpoint"],
+    buckets=GEMINI_LATENCY_BUCKETS
+)
+gemini_requests_in_flight = Gauge(
+    "gemini_requests_in_flight", "Gemini API requests awaiting a response", ["endpoint"],
+    multiprocess_mode="livesum"
+)
+gemini_bytes_total = Counter(
+    "gemini_bytes_total", "Gemini API body bytes on the wire", ["endpoint", "direction"]
+)
+gemini_auth_total = Counter(
+    "gemini_auth_total", "Gemini authentications by result", ["result"]
+)
+
+
+class AgentMetrics:
+    """
+    Label children for one agent, bound once so recording a run is a few
+    lock-protected float updates instead of a label lookup per call.
+    """
+    __slots__ = ("success", "error", "rejected", "duration", "in_flight")
+
+    def __init__(self, agent: str):
+        self.success = agent_runs_total.labels(agent, "success")
+        self.error = agent_runs_total.labels(agent, "error")
+        self.rejected = agent_runs_total.labels(agent, "rejected")
+        self.duration = agent_run_duration.labels(agent)
+        self.in_flight = agent_runs_in_flight.labels(agent)
+
+    def started(self) -> float:
+        self.in_flight.inc()
+        agent_active_gauge.inc()
+        agent_run_counter.inc()
+        return time.perf_counter()
+
+    def finished(self, started: float, success: bool):
+        self.duration.observe(time.perf_counter() - started)
+        self.in_flight.dec()
+        agent_active_gauge.dec()
+        if success:
+            self.success.inc()
+        else:
+            self.error.inc()
+            agent_error_counter.inc()
+
+
+class GeminiEndpointMetrics:
+    """Pre-bound label children for one Gemini endpoint."""
+    __slots__ = ("endpoint", "duration", "in_flight", "sent", "received", "_status")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.duration = gemini_request_duration.labels(endpoint)
+        self.in_flight = gemini_requests_in_flight.labels(endpoint)
+        self.sent = gemini_bytes_total.labels(endpoint, "sent")
+        self.received = gemini_bytes_total.labels(endpoint, "received")
+        self._status: Dict[object, Counter] = {}
+
+    def status(self, status) -> Counter:
+        child = self._status.get(status)
+        if child is None:
+            child = self._status[status] = gemini_requests_total.labels(self.endpoint, str(status))
+        return child
+
+    def observe(self, seconds: float, status, bytes_sent: int, bytes_received: int):
+        self.duration.observe(seconds)
+        self.status(status).inc()
+        self.sent.inc(bytes_sent)
+        self.received.inc(bytes_received)
+
+
+_agent_metrics: Dict[str, AgentMetrics] = {}
+_gemini_metrics: Dict[str, GeminiEndpointMetrics] = {}
+_queue_gauges: Dict[str, Gauge] = {}
+_gemini_auth: Dict[str, Counter] = {}
+
+
+def agent_metrics(agent: str) -> AgentMetrics:
+    """Cached label children for ``agent``."""
+    metrics = _agent_metrics.get(agent)
+    if metrics is None:
+        metrics = _agent_metrics.setdefault(agent, AgentMetrics(agent))
+    return metrics
+
+
+def gemini_metrics(endpoint: str) -> GeminiEndpointMetrics:
+    """Cached label children for a Gemini endpoint (query strings are stripped)."""
+    endpoint = endpoint.split("?", 1)[0]
+    metrics = _gemini_metrics.get(endpoint)
+    if metrics is None:
+        metrics = _gemini_metrics.setdefault(endpoint, GeminiEndpointMetrics(endpoint))
+    return metrics
+
+
+def queue_depth(queue: str) -> Gauge:
+    """Cached gauge child for a named work queue."""
+    gauge = _queue_gauges.get(queue)
+    if gauge is None:
+        gauge = _queue_gauges.setdefault(queue, orchestrator_queue_depth.labels(queue))
+    return gauge
+
+
+def track_gemini_auth(result: str):
+    """Count an authentication outcome ("cache_hit", "success" or "failure")."""
+    counter = _gemini_auth.get(result)
+    if counter is None:
+        counter = _gemini_auth.setdefault(result, gemini_auth_total.labels(result))
+    counter.inc()
+
+class LLMLedgerCollector:
+    """
+    Exposes the periodically flushed LLM ledger snapshot as Prometheus metrics,
+    so the ledger stays the only place per-request accounting happens.
+    """
+
+    _COUNTERS = (
+        ("llm_requests", "LLM requests issued", "requests"),
+        ("llm_errors", "LLM requests that failed", "errors"),
+        ("llm_cache_hits", "LLM calls answered from a cache", "cache_hits"),
+        ("llm_request_bytes", "LLM request body bytes sent", "bytes_sent"),
+        ("llm_response_bytes", "LLM response body bytes received", "bytes_received"),
+        ("llm_prompt_tokens", "Prompt tokens reported by the LLM service", "prompt_tokens"),
+        ("llm_completion_tokens", "Completion tokens reported by the LLM service", "completion_tokens"),
+    )
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+
+    def collect(self):
+        agents = self.ledger.published.get("agents", {})
+        labels = ["agent", "workflow"]
+        families = {
+            key: CounterMetricFamily(name, doc, labels=labels)
+            for name, doc, key in self._COUNTERS
+        }
+        latency = HistogramMetricFamily(
+            "llm_request_latency_seconds", "LLM request latency", labels=labels
+        )
+        for agent, workflows in agents.items():
+            for workflow, data in workflows.items():
+                for key, family in families.items():
+                    family.add_metric([agent, workflow], data[key])
+                cumulative = 0
+                buckets = []
+                for bound, count in data["latency_buckets"].items():
+                    cumulative += count
+                    buckets.append((bound, cumulative))
+                latency.add_metric([agent, workflow], buckets, data["latency_sum"])
+        yield from families.values()
+        yield latency
+
+
+_llm_collector = None
+
+
+def register_llm_ledger(ledger):
+    """
+    Register the LLM ledger with the default Prometheus registry (idempotent).
+    """
+    global _llm_collector
+    if _llm_collector is None:
+        _llm_collector = LLMLedgerCollector(ledger)
+        REGISTRY.register(_llm_collector)
+    return _llm_collector
+
 
 def initialize_monitoring():
     """
     Start a Prometheus HTTP server to expose metrics. The port can be configured via environment variable.
+    With PROMETHEUS_MULTIPROC_DIR set, the server exposes the aggregate of all worker processes.
     """
+    from src.core.llm_ledger import llm_ledger
+
+    register_llm_ledger(llm_ledger)
     default_port = 8001
     port = int(os.getenv("METRIC_PORT", default_port))
-    start_http_server(port)
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_llm_collector)
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
     print(f"Prometheus metrics server started on port {port}.")
 
+
 def track_agent_run():
     """
     Increment the counter whenever an agent successfully starts or completes its 'run' method.
@@ -0,0 +1,7 @@
+import os
+
+# Importing src.core.monitoring builds the global MonitoringService and
+# interaction tracker; never let a developer's environment make the test run
+# persist metrics or interaction history.
+os.environ["METRICS_STORE_DIR"] = ""
+os.environ["INTERACTION_LOG_DIR"] = ""
@@ -8,10 +8,16 @@
 
 import pytest
 import asyncio
+import os
 
 # Import the modules to test; adjust the import paths as necessary.
 from src.core.agent_orchestration import AgentOrchestrator, BaseAgent
 from src.core.gemini_integration import GeminiIntegration
+from src.core.gemini_mock_server import MockGeminiServer, MockGeminiConfig
+from src.core.gemini_load_test import run_load_test
+from src.core.vector_index import VectorIndex, HashingEmbedder
+from src.core.llm_ledger import LLMLedger, llm_call_context, llm_ledger
+from src.core.agent_resources import AgentResourceTracker
 
 class TestAgent(BaseAgent):
     def __init__(self, name):
@@ -50,3 +56,569 @@ async def test_gemini_integration_auth_failure(monkeypatch):
     gemini = GeminiIntegration(api_key="invalid_key")
     result = await gemini.authenticate()
     assert result is False
+
+class FakeAuthResponse:
+    def __init__(self, status=200, body=None):
+        self.status = status
+        self._body = body or {}
+    async def json(self, content_type=None):
+        return self._body
+    async def text(self):
+        return ""
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+@pytest.mark.asyncio
+async def test_gemini_authentication_is_cached(monkeypatch):
+    calls = []
+    def fake_get(self, url, **kwargs):
+        calls.append(url)
+        return FakeAuthResponse(body={"token": "short-lived", "expires_in": 60})
+
+    monkeypatch.setattr("aiohttp.ClientSession.get", fake_get)
+    gemini = GeminiIntegration(api_key="valid_key")
+    assert await gemini.authenticate() is True
+    assert await gemini.authenticate() is True
+    assert len(calls) == 1
+    assert gemini._auth_headers()["Authorization"] == "Bearer short-lived"
+
+    assert await gemini.authenticate(force_refresh=True) is True
+    assert len(calls) == 2
+    await gemini.close()
+
+@pytest.mark.asyncio
+async def test_gemini_authentication_refreshes_before_expiry(monkeypatch):
+    calls = []
+    def fake_get(self, url, **kwargs):
+        calls.append(url)
+        return FakeAuthResponse()
+
+    monkeypatch.setattr("aiohttp.ClientSession.get", fake_get)
+    monkeypatch.setattr("src.core.gemini_integration.MIN_AUTH_REFRESH_DELAY", 0.05)
+    gemini = GeminiIntegration(api_key="valid_key", auth_ttl=0.2, auth_refresh_margin=0.15)
+    assert await gemini.authenticate() is True
+    await asyncio.sleep(0.12)
+    assert len(calls) >= 2
+    assert gemini.is_authenticated
+    await gemini.close()
+
+@pytest.mark.asyncio
+async def test_gemini_short_auth_lifetime_does_not_flood_auth(monkeypatch):
+    calls = []
+    def fake_get(self, url, **kwargs):
+        calls.append(url)
+        return FakeAuthResponse(body={"token": "short-lived", "expires_in": 0.1})
+
+    monkeypatch.setattr("aiohttp.ClientSession.get", fake_get)
+    monkeypatch.setattr("src.core.gemini_integration.MIN_AUTH_REFRESH_DELAY", 0.05)
+    # The lifetime is below the 30s margin: refresh halfway through, not at once.
+    gemini = GeminiIntegration(api_key="valid_key")
+    assert await gemini.authenticate() is True
+    await asyncio.sleep(0.12)
+    assert 2 <= len(calls) <= 3
+
+    # An expired token is no longer sent.
+    await gemini.close()
+    await asyncio.sleep(0.11)
+    assert not gemini.is_authenticated
+    assert gemini._auth_headers()["Authorization"] == "Bearer valid_key"
+
+def test_gemini_shared_instance_serves_several_event_loops(monkeypatch):
+    calls = []
+    class SlowAuthResponse(FakeAuthResponse):
+        async def __aenter__(self):
+            await asyncio.sleep(0.01)  # callers on a cold cache contend for the lock
+            return self
+    def fake_get(self, url, **kwargs):
+        calls.append(url)
+        return SlowAuthResponse(body={"expires_in": 60})
+
+    monkeypatch.setattr("aiohttp.ClientSession.get", fake_get)
+    gemini = GeminiIntegration(api_key="valid_key")
+    async def cold_burst():
+        gemini.invalidate_auth()
+        assert await asyncio.gather(*(gemini.authenticate() for _ in range(5))) == [True] * 5
+        return asyncio.get_running_loop()
+
+    loops = []
+    # Each asyncio.run is a new loop, as with the orchestrator host and an API server.
+    for _ in range(2):
+        loops.append(asyncio.run(cold_burst()))
+    assert len(calls) == 2  # still one /auth per cold burst
+    assert gemini._refresh_task.get_loop() is loops[-1]
+    asyncio.run(gemini.close())  # the last refresh task's loop is closed; nothing to await
+
+@pytest.mark.asyncio
+async def test_gemini_against_mock_server():
+    server = MockGeminiServer(MockGeminiConfig(latency_ms=1, distribution="fixed", api_key="mock-key"))
+    base_url = await server.start()
+    try:
+        gemini = GeminiIntegration(api_key="mock-key")
+        gemini.base_url = base_url
+        assert await gemini.authenticate() is True
+        result = await gemini.perform_request("models/test:generateContent", data={"hello": "world"})
+        assert result["usageMetadata"]["totalTokenCount"] > 0
+
+        server.config.rate_limit_rate = 1.0
+        assert await gemini.perform_request("models/test:generateContent", data={}) is None
+        assert server.stats.status_counts[429] == 1
+        await gemini.close()
+    finally:
+        await server.stop()
+
+@pytest.mark.asyncio
+async def test_load_test_harness_reports_percentiles():
+    server = MockGeminiServer(MockGeminiConfig(latency_ms=2, distribution="uniform", seed=7))
+    base_url = await server.start()
+    try:
+        gemini = GeminiIntegration(api_key="mock-key")
+        gemini.base_url = base_url
+        report = await run_load_test(gemini, qps=100, duration=0.2)
+        assert report.sent == 20
+        assert report.succeeded == 20
+        assert report.latency_ms["p50"] <= report.latency_ms["p99"]
+        assert report.connections >= 1
+    finally:
+        await server.stop()
+
+@pytest.mark.asyncio
+async def test_gemini_large_payload_is_gzipped():
+    server = MockGeminiServer(MockGeminiConfig(latency_ms=0, distribution="fixed"))
+    base_url = await server.start()
+    try:
+        gemini = GeminiIntegration(api_key="mock-key", gzip_threshold=1024)
+        gemini.base_url = base_url
+        records = [{"patient_id": i, "notes": "follow-up visit, no change"} for i in range(500)]
+        body, headers = gemini._encode_body({"records": records}, {})
+        assert headers["Content-Encoding"] == "gzip"
+
+        result = await gemini.perform_request("models/test:generateContent", data={"records": records})
+        assert result is not None
+        assert server.stats.bytes_received == len(body)
+        assert server.stats.bytes_received < len(str(records)) / 5
+    finally:
+        await server.stop()
+
+@pytest.mark.asyncio
+async def test_llm_ledger_tracks_calls_per_agent():
+    server = MockGeminiServer(MockGeminiConfig(latency_ms=0, distribution="fixed"))
+    base_url = await server.start()
+    llm_ledger.reset()
+    try:
+        gemini = GeminiIntegration(api_key="mock-key")
+        gemini.base_url = base_url
+        with llm_call_context("SalesAgent", "process_lead"):
+            await gemini.authenticate()
+            await gemini.authenticate()
+            await gemini.perform_request("models/test:generateContent", data={"lead": 1})
+        await gemini.perform_request("models/test:generateContent", data={}, agent="HRAgent")
+        await gemini.close()
+    finally:
+        await server.stop()
+
+    agents = llm_ledger.flush()["agents"]
+    sales = agents["SalesAgent"]["process_lead"]
+    assert sales["requests"] == 1
+    assert sales["cache_hits"] == 1
+    assert sales["total_tokens"] > 0
+    assert sales["bytes_sent"] > 0
+    assert sum(sales["latency_buckets"].values()) == 1
+    assert agents["HRAgent"]["default"]["requests"] == 1
+
+def test_llm_ledger_prometheus_collector():
+    from src.utils.monitoring import LLMLedgerCollector
+
+    ledger = LLMLedger(flush_interval=0)
+    ledger.record_request("OpsAgent", "run", 0.3, bytes_sent=10, success=False)
+    ledger.flush()
+    families = {family.name: family for family in LLMLedgerCollector(ledger).collect()}
+    assert families["llm_errors"].samples[0].value == 1
+    latency = families["llm_request_latency_seconds"]
+    count = [s for s in latency.samples if s.name.endswith("_count")][0]
+    assert count.value == 1
+
+def test_vector_index_search_and_mmap_roundtrip(tmp_path):
+    import numpy as np
+
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((2000, 32)).astype(np.float32)
+    index = VectorIndex(dim=32, train_threshold=0)
+    index.add(vectors)
+    index.train(n_lists=16)
+    _, ids = index.search(vectors[:20], k=5, n_probe=4)
+    assert (ids[:, 0] == np.arange(20)).all()
+
+    index.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path))
+    _, loaded_ids = loaded.search(vectors[:20], k=5, n_probe=4)
+    assert (loaded_ids == ids).all()
+    new_ids = loaded.add(vectors[:3] * 2)
+    assert len(loaded) == 2003
+    assert list(new_ids) == [2000, 2001, 2002]
+
+def test_vector_index_hashing_embedder_retrieval():
+    embedder = HashingEmbedder(dim=128)
+    assert (embedder(["Vendor catalog"]) == embedder(["vendor catalog"])).all()
+    index = VectorIndex(dim=128, embedder=embedder)
+    index.add_texts(
+        ["E11.9 type 2 diabetes mellitus", "Z00.00 general adult exam", "I10 essential hypertension"],
+        payloads=[{"code": "E11.9"}, {"code": "Z00.00"}, {"code": "I10"}],
+    )
+    best = index.search_texts(["diabetes follow-up"], k=1)[0][0]
+    assert best["payload"] == {"code": "E11.9"}
+
+@pytest.mark.asyncio
+async def test_agent_resource_tracker_attributes_cpu_per_step():
+    tracker = AgentResourceTracker(enabled=True, alloc_sample_rate=0.0)
+
+    async def busy():
+        for _ in range(5):
+            sum(i * i for i in range(200_000))
+            await asyncio.sleep(0)
+        return "busy"
+
+    async def idle():
+        await asyncio.sleep(0.05)
+        return "idle"
+
+    async def allocating():
+        blob = [bytes(1024) for _ in range(1000)]
+        await asyncio.sleep(0)
+        return len(blob)
+
+    results = await asyncio.gather(
+        tracker.track("BusyAgent", busy()),
+        tracker.track("IdleAgent", idle()),
+        tracker.track("AllocAgent", allocating(), trace_alloc=True),
+    )
+    assert results == ["busy", "idle", 1000]
+
+    snapshot = tracker.snapshot()
+    busy_usage, idle_usage = snapshot["agents"]["BusyAgent"], snapshot["agents"]["IdleAgent"]
+    assert tracker.top(1) == ["BusyAgent"]
+    assert busy_usage["steps"] == 6 and busy_usage["cpu_share"] > 0.5
+    # The idle agent overlapped the busy one but is not charged for its CPU.
+    assert idle_usage["cpu_seconds"] < busy_usage["cpu_seconds"] / 10
+    assert idle_usage["wall_seconds"] >= 0.05
+    alloc_usage = snapshot["agents"]["AllocAgent"]
+    assert alloc_usage["sampled_runs"] == 1 and alloc_usage["avg_alloc_bytes"] > 1_000_000
+
+    with pytest.raises(ValueError):
+        async def failing():
+            raise ValueError("boom")
+        await tracker.track("BusyAgent", failing())
+    assert tracker.snapshot()["agents"]["BusyAgent"]["errors"] == 1
+
+@pytest.mark.asyncio
+async def test_run_agent_records_prometheus_metrics():
+    from prometheus_client import REGISTRY
+
+    class QuickAgent(BaseAgent):
+        async def run(self, **kwargs):
+            return "ok"
+
+    class BrokenAgent(BaseAgent):
+        async def run(self, **kwargs):
+            raise RuntimeError("boom")
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    orchestrator = AgentOrchestrator()
+    before_ok = sample("agent_runs_total", agent="QuickAgent", outcome="success")
+    before_err = sample("agent_runs_total", agent="BrokenAgent", outcome="error")
+    assert await orchestrator.run_agent(QuickAgent("QuickAgent")) == "ok"
+    assert await orchestrator.run_agent(BrokenAgent("BrokenAgent")) is None
+
+    assert sample("agent_runs_total", agent="QuickAgent", outcome="success") == before_ok + 1
+    assert sample("agent_runs_total", agent="BrokenAgent", outcome="error") == before_err + 1
+    assert sample("agent_run_duration_seconds_count", agent="QuickAgent") >= 1
+    assert sample("agent_runs_in_flight", agent="QuickAgent") == 0
+
+@pytest.mark.asyncio
+async def test_gemini_request_metrics_against_mock_server():
+    from prometheus_client import REGISTRY
+
+    server = MockGeminiServer(MockGeminiConfig(latency_ms=1, error_rate=0.0))
+    base_url = await server.start()
+    try:
+        gemini = GeminiIntegration(api_key="test-key")
+        gemini.base_url = base_url
+        endpoint = "models/metrics-test:generateContent"
+        await gemini.perform_request(endpoint, data={"contents": []})
+    finally:
+        await server.stop()
+
+    labels = {"endpoint": endpoint}
+    assert REGISTRY.get_sample_value("gemini_requests_total", dict(labels, status="200")) == 1
+    assert REGISTRY.get_sample_value("gemini_request_duration_seconds_count", labels) == 1
+    assert REGISTRY.get_sample_value("gemini_bytes_total", dict(labels, direction="received")) > 0
+    assert REGISTRY.get_sample_value("gemini_requests_in_flight", labels) == 0
+
+@pytest.mark.asyncio
+async def test_tracing_spans_nest_across_tasks_and_executors():
+    pytest.importorskip("opentelemetry.sdk")
+    from concurrent.futures import ThreadPoolExecutor
+    from src.core import tracing
+    from src.agents.sales_agent import SalesAgent
+
+    exporter = tracing.configure_tracing("memory", sample_ratio=1.0)
+    try:
+        def blocking_step():
+            with tracing.span("executor.step"):
+                return 1
+
+        class TracedAgent(BaseAgent):
+            async def run(self, **kwargs):
+                sales = SalesAgent("SalesAgent")
+                await asyncio.gather(*(sales.process_lead({"lead_id": i}) for i in range(2)))
+                with ThreadPoolExecutor(max_workers=1) as pool:
+                    return await tracing.run_in_executor(pool, blocking_step)
+
+        with tracing.span("orchestrator.schedule_cycle"):
+            assert await AgentOrchestrator().run_agent(TracedAgent("TracedAgent")) == 1
+    finally:
+        tracing.disable_tracing()
+
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    cycle, run = spans["orchestrator.schedule_cycle"], spans["agent.run"]
+    assert run.parent.span_id == cycle.context.span_id
+    assert run.attributes["agent.name"] == "TracedAgent"
+    assert spans["sales.process_lead"].parent.span_id == run.context.span_id
+    assert spans["executor.step"].parent.span_id == run.context.span_id
+    assert len({s.context.trace_id for s in exporter.get_finished_spans()}) == 1
+
+def test_tail_sampling_keeps_slow_and_failed_traces():
+    pytest.importorskip("opentelemetry.sdk")
+    import time
+    from src.core import tracing
+
+    exporter = tracing.configure_tracing("memory", sample_ratio=1.0, tail_latency=0.05, tail_keep_ratio=0.0)
+    try:
+        with tracing.span("fast"):
+            with tracing.span("fast.child"):
+                pass
+        with tracing.span("slow"):
+            time.sleep(0.06)
+        with pytest.raises(ValueError):
+            with tracing.span("failed"):
+                raise ValueError("boom")
+    finally:
+        tracing.disable_tracing()
+
+    assert sorted(s.name for s in exporter.get_finished_spans()) == ["failed", "slow"]
+
+def test_agent_update_broadcaster_diffs_coalesces_and_serializes_once():
+    import json
+    from src.core.agent_orchestration import agent_snapshot
+    from src.ui.agent_updates import AgentUpdateBroadcaster
+
+    agent = TestAgent("Sales")
+    BaseAgent.__init__(agent, "Sales")  # TestAgent skips the state/health setup
+    sent, now = [], [0.0]
+    broadcaster = AgentUpdateBroadcaster(
+        lambda: {agent.name: agent_snapshot(agent)},
+        lambda event, payload, room: sent.append((event, payload, room)),
+        max_updates_per_second=2, clock=lambda: now[0],
+    )
+    assert broadcaster.tick() == 0  # nobody subscribed yet
+    assert broadcaster.subscribe("a")["Sales"]["state"] == "idle"
+    broadcaster.subscribe("b")
+    broadcaster.subscribe("c", ["Sales"])
+    broadcaster.subscribe("d", ["Other"])
+
+    agent.health_metrics["error_count"] = 1
+    assert broadcaster.tick() == 2  # one payload per room, not per client
+    assert {room for _, _, room in sent} == {"agents", "agent:Sales"}
+    assert json.loads(sent[0][1])["changes"] == {"Sales": {"health": agent.health_metrics}}
+
+    # A burst within the throttle interval goes out as one coalesced update.
+    agent.health_metrics["error_count"] = 2
+    now[0] = 0.1
+    assert broadcaster.tick() == 0
+    agent.circuit_breaker.is_open = True
+    now[0] = 0.6
+    assert broadcaster.tick() == 2
+    changes = json.loads(sent[-1][1])["changes"]["Sales"]
+    assert changes["health"]["error_count"] == 2 and changes["circuit_open"] is True
+
+    broadcaster.disconnect("c")
+    now[0] = 2.0
+    agent.last_active = agent.last_active.replace(year=2030)
+    assert broadcaster.tick() == 1 and sent[-1][2] == "agents"
+
+@pytest.mark.asyncio
+async def test_orchestrator_host_runs_agents_on_its_own_loop():
+    from src.core.orchestrator_host import OrchestratorHost
+
+    agent = TestAgent("Ops")
+    BaseAgent.__init__(agent, "Ops")
+    host = OrchestratorHost(schedule_interval=None, snapshot_interval=60).start()
+    try:
+        assert host.register(agent).result(timeout=5) is True
+        assert host.snapshot()["Ops"]["state"] == "idle"  # published after the command
+
+        future = host.run_agent("Ops")  # returns at once; the run happens on the host loop
+        assert not future.done()
+        assert future.result(timeout=5) == "Ops result"
+        assert await host.arun_agent("Ops") == "Ops result"
+        with pytest.raises(KeyError):
+            host.run_agent("Missing").result(timeout=5)
+
+        [listed] = host.list_agents()
+        assert listed["id"] == "Ops" and listed["state"] == "running"  # last state set by run_agent
+        with pytest.raises(TypeError):
+            host.snapshot()["Ops"]["state"] = "idle"  # read-only for other threads
+    finally:
+        host.stop()
+    assert not host.running
+
+def _record_worker_stats(name, worker):
+    from src.ui.worker_stats import WorkerStats
+
+    stats = WorkerStats.attach(name)
+    for i in range(500):
+        stats.record_error("timeout" if i % 2 else f"worker{worker}", f"error {i}", user_id=worker)
+        stats.record_interaction(worker, "click")
+    stats.record_resources({"cpu_percent": 10.0, "memory_percent": 20.0, "disk_usage": 30.0,
+                            "open_files": 3, "connections": 1}, append=True)
+    stats.close()
+
+def test_worker_stats_merge_rows_of_all_worker_processes():
+    import multiprocessing
+    import os
+    import tempfile
+    import uuid
+    from src.ui.worker_stats import WorkerStats, unlink_segment
+
+    name = "test-stats-" + uuid.uuid4().hex[:8]
+    reader = WorkerStats.attach(name)
+    try:
+        reader.record_resources({"cpu_percent": 50.0, "open_files": 7}, append=False)
+        workers = [multiprocessing.get_context("fork").Process(target=_record_worker_stats, args=(name, i))
+                   for i in range(3)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join(timeout=30)
+            assert process.exitcode == 0
+
+        # Each worker wrote only its own row; readers see the sum of all rows.
+        assert reader.error_counts() == {"timeout": 750, "worker0": 250, "worker1": 250, "worker2": 250}
+        assert reader.user_interactions() == {"0": {"click": 500}, "1": {"click": 500}, "2": {"click": 500}}
+        recent = reader.recent_errors()
+        assert len(recent) == 100 and recent[-1]["message"] == "error 499"
+        [minute] = reader.resource_history()
+        assert (minute["workers"], minute["open_files"], minute["connections"]) == (3, 9, 3)
+        # Exited workers drop out of the live view; their counts stay.
+        latest = reader.latest_resources()
+        assert (latest["workers"], latest["cpu_percent"], latest["open_files"]) == (1, 50.0, 7)
+        assert reader.version == 3 * 501 + 1
+    finally:
+        reader.close()
+        unlink_segment(name)
+        assert not os.path.exists(os.path.join(tempfile.gettempdir(), f"{name}.lock"))
+
+def test_worker_stats_segment_is_named_for_its_layout_and_replaced_when_stale():
+    import uuid
+    from multiprocessing import shared_memory
+    from src.ui import worker_stats
+    from src.ui.worker_stats import LAYOUT_ID, WorkerStats, segment_name, unlink_segment
+
+    assert worker_stats.DEFAULT_SEGMENT_NAME == segment_name() == f"3ai-dashboard-stats-{LAYOUT_ID}"
+    name = "test-stats-" + uuid.uuid4().hex[:8]
+    stale = shared_memory.SharedMemory(name=name, create=True, size=4096)  # an older, smaller layout
+    stale.buf[:8] = b"3AISTAT0"
+    try:
+        stats = WorkerStats.attach(name)
+        stats.record_error("timeout", "replaced")
+        assert stats.error_counts() == {"timeout": 1}
+        assert bytes(stale.buf[:8]) == b"3AISTAT0"  # the old mapping is left alone
+        stats.close()
+        assert unlink_segment(name) and not unlink_segment(name)
+    finally:
+        stale.close()
+
+def test_gunicorn_child_exit_retires_dead_worker_gauges(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+    from src.ui import gunicorn_conf
+
+    for name in ("gauge_livesum_4242.db", "gauge_livesum_4343.db", "counter_4242.db"):
+        (tmp_path / name).write_bytes(b"")
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    gunicorn_conf.child_exit(None, SimpleNamespace(pid=4242))
+    # Counters of the dead worker still count; its live gauges are gone.
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["counter_4242.db", "gauge_livesum_4343.db"]
+
+def test_gunicorn_config_keeps_the_dashboard_to_one_worker():
+    from types import SimpleNamespace
+    from src.ui import gunicorn_conf
+
+    class Arbiter:  # the parts of gunicorn.arbiter.Arbiter the hook uses
+        log = SimpleNamespace(error=lambda *args: None)
+        _num_workers = None
+        @property
+        def num_workers(self):
+            return self._num_workers
+        @num_workers.setter
+        def num_workers(self, value):
+            old, self._num_workers = self._num_workers, value
+            gunicorn_conf.nworkers_changed(self, value, old)
+
+    assert gunicorn_conf.workers == 1
+    server = Arbiter()
+    with pytest.raises(RuntimeError):
+        server.num_workers = 3  # --workers 3 at startup
+    server = Arbiter()
+    server.num_workers = 1
+    server.num_workers += 1  # TTIN
+    assert server.num_workers == 1
+
+_EVENTLET_HOST_SCRIPT = """
+import eventlet
+eventlet.monkey_patch()
+import time
+from src.core.orchestrator_host import OrchestratorHost, native_threading
+
+host = OrchestratorHost(schedule_interval=None, snapshot_interval=0.05).start()
+seen = []
+async def record():
+    seen.append((native_threading().get_native_id(), type(host.loop._selector)._select.__module__))
+host.submit(record())
+for _ in range(500):  # green sleeps; the host loop runs in its own OS thread meanwhile
+    if seen:
+        break
+    time.sleep(0.01)
+host.stop()
+print(eventlet.patcher.is_monkey_patched("thread"), seen[0][0] != native_threading().get_native_id(), seen[0][1])
+"""
+
+def test_orchestrator_host_uses_an_os_thread_under_eventlet():
+    """Like the dashboard's gunicorn eventlet worker: patched before the app is imported."""
+    pytest.importorskip("eventlet")
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, "-c", _EVENTLET_HOST_SCRIPT], cwd=root, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    patched, own_thread, select_module = result.stdout.splitlines()[-1].split()  # after log lines
+    assert patched == "True"
+    assert own_thread == "True" and select_module == "select"  # not eventlet.green.select
+
+def test_dashboard_resource_samples_only_append_when_recorded():
+    pytest.importorskip("flask_socketio")
+    from src.ui.dashboard import MonitoringService
+    from src.ui.worker_stats import WorkerStats
+
+    service = MonitoringService(start_sampler=False, stats=WorkerStats.local())
+    for _ in range(3):
+        service.collect_resource_metrics(record=False)
+    assert service.latest_resources is not None  # published for the live view
+    assert service.resource_metrics == []
+    service.collect_resource_metrics(record=True)
+    assert len(service.resource_metrics) == 1
@@ -0,0 +1,529 @@
+# tests/test_monitoring.py
+
+#test_monitoring.py
+
+#Unit tests for the monitoring package (src/core/monitoring): metrics history,
+#forecasting, rate limiting and interaction tracking.
+
+
+import os
+import pytest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from src.core.monitoring import HISTORY_CAPACITY, MonitoringService, SystemMetrics
+from src.core.monitoring.ring_buffer import MetricsRingBuffer
+
+
+def make_metrics(i, cpu=10.0, disk=None):
+    return SystemMetrics(
+        cpu_percent=cpu,
+        memory_percent=50.0 + i,
+        disk_usage=disk if disk is not None else {"/": 40.0},
+        open_files=i,
+        connections=2,
+        timestamp=datetime(2026, 1, 1) + timedelta(minutes=i),
+    )
+
+def test_ring_buffer_windows_are_zero_copy_and_wrap():
+    buf = MetricsRingBuffer(capacity=4, columns=("cpu",))
+    for i in range(6):
+        buf.append(float(i), {"cpu": i * 10.0})
+    window = buf.window()
+    assert window["timestamp"].tolist() == [2.0, 3.0, 4.0, 5.0]
+    assert window["cpu"].tolist() == [20.0, 30.0, 40.0, 50.0]
+    assert np.shares_memory(window["cpu"], buf._columns["cpu"])
+    assert not window["cpu"].flags.writeable
+    assert buf.window(2)["cpu"].tolist() == [40.0, 50.0]
+    assert buf.aggregate()["cpu"] == {"min": 20.0, "max": 50.0, "mean": 35.0, "last": 50.0, "count": 4}
+
+    buf.append(6.0, {"cpu": 60.0, "disk:/": 1.0})
+    assert np.isnan(buf.window()["disk:/"][:-1]).all()
+
+def test_monitoring_service_history_from_columns():
+    service = MonitoringService(start_collection=False)
+    for i in range(5):
+        service._record_metrics(make_metrics(i))
+    history = service.get_metrics_history(3)
+    assert [m.open_files for m in history] == [2, 3, 4]
+    assert history[-1].disk_usage == {"/": 40.0}
+    assert history[-1].timestamp == datetime(2026, 1, 1, 0, 4)
+    assert service.get_current_metrics().open_files == 4
+    assert service.get_metrics_aggregates(5)["memory_percent"]["max"] == 54.0
+
+    # Windows handed out are copies; later samples do not rewrite them.
+    window = service.get_metrics_window(3)
+    assert not np.shares_memory(window["open_files"], service._history._columns["open_files"])
+    for i in range(5, 5 + HISTORY_CAPACITY):
+        service._record_metrics(make_metrics(i % 50))
+    assert window["open_files"].tolist() == [2.0, 3.0, 4.0]
+
+def test_importing_the_monitoring_package_starts_no_collector():
+    import subprocess
+    import sys
+    script = (
+        "import threading\n"
+        "import src.core.monitoring as monitoring\n"
+        "from src.core.monitoring.rate_limiter import rate_limiter\n"
+        "assert monitoring._monitoring_service is None\n"
+        "assert threading.active_count() == 1, threading.enumerate()\n"
+        "assert monitoring.monitoring_service is monitoring.get_monitoring_service()\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True,
+                            env=dict(os.environ, METRICS_STORE_DIR=""), timeout=60)
+    assert result.returncode == 0, result.stderr
+
+def test_sliding_window_regression_matches_least_squares():
+    from src.core.monitoring.forecasting import SlidingWindowRegression
+
+    rng = np.random.default_rng(5)
+    values = rng.uniform(0, 100, size=500)
+    model = SlidingWindowRegression(window=60)
+    for i, value in enumerate(values):
+        model.add(value)
+        if i >= 59 and i % 37 == 0:
+            window = values[i - 59:i + 1]
+            slope, intercept = np.polyfit(np.arange(60), window, 1)
+            got_slope, got_intercept = model.coefficients()
+            assert got_slope == pytest.approx(slope)
+            assert got_intercept == pytest.approx(intercept)
+            assert model.predict(60) == pytest.approx(intercept + slope * 120)
+
+def test_monitoring_service_predictions_need_full_window():
+    service = MonitoringService(start_collection=False)
+    for i in range(59):
+        service._record_metrics(make_metrics(i, cpu=float(i)))
+    assert service._predict_metrics() is None
+    service._record_metrics(make_metrics(59, cpu=59.0))
+    predictions = service._predict_metrics()
+    assert predictions["cpu_percent"] == pytest.approx(100.0)
+    assert predictions["memory_percent"] == pytest.approx(100.0)
+
+def test_system_sampler_tiers_and_overhead():
+    from src.core.monitoring.sampler import SystemSampler, SamplerTier
+
+    sampler = SystemSampler(tiers=[
+        SamplerTier("fast", 0.0, ["cpu_percent", "memory_percent"]),
+        SamplerTier("slow", 3600.0, ["open_files", "connections", "disk_usage"]),
+    ])
+    first = sampler.sample()
+    assert {"cpu_percent", "open_files", "connections", "disk_usage"} <= set(first)
+    process = sampler.process
+    sampler.sample()
+    stats = sampler.stats()
+    assert stats["tiers"]["fast"]["runs"] == 2
+    assert stats["tiers"]["slow"]["runs"] == 1
+    assert sampler.process is process
+    sampler.close()
+
+def test_gorilla_encoding_round_trips():
+    from src.core.monitoring.tsdb import (
+        decode_floats, decode_timestamps, encode_floats, encode_timestamps
+    )
+    timestamps = [1_700_000_000_000 + 60_000 * i + (i % 7) * 13 for i in range(300)]
+    timestamps[150] += 10_000_000  # forces the widest delta-of-delta encoding
+    assert decode_timestamps(encode_timestamps(timestamps), len(timestamps)) == timestamps
+
+    values = np.array([42.5] * 100 + [42.75, float("nan"), -1e300, 0.0, 17.125] * 20)
+    encoded = encode_floats(values)
+    assert np.array_equal(decode_floats(encoded, len(values)), values, equal_nan=True)
+    assert len(encode_floats([42.5] * 1000)) < 140  # unchanged values cost one bit
+
+def test_time_series_store_rollups_and_persistence(tmp_path):
+    from src.core.monitoring.tsdb import TimeSeriesStore
+    start = 1_767_225_600.0  # 2026-01-01T00:00:00Z
+    store = TimeSeriesStore(str(tmp_path), block_size=50, retention={"raw": 10 * 86400})
+    for i in range(3 * 60):  # three hours at 60s
+        store.append(start + 60 * i, {"cpu_percent": float(i % 60), "disk:/": 40.0})
+    end = start + 3 * 3600
+
+    raw = store.query(start, end, resolution="raw")
+    assert raw["series"]["cpu_percent"]["value"].tolist() == [float(i % 60) for i in range(180)]
+
+    hourly = store.query(start, end, resolution="1h")
+    assert hourly["timestamps"].tolist() == [start, start + 3600, start + 7200]
+    assert hourly["series"]["cpu_percent"]["min"].tolist() == [0.0, 0.0, 0.0]
+    assert hourly["series"]["cpu_percent"]["max"].tolist() == [59.0, 59.0, 59.0]
+    assert hourly["series"]["cpu_percent"]["avg"].tolist() == [29.5, 29.5, 29.5]
+    assert store.choose_resolution(end - 7 * 86400, end, 2000, now=end) == "1h"
+
+    store.close()
+    reopened = TimeSeriesStore(str(tmp_path))
+    assert reopened.query(start, end, resolution="raw")["timestamps"].size == 180
+    assert reopened.query(start, end, resolution="5m")["series"]["disk:/"]["avg"].tolist() == [40.0] * 36
+
+    reopened.enforce_retention(now=start + 3 * 86400)  # raw keeps 2 days by default
+    assert reopened.query(start, end, resolution="raw")["timestamps"].size == 0
+    assert reopened.query(start, end, resolution="1h")["timestamps"].size == 3
+
+def test_monitoring_service_persists_samples(tmp_path):
+    from src.core.monitoring import iter_rollup_samples
+    from src.core.monitoring.tsdb import TimeSeriesStore
+    service = MonitoringService(start_collection=False, store=TimeSeriesStore(str(tmp_path)))
+    for i in range(10):
+        service._record_metrics(make_metrics(i, cpu=float(i)))
+    start = datetime(2026, 1, 1).timestamp()
+    result = service.query_stored_metrics(start, start + 600, resolution="1h")
+    [row] = list(iter_rollup_samples(result))
+    assert row["max"]["cpu_percent"] == 9.0
+    assert row["avg"]["disk_usage"] == {"/": 40.0}
+
+def test_sampling_profiler_collapsed_and_speedscope():
+    import threading, time
+    from src.core.monitoring.profiler import SamplingProfiler
+
+    stop = threading.Event()
+
+    def spin_hot_loop():
+        while not stop.is_set():
+            sum(i for i in range(1000))
+
+    worker = threading.Thread(target=spin_hot_loop, name="hot-worker")
+    worker.start()
+    try:
+        profiler = SamplingProfiler(rate=200).profile(0.3)
+    finally:
+        stop.set()
+        worker.join()
+
+    collapsed = profiler.collapsed()
+    hot = [line for line in collapsed.splitlines() if line.startswith("thread:hot-worker;")]
+    assert hot and any("spin_hot_loop" in line for line in hot)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.splitlines())
+    # Idle threads (like the main thread blocked in sleep/join) are filtered out by default.
+    stats = profiler.stats()
+    assert stats["samples"] > 10 and stats["overhead_percent"] < 5
+
+    speedscope = profiler.speedscope()
+    [profile] = [p for p in speedscope["profiles"] if p["name"] == "thread:hot-worker"]
+    names = [speedscope["shared"]["frames"][i]["name"] for s in profile["samples"] for i in s]
+    assert any(name.endswith("spin_hot_loop") for name in names)
+    assert len(profile["samples"]) == len(profile["weights"])
+
+def test_gcra_rate_limiter_burst_quota_and_backoff(monkeypatch):
+    from src.core.monitoring import rate_limiter as rl
+    now = [1000.0]
+    monkeypatch.setattr(rl.time, "time", lambda: now[0])
+    limiter = rl.SlidingWindowRateLimiter()
+    config = rl.RateLimitConfig(max_requests=5, window_seconds=10)
+
+    assert limiter.get_remaining_quota("k", "e", config) == (5, 10.0)
+    assert [limiter.is_rate_limited("k", "e", config) for _ in range(5)] == [False] * 5
+    assert limiter.get_remaining_quota("k", "e", config) == (0, 2.0)
+    now[0] += 2.0  # one emission interval frees one slot
+    assert limiter.get_remaining_quota("k", "e", config) == (1, 2.0)
+
+    assert not limiter.is_rate_limited("k", "e", config)
+    assert limiter.is_rate_limited("k", "e", config)  # first violation: 10 * 2 ** 1 s backoff
+    assert limiter.get_remaining_quota("k", "e", config) == (0, 20.0)
+    now[0] += 19.0
+    assert limiter.is_rate_limited("k", "e", config)
+    now[0] += 1.0
+    assert not limiter.is_rate_limited("k", "e", config)
+    assert not limiter.is_rate_limited("other", "e", config)
+
+def test_gcra_admits_full_burst_when_limit_does_not_divide_window(tmp_path, monkeypatch):
+    from src.core.monitoring import rate_limiter as rl
+    from src.core.monitoring.rate_limit_backends import RedisBackend, SharedMemoryBackend
+    from src.core.monitoring.resp_stand_in import RespStandIn
+    now = [1000.0]
+    monkeypatch.setattr(rl.time, "time", lambda: now[0])
+
+    server = RespStandIn().start()
+    backends = [rl.InProcessBackend(), SharedMemoryBackend(str(tmp_path / "limits"), slots=256),
+                RedisBackend(server.url)]
+    try:
+        for backend in backends:
+            for limit, window in ((5, 7), (5, 1), (6, 10), (7, 3)):
+                config = rl.RateLimitConfig(max_requests=limit, window_seconds=window)
+                key = f"{limit}/{window}"
+                assert [backend.check(key, "e", config)[0] for _ in range(limit)] == [False] * limit
+                assert backend.check(key, "e", config)[0]  # the one over quota
+    finally:
+        for backend in backends[1:]:
+            backend.close()
+        server.stop()
+
+@pytest.mark.asyncio
+async def test_rate_limiter_evicts_idle_keys_with_timer_wheel(monkeypatch):
+    from src.core.monitoring import rate_limiter as rl
+    now = [10_000.0]
+    monkeypatch.setattr(rl.time, "time", lambda: now[0])
+    limiter = rl.SlidingWindowRateLimiter(stripes=8, idle_ttl=60.0)
+    config = rl.RateLimitConfig(max_requests=2, window_seconds=10)
+
+    for i in range(1000):
+        assert await limiter.acheck(f"client-{i}", "e", config) == (False, 1, 5.0)
+    for _ in range(2):
+        limiter.is_rate_limited("client-0", "e", config)  # second call backs off for 20s
+    assert len(limiter) == 1000
+
+    now[0] += 5.0 + 60.0 + rl.WHEEL_TICK  # idle clients are past tat + ttl
+    assert limiter.sweep() == 999
+    assert len(limiter) == 1 and limiter.evicted == 999
+    # The retained state remembers the violation, so the next backoff doubles.
+    assert [limiter.is_rate_limited("client-0", "e", config) for _ in range(3)] == [False, False, True]
+    assert limiter.get_remaining_quota("client-0", "e", config) == (0, 40.0)
+
+    now[0] += 40.0 + 60.0 + rl.WHEEL_TICK
+    limiter.is_rate_limited("fresh", "e", config)
+    limiter.sweep()
+    assert len(limiter) == 1
+    assert limiter.get_remaining_quota("client-0", "e", config) == (2, 10.0)
+
+def _shm_worker(path, results):
+    from src.core.monitoring.rate_limit_backends import SharedMemoryBackend
+    from src.core.monitoring.rate_limiter import RateLimitConfig
+    backend = SharedMemoryBackend(path, slots=256)
+    config = RateLimitConfig(max_requests=100, window_seconds=3600)
+    results.put(sum(not backend.check("token", "metrics", config)[0] for _ in range(60)))
+    backend.close()
+
+def test_shared_memory_backend_enforces_one_limit_across_processes(tmp_path):
+    import multiprocessing
+    from src.core.monitoring.rate_limit_backends import SharedMemoryBackend
+    from src.core.monitoring.rate_limiter import RateLimitConfig
+
+    path = str(tmp_path / "limits")
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_shm_worker, args=(path, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    accepted = sum(results.get(timeout=30) for _ in workers)
+    for worker in workers:
+        worker.join()
+    assert accepted == 100  # not 4 x 100, as with per-process state
+
+    backend = SharedMemoryBackend(path)
+    assert backend.slots == 256  # an existing table keeps its size
+    assert backend.quota("token", "metrics", RateLimitConfig(100, 3600))[0] == 0
+    assert backend.quota("other", "metrics", RateLimitConfig(100, 3600)) == (100, 3600.0)
+    assert len(backend) == 1
+    backend.close()
+
+def test_redis_backend_against_stand_in_pipelines_batches():
+    from src.core.monitoring.rate_limit_backends import RedisBackend
+    from src.core.monitoring.rate_limiter import RateLimitConfig, SlidingWindowRateLimiter
+    from src.core.monitoring.resp_stand_in import RespStandIn
+
+    server = RespStandIn().start()
+    try:
+        config = RateLimitConfig(max_requests=3, window_seconds=30)
+        worker_a = SlidingWindowRateLimiter(backend=RedisBackend(server.url))
+        worker_b = SlidingWindowRateLimiter(backend=RedisBackend(server.url))
+
+        # The first EVALSHA is answered NOSCRIPT and retried once with EVAL.
+        limited, remaining, _ = worker_a.check("k", "e", config)
+        assert (limited, remaining) == (False, 2)
+        assert server.commands == 2
+        assert not worker_b.is_rate_limited("k", "e", config)
+
+        results = worker_b.check_many([("k", "e", config), ("k", "e", config), ("x", "e", config)])
+        assert [r[0] for r in results] == [False, True, False]
+        assert server.commands == 2 + 1 + 3  # a batch is one EVALSHA per request, no retries
+        remaining, reset_in = worker_a.get_remaining_quota("k", "e", config)
+        assert remaining == 0 and reset_in == pytest.approx(60.0, abs=1.0)  # 30 * 2 ** 1 s backoff
+        assert worker_a.get_remaining_quota("unknown", "e", config) == (3, 30.0)
+        worker_a.backend.close()
+        worker_b.backend.close()
+    finally:
+        server.stop()
+
+    closed = RedisBackend(server.url, timeout=0.2)
+    assert closed.check("k", "e", config) == (False, 3, 30.0)  # unreachable: fails open
+    with pytest.raises(OSError):
+        RedisBackend(server.url, timeout=0.2, fail_open=False).check("k", "e", config)
+
+def test_interaction_tracker_bounds_history_and_detects_rage_clicks(monkeypatch):
+    from src.core.monitoring import interaction_tracker as it
+    now = [1000.0]
+    monkeypatch.setattr(it.time, "time", lambda: now[0])
+    tracker = it.InteractionTracker(start_expiry=False)
+
+    for i in range(it.MAX_CLICKS + 10):
+        now[0] += 1.0  # too slow to be rage clicks
+        tracker.track_click("s", "u", f"el-{i % 300}", i, -i)
+    session = tracker._sessions["s"]
+    assert session.rage_clicks == 0
+    assert len(session.clicks) == it.MAX_CLICKS and session.clicks.dropped == 10
+    assert session.clicks[0] == it.UserClick(1011.0, "el-10", 10, -10)
+    assert session.clicks[-1].x == it.MAX_CLICKS + 9
+    assert len(session.rage_windows) == it.MAX_RAGE_ELEMENTS
+
+    for _ in range(6):
+        now[0] += 0.3
+        tracker.track_click("s", "u", "save", 1, 1)
+    assert session.rage_clicks == 2  # the 5th and 6th clicks within 2s
+
+    for i in range(it.MAX_ACTIONS + 1):
+        tracker.track_action("s", "u", "scroll")
+    assert len(session.actions) == it.MAX_ACTIONS and session.actions.total == it.MAX_ACTIONS + 1
+
+def test_interaction_tracker_indexes_users_and_expires_in_activity_order(monkeypatch):
+    from src.core.monitoring import interaction_tracker as it
+    now = [1000.0]
+    monkeypatch.setattr(it.time, "time", lambda: now[0])
+    tracker = it.InteractionTracker(start_expiry=False)
+
+    for i in range(6):
+        now[0] += 1.0
+        tracker.track_page_view(f"s{i}", f"u{i % 2}", "/")
+    now[0] += 1.0
+    tracker.track_click("s0", "u0", "button", 0, 0)  # s0 becomes the most recent
+    assert [s.session_id for s in tracker.get_user_sessions("u0")] == ["s0", "s2", "s4"]
+
+    now[0] = 1000.0 + 4.0 + tracker.SESSION_TIMEOUT + 0.5  # s1..s3 are idle too long
+    assert tracker.cleanup_expired_sessions(max_sessions=2) == 2
+    assert tracker.cleanup_expired_sessions() == 1
+    assert list(tracker._sessions) == ["s4", "s5", "s0"]
+    assert [s.session_id for s in tracker.get_user_sessions("u1")] == ["s5"]
+    assert tracker.get_user_sessions("nobody") == []
+
+def test_interaction_batches_are_queued_and_applied_in_bulk(monkeypatch):
+    from src.core.monitoring import interaction_tracker as it
+    now = [1000.0]
+    monkeypatch.setattr(it.time, "time", lambda: now[0])
+    tracker = it.InteractionTracker(start_expiry=False, start_consumer=False, max_queued=10)
+
+    clicks = [{"type": "click", "session_id": "s", "user_id": "u", "element_id": "buy",
+               "x": 1, "y": 2, "timestamp": 999.0 + 0.1 * i} for i in range(5)]
+    result = tracker.ingest(clicks + [
+        {"type": "page_view", "session_id": "s2", "user_id": "u", "page_path": "/cart"},
+        {"type": "action", "session_id": "s", "user_id": "u", "action_type": "scroll"},
+        {"type": "click", "session_id": "s", "user_id": "u"},  # no element_id
+        "not an event",
+    ])
+    assert (result.accepted, result.invalid, result.queue_depth) == (7, 2, 7)
+    assert tracker._sessions == {}  # nothing applied until the consumer drains
+
+    refused = tracker.ingest(clicks)
+    assert refused.backpressure and refused.accepted == 0 and refused.retry_after > 0
+
+    assert tracker.drain() == 7
+    session = tracker._sessions["s"]
+    assert [c.timestamp for c in session.clicks] == [999.0 + 0.1 * i for i in range(5)]
+    assert session.rage_clicks == 1
+    assert session.actions[0]["type"] == "scroll"
+    assert [s.session_id for s in tracker.get_user_sessions("u")] == ["s", "s2"]
+    assert tracker.ingest_stats()["applied"] == 7
+
+def test_interaction_ingest_rejects_out_of_range_events_and_drain_isolates_failures(monkeypatch):
+    from src.core.monitoring import interaction_tracker as it
+    now = [1000.0]
+    monkeypatch.setattr(it.time, "time", lambda: now[0])
+    tracker = it.InteractionTracker(start_expiry=False, start_consumer=False)
+
+    def click(session, **fields):
+        return {"type": "click", "session_id": session, "user_id": "u", "element_id": "b", **fields}
+    result = tracker.ingest([
+        click("a", x=1, y=2),
+        click("b", x=2**40, y=0),
+        click("b", x=True, y=0),
+        click("b", x=0, y=-2**31 - 1),
+        click("c", x=3, y=4, timestamp=float("nan")),
+        click("c", x=5, y=6, timestamp=float("inf")),
+    ])
+    assert (result.accepted, result.invalid) == (3, 3)
+    assert tracker.drain() == 3
+    assert "b" not in tracker._sessions
+    assert [c.timestamp for c in tracker._sessions["c"].clicks] == [1000.0, 1000.0]
+
+    # A queued event that still fails to apply is skipped; the rest of the chunk is applied.
+    tracker._queue.extend([
+        (it.CLICK, "d", "u", 1000.0, "b", 1, 1),
+        (it.CLICK, "d", "u", 1000.0, "b", 2**40, 1),
+        (it.CLICK, "e", "u", 1000.0, "b", 1, 1),
+    ])
+    assert tracker.drain() == 3
+    assert [(c.x, c.y) for c in tracker._sessions["d"].clicks] == [(1, 1)]
+    assert len(tracker._sessions["e"].clicks) == 1
+    stats = tracker.ingest_stats()
+    assert (stats["applied"], stats["failed"]) == (5, 1)
+
+def test_event_log_partitions_by_day_and_aggregates_from_codes(tmp_path):
+    from src.core.monitoring import event_log as ev
+
+    log = ev.EventLog(str(tmp_path), fmt="packed", retention_days=3650)
+    day = 1_767_225_600.0  # 2026-01-01T00:00:00Z
+    rows = [(day + i, ev.PAGE_VIEW, f"s{i % 3}", f"u{i % 2}", "/home", 0, 0, "") for i in range(10)]
+    rows += [(day + 86400 + i, ev.RAGE_CLICK, "s9", "u1", "buy" if i < 3 else "cart", 0, 0, "") for i in range(5)]
+    rows.append((day + 86400 + 9, ev.ACTION, "s9", "u1", "checkout", 0, 0, '{"total": 3}'))
+    assert log.append(rows) == 16
+    assert log.days() == ["20260101", "20260102"]
+
+    assert log.page_views_per_user() == {"u0": 5, "u1": 5}
+    assert log.rage_clicks_by_element() == {"buy": 3, "cart": 2}
+    assert log.page_views_per_user(start=day + 5, end=day + 7) == {"u1": 2, "u0": 1}
+    [chunk] = list(log.scan(start=day + 86400 + 9))
+    codes, table = chunk["context"]
+    assert table[codes].tolist() == ['{"total": 3}']
+
+    log.enforce_retention(now=day + 86400 * (log.retention_days + 1.5))
+    assert log.days() == ["20260102"]
+
+def test_interaction_tracker_exports_expired_and_flushed_sessions(tmp_path, monkeypatch):
+    from src.core.monitoring import interaction_tracker as it
+    from src.core.monitoring.event_log import EventLog
+    now = [1_767_225_600.0]
+    monkeypatch.setattr(it.time, "time", lambda: now[0])
+    log = EventLog(str(tmp_path), fmt="packed", retention_days=3650)
+    tracker = it.InteractionTracker(start_expiry=False, start_consumer=False, event_log=log)
+
+    tracker.track_page_view("s1", "alice", "/")
+    for _ in range(5):
+        tracker.track_click("s1", "alice", "buy", 3, 4)
+    assert tracker.flush_event_log() == 7  # 1 view, 5 clicks, 1 rage click
+    assert tracker.flush_event_log() == 0  # nothing new since the last export
+
+    tracker.track_action("s1", "alice", "checkout", {"items": 2})
+    now[0] += tracker.SESSION_TIMEOUT + 1
+    assert tracker.cleanup_expired_sessions() == 1
+    kinds = [k for chunk in log.scan(columns=("kind",)) for k in chunk["kind"].tolist()]
+    assert sorted(kinds) == [0] * 5 + [1, 2, 3]
+    assert log.rage_clicks_by_element() == {"buy": 1}
+
+def test_event_log_arrow_format_matches_packed(tmp_path):
+    pytest.importorskip("pyarrow")
+    from src.core.monitoring import event_log as ev
+
+    day = 1_767_225_600.0
+    rows = [(day + i, ev.RAGE_CLICK if i % 4 == 0 else ev.CLICK, "s", f"u{i % 3}", f"el{i % 5}", i, -i, "")
+            for i in range(200)]
+    results = []
+    for fmt in ("packed", "arrow"):
+        log = ev.EventLog(str(tmp_path / fmt), fmt=fmt, retention_days=3650)
+        log.append(rows[:120])
+        log.append(rows[120:])
+        results.append((log.rage_clicks_by_element(end=day + 150), log.count_by("user", ev.CLICK)))
+    assert results[0] == results[1]
+    assert sum(results[1][0].values()) == 38
+
+def test_response_cache_etags_versions_and_compression():
+    import gzip
+    import json
+    from src.core.monitoring.http_cache import ResponseCache, choose_encoding
+
+    builds = []
+    def build():
+        builds.append(1)
+        return {"rows": [{"cpu": i / 3} for i in range(200)]}
+
+    cache = ResponseCache(ttl=60)
+    status, body, headers = cache.respond("history", build, {"Accept-Encoding": "gzip, br;q=0"}, version=1)
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body))["rows"][3] == {"cpu": 1.0}
+
+    # Same version: served from the cache; a matching ETag costs a 304 and no body.
+    status, body, _ = cache.respond("history", build, {"If-None-Match": headers["ETag"]}, version=1)
+    assert (status, body, len(builds)) == (304, b"", 1)
+    status, plain, _ = cache.respond("history", build, {}, version=1)
+    assert status == 200 and json.loads(plain)["rows"][0] == {"cpu": 0.0}
+
+    # A new version rebuilds; identical content keeps the ETag valid.
+    status, _, rebuilt = cache.respond("history", build, {"If-None-Match": headers["ETag"]}, version=2)
+    assert (status, len(builds)) == (304, 2) and rebuilt["ETag"] == headers["ETag"]
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 2}
+    assert choose_encoding("identity") is None and choose_encoding("*") in ("br", "gzip")